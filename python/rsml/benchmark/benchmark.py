@@ -0,0 +1,239 @@
+"""
+Benchmarks of the main rsml processing
+
+Time and memory usage of reading, writing, measuring, matching and converting
+rsml data generated by `rsml.synthetic`. Each benchmark is run in its own
+process, so that its peak memory usage can be measured independently.
+
+Usage::
+
+    python benchmark.py -o results.json                # run all benchmarks
+    python benchmark.py rsml2mtg match --plants 20     # run some, with bigger data
+    python benchmark.py --compare old.json new.json    # compare two results
+
+The results file contains, for each benchmark, the time of all repetitions,
+the best and mean time (in seconds) and the peak memory increase (in kB)
+during the benchmark. It also records the data parameters and the versions
+of python and numpy, so that results of different versions can be compared.
+"""
+import json
+import os
+import sys
+import time
+
+
+# benchmarks
+# ----------
+# Each benchmark is a pair of functions (setup, run): setup(filename) returns
+# the arguments of run, and only run is timed. setup is called before each
+# repetition, so that benchmarks of in-place processing have fresh inputs.
+
+def _read(filename):
+    from rsml import rsml2mtg
+    return rsml2mtg(filename)
+
+def _write_setup(filename):
+    return _read(filename), filename+'.out'
+
+def _write(g, output):
+    from rsml import mtg2rsml
+    mtg2rsml(g, output)
+    os.remove(output)
+
+def _measure(g):
+    from rsml.measurements import RSML_Measurements
+    RSML_Measurements().add(g)
+
+def _match_setup(filename):
+    """ return the mtg of `filename`, and a copy with noisy geometry """
+    import numpy as np
+    g1, g2 = _read(filename), _read(filename)
+    random = np.random.RandomState(0)
+    geometry = g2.property('geometry')
+    for vid, geom in geometry.iteritems():
+        geometry[vid] = (np.array(geom) + random.normal(0,.5,(len(geom),2))).tolist()
+    return g1, g2
+
+def _match(g1, g2):
+    from rsml.matching import match_plants, match_roots
+    plants = match_plants(g1, g2)[0]
+    match_roots(g1, g2, plants, max_distance=10)
+
+def _to_discrete(g):
+    from rsml.continuous import continuous_to_discrete
+    continuous_to_discrete(g)
+
+def _to_continuous_setup(filename):
+    from rsml.continuous import continuous_to_discrete
+    return continuous_to_discrete(_read(filename)),
+
+def _to_continuous(g):
+    from rsml.continuous import discrete_to_continuous
+    discrete_to_continuous(g)
+
+benchmarks = [
+    ('rsml2mtg',   lambda f: (f,),            _read),
+    ('mtg2rsml',   _write_setup,              _write),
+    ('measure',    lambda f: (_read(f),),     _measure),
+    ('match',      _match_setup,              _match),
+    ('to-discrete',   lambda f: (_read(f),),  _to_discrete),
+    ('to-continuous', _to_continuous_setup,   _to_continuous),
+]
+
+
+# benchmark execution
+# -------------------
+def _proc_status(field):
+    """ return `field` of /proc/self/status in kB, or None if not available """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field+':'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+
+def reset_peak_memory():
+    """ reset the peak memory usage of the current process, if possible """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')    # linux: reset VmHWM to the current memory usage
+    except IOError:
+        pass
+
+def current_memory():
+    """ return the current memory usage of the current process, in kB """
+    memory = _proc_status('VmRSS')
+    return peak_memory() if memory is None else memory
+
+def peak_memory():
+    """ return the peak memory usage of the current process, in kB """
+    memory = _proc_status('VmHWM')
+    if memory is None:
+        import resource
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform=='darwin':
+            memory /= 1024      # given in bytes on macos
+    return memory
+
+def run_benchmark(name, filename, repeat=3):
+    """ run benchmark `name` on rsml file `filename`, in the current process
+
+    The memory usage is the increase of peak memory during the run (in kB).
+    Where the peak memory cannot be reset (i.e. not on linux), it can be
+    underestimated if the setup used more memory than the run.
+    """
+    import gc
+    setup, run = dict((n,(s,r)) for n,s,r in benchmarks)[name]
+
+    times = []
+    memory = 0
+    for i in xrange(repeat):
+        args = setup(filename)
+        gc.collect()
+        reset_peak_memory()
+        start_memory = current_memory()
+        start = time.time()
+        run(*args)
+        times.append(time.time()-start)
+        memory = max(memory, peak_memory()-start_memory)
+        del args
+
+    return dict(times=times, best=min(times), mean=sum(times)/len(times),
+                peak_memory=memory)
+
+def run_in_process(name, filename, repeat=3):
+    """ run benchmark `name` in a new python process, and return its result """
+    import subprocess
+    output = subprocess.check_output([sys.executable, __file__, '--worker',
+                                      name, filename, str(repeat)])
+    return json.loads(output.splitlines()[-1])
+
+def run_benchmarks(names=None, repeat=3, directory=None, **data):
+    """ generate synthetic data with parameters `data` and run benchmarks
+
+    Return the results dictionary
+    """
+    import platform
+    import shutil
+    import tempfile
+    import numpy as np
+    from rsml.synthetic import synthetic_rsml
+
+    if names is None:
+        names = [name for name,setup,run in benchmarks]
+
+    tmp = tempfile.mkdtemp(dir=directory)
+    try:
+        filename = os.path.join(tmp, 'synthetic.rsml')
+        synthetic_rsml(filename, seed=0, **data)
+
+        results = {}
+        for name in names:
+            results[name] = run_in_process(name, filename, repeat=repeat)
+            print '{:15} {:8.3f}s {:10d}kB'.format(name, results[name]['best'],
+                                                   results[name]['peak_memory'])
+        file_size = os.path.getsize(filename)
+    finally:
+        shutil.rmtree(tmp)
+
+    return dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), data=data,
+                file_size=file_size, repeat=repeat,
+                python=platform.python_version(), numpy=np.__version__,
+                platform=platform.platform(), benchmarks=results)
+
+def compare(old, new):
+    """ print the comparison of benchmarks results files `old` and `new` """
+    with open(old) as f: old = json.load(f)
+    with open(new) as f: new = json.load(f)
+
+    if old['data']!=new['data']:
+        print 'Warning: benchmarks were run on different data'
+    print '{:15} {:>9} {:>9} {:>7} {:>11}'.format('benchmark', 'old', 'new',
+                                                'speedup', 'memory')
+    for name in sorted(set(old['benchmarks'])&set(new['benchmarks'])):
+        b0, b1 = old['benchmarks'][name], new['benchmarks'][name]
+        print '{:15} {:8.3f}s {:8.3f}s {:6.2f}x {:+10d}kB'.format(name,
+                b0['best'], b1['best'], b0['best']/max(b1['best'],1e-9),
+                b1['peak_memory']-b0['peak_memory'])
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run rsml benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all): '
+                        + ', '.join(name for name,setup,run in benchmarks))
+    parser.add_argument('-o', '--output', help='json file to write results into')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of repetitions (default: %(default)s)')
+    parser.add_argument('--plants', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--roots', type=int, nargs='+', default=[1,20,5],
+                        help='number of axes per parent, for each order')
+    parser.add_argument('--points', type=int, nargs='+', default=[500,100,20],
+                        help='number of points per axe, for each order')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD','NEW'),
+                        help='compare two results files')
+    parser.add_argument('--worker', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        name, filename, repeat = args.worker
+        print json.dumps(run_benchmark(name, filename, int(repeat)))
+        return 0
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    results = run_benchmarks(args.names or None, repeat=args.repeat,
+                             plants=args.plants, depth=args.depth,
+                             roots=args.roots, points=args.points)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -65,5 +65,7 @@ setup(
     # Declare scripts and wralea as entry_points (extensions) of your package 
     entry_points={ 
         'wralea': ['rsml = rsml_wralea'],
+        'console_scripts': ['rsml-measure = rsml.batch:main',
+                            'rsml-report = rsml.report:main'],
     },
 )
@@ -0,0 +1,161 @@
+"""
+XML libraries used to read and write rsml files
+
+Three backends are available, which provide the same ElementTree interface:
+  - 'lxml':          the `lxml.etree` library, if installed
+  - 'cElementTree':  the C implementation of ElementTree of the standard library
+  - 'ElementTree':   the pure python implementation of the standard library
+
+By default, the first available of this list is used. A backend can also be
+selected explicitly::
+
+    from rsml import rsml2mtg
+    g = rsml2mtg(filename, backend='ElementTree')
+
+Parsing and writing rsml files give the same results with all backends. In
+particular, xml comments and processing instructions are ignored, and the
+`lxml` parser is configured to accept very big files (`huge_tree`).
+"""
+
+backend_names = ['lxml', 'cElementTree', 'ElementTree']
+
+# namespace prefixes used in rsml files
+namespaces = {'po': "http://www.plantontology.org/xml-dtd/po.dtd"}
+
+
+class ElementTreeBackend(object):
+    """ Backend for the ElementTree implementations of the standard library """
+    def __init__(self, name):
+        if name=='cElementTree':
+            import xml.etree.cElementTree as etree
+        elif name=='ElementTree':
+            import xml.etree.ElementTree as etree
+        else:
+            raise ValueError('Unknown ElementTree implementation: ' + str(name))
+        self.name = name
+        self.etree = etree
+
+    def __repr__(self):
+        return "<rsml xml backend '{}'>".format(self.name)
+
+    def parse(self, source):
+        """ parse file `source` and return its root element """
+        return self.etree.parse(source).getroot()
+
+    def iterparse(self, source, events=('end',)):
+        """ iterate over the (event, element) of xml file `source` """
+        return self.etree.iterparse(source, events=events)
+
+    def Element(self, tag, attrib={}):
+        return self.etree.Element(tag, attrib)
+
+    def SubElement(self, parent, tag, attrib={}):
+        return self.etree.SubElement(parent, tag, attrib)
+
+    def attributes(self, elt):
+        """ return the dictionary of (qualified-name, value) of `elt` attributes """
+        return elt.attrib
+
+
+class LxmlBackend(ElementTreeBackend):
+    """ Backend using the `lxml.etree` library
+
+    lxml does not accept prefixed names as attributes. So attributes given with
+    a prefix of the `namespaces` dictionary ('po:accession') are stored with
+    their namespace uri ('{uri}accession'), and namespace declarations (such
+    as 'xmlns:po') are converted to lxml `nsmap`.
+    """
+    def __init__(self):
+        from lxml import etree
+        self.name = 'lxml'
+        self.etree = etree
+        self._parser = etree.XMLParser(huge_tree=True, remove_comments=True,
+                                       remove_pis=True)
+
+    def parse(self, source):
+        return self.etree.parse(source, parser=self._parser).getroot()
+
+    def iterparse(self, source, events=('end',)):
+        return self.etree.iterparse(source, events=events, huge_tree=True,
+                                    remove_comments=True, remove_pis=True)
+
+    def Element(self, tag, attrib={}):
+        nsmap = {}
+        attrib = attrib.copy()
+        for name in attrib.keys():
+            if name.startswith('xmlns:'):
+                nsmap[name[6:]] = attrib.pop(name)
+        return self.etree.Element(tag, attrib=self._resolve(attrib, nsmap),
+                                  nsmap=nsmap)
+
+    def SubElement(self, parent, tag, attrib={}):
+        return self.etree.SubElement(parent, tag,
+                                     attrib=self._resolve(attrib, parent.nsmap))
+
+    @staticmethod
+    def _resolve(attrib, nsmap):
+        """ replace prefixed attribute names by their {uri}name """
+        resolved = {}
+        for name, value in attrib.iteritems():
+            prefix, sep, local = name.partition(':')
+            uri = nsmap.get(prefix, namespaces.get(prefix)) if sep else None
+            if uri is not None:
+                name = '{'+uri+'}'+local
+            resolved[name] = value
+        return resolved
+
+    def attributes(self, elt):
+        nsmap = elt.nsmap
+        prefixes = dict((uri,prefix) for prefix,uri in nsmap.iteritems())
+
+        attrib = {}
+        parent = elt.getparent()
+        for prefix, uri in nsmap.iteritems():
+            if parent is None or parent.nsmap.get(prefix)!=uri:
+                attrib['xmlns:'+prefix if prefix else 'xmlns'] = uri
+        for name, value in elt.attrib.iteritems():
+            if name.startswith('{'):
+                uri, name = name[1:].split('}',1)
+                name = prefixes[uri]+':'+name
+            attrib[name] = value
+        return attrib
+
+
+_backends = {}
+
+def get_backend(name=None):
+    """ Return the xml backend called `name`, or the default one if None
+
+    `name` can also be a backend object, which is then returned.
+    Raise an ImportError if the required library is not installed.
+    """
+    if name is None:
+        for name in backend_names:
+            try:
+                return get_backend(name)
+            except ImportError:
+                pass
+        raise ImportError('No xml library available')
+
+    if not isinstance(name, basestring):
+        return name
+
+    backend = _backends.get(name)
+    if backend is None:
+        if name=='lxml':
+            backend = LxmlBackend()
+        else:
+            backend = ElementTreeBackend(name)
+        _backends[name] = backend
+    return backend
+
+def available_backends():
+    """ return the list of the name of the installed backends """
+    available = []
+    for name in backend_names:
+        try:
+            get_backend(name)
+            available.append(name)
+        except ImportError:
+            pass
+    return available
@@ -0,0 +1,136 @@
+"""
+Batch processing of rsml files
+
+Compute the measurements of all rsml files of a directory, using several
+processes, and write them into one csv table::
+
+    from rsml.batch import measure_directory
+    failures = measure_directory('experiment/', 'table.csv', processes=4)
+
+The same can be done from the command line::
+
+    rsml-measure experiment/ -o table.csv -j 4
+
+The rows of the table are those of `rsml.measurements.RSML_Measurements`,
+where the 'name' column is the path of the file relatively to the directory.
+Files are processed, and written, in sorted order. Files that cannot be
+processed are skipped and reported.
+"""
+import os
+import sys
+
+
+def find_rsml_files(directory, extension='.rsml'):
+    """ return the sorted list of the rsml files in `directory`, recursively """
+    files = []
+    for path, dirs, names in os.walk(directory):
+        files.extend(os.path.join(path, name) for name in names
+                                                if name.endswith(extension))
+    return sorted(files)
+
+def measure_file(filename, name=None):
+    """ return the `RSML_Measurements` of the rsml file `filename` """
+    from .io import rsml2mtg
+    from .measurements import RSML_Measurements
+
+    g = rsml2mtg(filename)
+    return RSML_Measurements().add(g, name=filename if name is None else name)
+
+def _measure_task(task):
+    """ process `task` = (filename, name, sep). Return (csv-lines, error) """
+    import traceback
+    filename, name, sep = task
+    try:
+        return measure_file(filename, name).csv_lines(sep), None
+    except Exception:
+        return None, traceback.format_exc()
+
+def measure_files(files, output, processes=None, names=None, sep='\t'):
+    """ Write the measurements of all rsml `files` in csv file `output`
+
+    :Inputs:
+      - `files`:
+           the list of rsml files to process
+      - `output`:
+           filename, or file object, to write the csv table into
+      - `processes`:
+           the number of processes to use. If None, use the number of cpu.
+           If 1, files are processed sequentially by the current process.
+      - `names`:
+           optional list of the file names to use in the csv 'name' column
+      - `sep`:
+           the csv separator
+
+    :Outputs:
+      The list of (filename, error-message) of all files that failed.
+
+    The rows are written as soon as they are computed, in the order of `files`
+    """
+    from itertools import imap, izip
+    from .measurements import RSML_Measurements
+
+    if names is None: names = files
+    tasks = [(f,n,sep) for f,n in zip(files,names)]
+
+    if isinstance(output, basestring):
+        with open(output, 'w') as f:
+            return measure_files(files, f, processes=processes, names=names, sep=sep)
+
+    pool = None
+    if processes!=1 and len(files)>1:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        results = pool.imap(_measure_task, tasks)
+    else:
+        results = imap(_measure_task, tasks)
+
+    failures = []
+    try:
+        output.write(RSML_Measurements.csv_header(sep))
+        for filename, (lines, error) in izip(files, results):
+            if error is None:
+                output.writelines(lines)
+            else:
+                failures.append((filename, error))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return failures
+
+def measure_directory(directory, output, processes=None, sep='\t'):
+    """ Write the measurements of all rsml files in `directory` in `output`
+
+    See `measure_files`
+    """
+    files = find_rsml_files(directory)
+    names = [os.path.relpath(f, directory) for f in files]
+    return measure_files(files, output, processes=processes, names=names, sep=sep)
+
+
+def main(argv=None):
+    """ Entry point of the `rsml-measure` command """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='rsml-measure',
+                description='Export the measurements of all rsml files in a '
+                            'directory into one csv file')
+    parser.add_argument('directory', help='directory containing rsml files')
+    parser.add_argument('-o', '--output', default='measurements.csv',
+                        help='output csv file (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of processes (default: number of cpu)')
+    parser.add_argument('-s', '--sep', default='\t',
+                        help='csv separator (default: tab)')
+    args = parser.parse_args(argv)
+
+    failures = measure_directory(args.directory, args.output,
+                                 processes=args.jobs, sep=args.sep)
+    for filename, error in failures:
+        sys.stderr.write('Failed to process {}:\n{}\n'.format(filename, error))
+
+    return 1 if failures else 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -7,9 +7,14 @@ In practice, here continuous mtg means the mtg equivalent to rsml.
 from openalea.mtg.algo import local_axis
 from openalea.mtg.algo import traversal
 
-def discrete_to_continuous(g, position='position'):
+from copy import deepcopy as _deepcopy
+
+from rsml.misc import mtg_topology
+from rsml.topology import invalidate_topology
+
+def discrete_to_continuous(g, position='position', copy=False):
     """
-    Convert the "discrete mtg" `g` to continuous form **in-place**
+    Convert the "discrete mtg" `g` to continuous form
     
     Discrete mtg `g` is expected to:
       - have the 3 scales: Plant (1), Axe (2), Segment (3)
@@ -29,33 +34,32 @@ def discrete_to_continuous(g, position='position'):
         parent geometry.
         The position of the parent node is added at the beginning of the branch 
     
+    The geometry of all axes is collected in one pass. If `copy` is False, 
+    the segments are then removed from `g` in bulk, i.e. `g` is converted 
+    **in-place**. Otherwise `g` is unchanged and a new mtg is built in one 
+    pass from the topology of `g` without its segments (see `build_mtg`).
+    
     todo:
       - setter for PO, label, (...?) => function for label_axis on continuous g
       - convert "discrete" functions (such as diameter)
       - convert continuous functions?
     """
     from rsml.metadata import add_property_definition
+    from rsml.misc import build_mtg, remove_scale
     
     # accessor of the segment position property
     if isinstance(position, basestring):
         g_pos = g.property(position)
         position = lambda g,vid: g_pos[vid]
     
+    # construct geometry of all axes, in one pass over the segments
+    # -------------------------------------------------------------
+    geometry    = {}
+    parent_node = {}
+    axe_branch  = {}   # axe id => branch node
+    geom_index  = {}   # node id => index in geometry[axe]
     
-    # get/initialize "continuous" properties
-    geometry =    g.properties().setdefault('geometry',{})
-    parent_node = g.properties().setdefault('parent-node',{})
-    
-    # mapping to recover parent-node
-    axe_branch = {}   # axe id => branch node
-    geom_index = {}   # node id => index in geometry[axe]
-    
-    
-    # process all axes 
-    #    in reverse topological order so 'remove_tree' don't del subroots
-    #    construct geometry property
-    #    remove segments
-    for axe in toporder(g, g.max_scale()-1)[::-1]:
+    for axe in toporder(g, g.max_scale()-1):
         node0 = g.component_roots(axe)
         if len(node0)==0: continue
         else:             node0 = node0[0]
@@ -69,61 +73,145 @@ def discrete_to_continuous(g, position='position'):
             geom = []
           
         # axe node
-        for vid in traversal.pre_order2(g,node0):
+        for vid in axe_segments(g, axe, node0):
             geom_index[vid] = len(geom)
             geom.append(position(g,vid))
                 
         geometry[axe] = geom
-        g.remove_tree(node0)
 
-    # set parent-node property
     for axe,p_node in axe_branch.iteritems():
         parent_node[axe] = geom_index[p_node]
 
-    add_property_definition(g,label='parent-node', type=int)
+    # construct the continuous mtg: g without its segments
+    # ----------------------------------------------------
+    if copy:
+        topology = mtg_topology(g, max_scale=g.max_scale()-1)
+        properties = _copy_properties(g, topology[0])
+        continuous = build_mtg(*topology, properties=properties)
+        continuous.graph_properties().update(_deepcopy(g.graph_properties()))
+    else:
+        remove_scale(g, g.max_scale())
+        continuous = g
+        
+    continuous.properties().setdefault('geometry',{}).update(geometry)
+    continuous.properties().setdefault('parent-node',{}).update(parent_node)
+    add_property_definition(continuous,label='parent-node', type=int)
+    invalidate_topology(continuous)
 
-    return g
+    return continuous
     
     
-def continuous_to_discrete(g):
-    """ Convert mtg `g` from continuous to discrete form **in-place**
+def continuous_to_discrete(g, copy=False):
+    """ Convert mtg `g` from continuous to discrete form 
     
     Does the reverse of `discrete_to_continuous`:
       - Add a sequence of segments to all axes from their `geometry` attribute
       
+    The segments of all axes, which have ids following the maximum vertex id 
+    of `g`, are computed in one pass. If `copy` is False, they are added to 
+    `g` in bulk, i.e. `g` is converted **in-place**. Otherwise `g` is 
+    unchanged and a new mtg is built in one pass from the topology of `g` 
+    and the segments (see `build_mtg`).
+      
     todo:
       - functions
     """
-    geometry    = g.property('geometry')
-    parent_node = g.property('parent-node')
+    from rsml.misc import build_mtg, add_vertices
+    
+    geometry    = g.properties().get('geometry', {})
+    parent_node = g.properties().get('parent-node', {})
+    
+    topology = mtg_topology(g)
+    next_id = max(topology[0])+1 if topology[0] else 1
+    
+    vertices  = []
+    complexes = []
+    parents   = []
+    position  = {}
+    edge_type = {}
+    processed = []
+    segments  = {}  # (axe, geometry index) => segment id
     
-    axe_segments = {}
     for axe in toporder(g, g.max_scale()):
+        if axe not in geometry: continue
+        processed.append(axe)
+        
         # get segment on parent branch
-        p_axe = g.parent(axe)
-
-        # create 1st segment
-        position = geometry[axe]
+        axe_geom = geometry[axe]
         if parent_node.has_key(axe):
-            p_seg = axe_segments[(p_axe,parent_node[axe])]
-            seg   = g.add_component(axe, edge_type='/', position=position[1])
-            g.add_child(p_seg,seg, edge_type='+')
-            axe_segments[(axe,0)] = p_seg
-            shift = 1
+            parent = segments[(g.parent(axe),parent_node[axe])]
+            segments[(axe,0)] = parent
+            shift, edge = 1, '+'
         else:
-            seg = g.add_component(axe, edge_type='/', position=position[0])
-            shift = 0
-        axe_segments[(axe,shift)] = seg
+            parent = None
+            shift, edge = 0, '/'
             
-        # create the other segments
-        for i,pos in enumerate(position[(1+shift):]):
-            seg = g.add_child(seg,edge_type='<', position=pos)
-            axe_segments[(axe,i+1)] = seg
+        # create the segments
+        for i in xrange(shift, len(axe_geom)):
+            seg = next_id
+            next_id += 1
             
-        geometry.pop(axe)
-        parent_node.pop(axe,None)
+            vertices.append(seg)
+            complexes.append(axe)
+            parents.append(parent)
+            position[seg]  = axe_geom[i]
+            edge_type[seg] = edge
+            segments[(axe,i)] = seg
+            
+            parent, edge = seg, '<'
+            
+    # construct the discrete mtg: g with the segments
+    # -----------------------------------------------
+    if copy:
+        properties = _copy_properties(g)
+        discrete = build_mtg(topology[0]+vertices, topology[1]+complexes, 
+                             topology[2]+parents, properties=properties)
+        discrete.graph_properties().update(_deepcopy(g.graph_properties()))
+    else:
+        add_vertices(g, vertices, complexes, parents)
+        discrete = g
+    
+    d_prop = discrete.properties()
+    d_prop.setdefault('position',{}).update(position)
+    d_prop.setdefault('edge_type',{}).update(edge_type)
+    for axe in processed:
+        d_prop['geometry'].pop(axe)
+        d_prop.get('parent-node',{}).pop(axe,None)
+    invalidate_topology(discrete)
+    
+    return discrete
+
+def axe_segments(g, axe, node0=None):
+    """ return the list of segments of `axe`, in order 
     
-    return g
+    `node0` is the first segment. By default, it is the first component root
+    of `axe`. The segments are the sequence of children of `node0` that have
+    `axe` as complex.
+    """
+    if node0 is None:
+        node0 = g.component_roots(axe)[0]
+    
+    segments = [node0]
+    stack = [node0]
+    while stack:
+        children = [c for c in g.children(stack.pop()) if g.complex(c)==axe]
+        segments.extend(children)
+        stack.extend(children[::-1])
+    return segments
+    
+def _copy_properties(g, vertices=None):
+    """ return a deep copy of the properties of `g`, restricted to `vertices` 
+    
+    By default, the properties of all vertices are copied.
+    """
+    properties = g.properties()
+    if vertices is not None:
+        vertices = set(vertices)
+        vertices.add(g.root)
+        properties = dict((name,dict((vid,value) for vid,value in prop.iteritems() 
+                                                  if vid in vertices))
+                          for name,prop in properties.iteritems())
+    return _deepcopy(properties)
 
 def toporder(g, scale):
     """ Return the list of `g` vertices at scale `scale` in topological order """
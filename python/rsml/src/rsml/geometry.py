@@ -0,0 +1,280 @@
+"""
+Columnar storage of the root axes geometry
+
+By default, the 'geometry' property of a rsml mtg contains, for each root
+axe, a list of points which are lists of coordinates. A `GeometryStore`
+instead stores all the polylines of the mtg in one contiguous (N,k) float64
+array, with an offsets array that gives the range of each polyline.
+
+The 'geometry' property can then contain (zero-copy) views of this array,
+which are compatible with the rest of the rsml package::
+
+    from rsml.geometry import set_columnar_geometry
+    store = set_columnar_geometry(g)
+
+    g.property('geometry')[vid]  # a (n,k) view in store.coordinates
+    store.axis(0)                # the x-coordinates of all polylines
+
+Mtg with columnar geometry can also be obtained directly from rsml files::
+
+    g = rsml.rsml2mtg(filename, columnar=True)
+
+Functions, such as the 'diameter' of the root axes, have one value per point
+of the polylines. They can also be stored in arrays aligned with the store
+coordinates (see `set_columnar_functions`)::
+
+    store.functions['diameter']       # the diameter at all points
+"""
+from array import array as _array
+
+import numpy as _np
+
+
+class GeometryStore(object):
+    """ All polylines of a mtg, stored in one contiguous array
+
+    :Attributes:
+      - `coordinates`:
+           a (N,k) float64 array of the N points of all polylines
+      - `offsets`:
+           an (n+1,) int array such that polyline i is given by
+           ``coordinates[offsets[i]:offsets[i+1]]``
+      - `vertices`:
+           the list of the n mtg vertices the polylines are the geometry of
+      - `functions`:
+           a dictionary of (name, (N,) float64 array) of the functions values
+           at all points (see `set_columnar_functions`)
+    """
+    def __init__(self, coordinates, offsets, vertices):
+        self.coordinates = coordinates
+        self.offsets = offsets
+        self.vertices = list(vertices)
+        self.functions = {}
+        self._index = dict((vid,i) for i,vid in enumerate(self.vertices))
+
+    @staticmethod
+    def from_polylines(polylines, vertices):
+        """ Create a `GeometryStore` from a list of polylines """
+        builder = GeometryBuilder()
+        for vid, polyline in zip(vertices, polylines):
+            builder.append(vid, polyline)
+        return builder.store()
+
+    @staticmethod
+    def from_mtg(g, vertices=None):
+        """ Return the `GeometryStore` of the geometry of mtg `g`
+
+        If `g` has a valid columnar geometry (see `set_columnar_geometry`),
+        its store is returned. Otherwise a new store is created.
+
+        If `vertices` is given, returns a store of the geometry of those only.
+        Vertices without geometry get an empty polyline.
+        """
+        geometry = g.property('geometry')
+
+        store = g.graph_properties().get('geometry-store')
+        if store is not None and store.is_geometry_of(g):
+            if vertices is None or list(vertices)==store.vertices:
+                return store
+
+        if vertices is None:
+            vertices = sorted(geometry.keys())
+
+        builder = GeometryBuilder(dim=store.dim if store else None)
+        for vid in vertices:
+            builder.append(vid, geometry.get(vid,[]))
+        return builder.store()
+
+    def is_geometry_of(self, g):
+        """ True if the 'geometry' property of `g` is the views of this store """
+        geometry = g.property('geometry')
+        if len(geometry)!=len(self.vertices):
+            return False
+
+        data = self.coordinates.__array_interface__['data'][0]
+        step = self.coordinates.strides[0]
+        for i,vid in enumerate(self.vertices):
+            geom = geometry.get(vid)
+            if not isinstance(geom, _np.ndarray):
+                return False
+            if geom.__array_interface__['data'][0]!=data+self.offsets[i]*step:
+                return False
+            if geom.shape[0]!=self.offsets[i+1]-self.offsets[i]:
+                return False
+        return True
+
+    @property
+    def dim(self):
+        """ the dimension of the points """
+        return self.coordinates.shape[1]
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __contains__(self, vid):
+        return vid in self._index
+
+    def __getitem__(self, vid):
+        """ return the polyline of vertex `vid` """
+        return self.polyline(self._index[vid])
+
+    def indices(self, vertices):
+        """ return the array of the polyline index of `vertices` (-1 if none) """
+        index = self._index
+        return _np.array([index.get(vid,-1) for vid in vertices], dtype=int)
+
+    def polyline(self, i):
+        """ return the ith polyline, as a view in `coordinates` """
+        return self.coordinates[self.offsets[i]:self.offsets[i+1]]
+
+    def axis(self, k):
+        """ return the kth coordinates of all points (as a view) """
+        return self.coordinates[:,k]
+
+    def views(self):
+        """ return a dictionary of (vertex-id, polyline view) """
+        return dict((vid,self.polyline(i)) for i,vid in enumerate(self.vertices))
+
+    def sizes(self):
+        """ return the array of the number of points of all polylines """
+        return _np.diff(self.offsets)
+
+    def node_values(self, values, default=_np.nan):
+        """ return the array of the values of a function at all points
+
+        `values` is a dictionary of (vertex-id, function-values), where the 
+        function values are either a sequence of one value per point of the
+        vertex polyline, or a single value for all points. Points of vertices
+        without (valid) values get the `default` value.
+        """
+        array = _np.empty(len(self.coordinates))
+        array.fill(default)
+        offsets = self.offsets
+        for k,vid in enumerate(self.vertices):
+            value = values.get(vid)
+            if value is None:
+                continue
+            if _np.ndim(value)==0:
+                array[offsets[k]:offsets[k+1]] = value
+            elif _np.ndim(value)==1 and len(value)==offsets[k+1]-offsets[k]:
+                array[offsets[k]:offsets[k+1]] = value
+        return array
+
+    def segment_lengths(self):
+        """ return the length of the segments ending at each point
+
+        The returned array has one value per point. It is 0 for the first
+        point of all polylines.
+        """
+        coordinates = self.coordinates
+        length = _np.zeros(len(coordinates))
+        if len(coordinates)>1:
+            length[1:] = (_np.diff(coordinates,axis=0)**2).sum(axis=1)**.5
+            starts = self.offsets[:-1]
+            length[starts[starts<len(coordinates)]] = 0
+        return length
+
+    def arclength(self):
+        """ return the cumulative arclength of all points along their polyline """
+        length = self.segment_lengths().cumsum()
+        sizes = self.sizes()
+        starts = _np.minimum(self.offsets[:-1], max(len(length)-1,0))
+        if len(length):
+            length -= _np.repeat(length[starts], sizes)
+        return length
+
+    def lengths(self):
+        """ return the array of the length of all polylines """
+        sizes = self.sizes()
+        length = _np.zeros(len(sizes))
+        filled = sizes>0
+        if filled.any():
+            length[filled] = _np.add.reduceat(self.segment_lengths(),
+                                              self.offsets[:-1][filled])
+        return length
+
+
+class GeometryBuilder(object):
+    """ Incremental construction of a `GeometryStore`
+
+    Coordinates are accumulated in a flat buffer, so that no python object
+    is kept per point.
+    """
+    def __init__(self, dim=None):
+        self.dim = dim
+        self._coordinates = _array('d')
+        self._offsets = [0]
+        self._vertices = []
+
+    def append(self, vid, polyline):
+        """ append `polyline` as the geometry of vertex `vid`
+
+        Raise a ValueError if the points dimension does not match the dimension
+        of previous polylines. In this case, the builder is left unchanged.
+        """
+        polyline = _np.asarray(polyline, dtype=float)
+        if polyline.size==0:
+            polyline = polyline.reshape(0,self.dim or 0)
+        elif polyline.ndim!=2:
+            raise ValueError('Invalid polyline for vertex ' + str(vid))
+
+        if self.dim is None:
+            self.dim = polyline.shape[1]
+        elif polyline.shape[1]!=self.dim and len(polyline):
+            raise ValueError('Polyline of vertex {} has dimension {} instead of {}'
+                             .format(vid, polyline.shape[1], self.dim))
+
+        self._coordinates.fromstring(_np.ascontiguousarray(polyline).tostring())
+        self._offsets.append(self._offsets[-1]+len(polyline))
+        self._vertices.append(vid)
+
+    def store(self):
+        """ return the constructed `GeometryStore` """
+        if self.dim:
+            coordinates = _np.frombuffer(self._coordinates, dtype=float)
+            coordinates = coordinates.reshape(-1,self.dim).copy()
+        else:
+            coordinates = _np.empty((0,0))
+        offsets = _np.array(self._offsets, dtype=int)
+        return GeometryStore(coordinates, offsets, self._vertices)
+
+
+def set_columnar_geometry(g, store=None):
+    """ Replace the 'geometry' property of `g` by views in a `GeometryStore`
+
+    If `store` is not given, it is constructed from the geometry of `g`.
+    The store is kept in the 'geometry-store' graph property of `g`, and
+    returned.
+    """
+    if store is None:
+        store = GeometryStore.from_mtg(g)
+
+    g.properties().setdefault('geometry',{}).update(store.views())
+    g.graph_properties()['geometry-store'] = store
+
+    return store
+
+def set_columnar_functions(g, names, store=None):
+    """ Replace the function properties `names` of `g` by views in arrays
+
+    For each function `name`, the array of its values at all points of the
+    `store` (see `GeometryStore.node_values`) is stored in `store.functions`,
+    and the `name` property of `g` is replaced by views of it. Values that
+    do not have one value per polyline point are left unchanged.
+
+    If `store` is not given, it is the store of the geometry of `g`.
+    """
+    if store is None:
+        store = GeometryStore.from_mtg(g)
+
+    offsets = store.offsets
+    for name in names:
+        values = g.property(name)
+        array = store.node_values(values)
+        store.functions[name] = array
+        for k,vid in enumerate(store.vertices):
+            value = values.get(vid)
+            if _np.ndim(value)==1 and len(value)==offsets[k+1]-offsets[k]:
+                values[vid] = array[offsets[k]:offsets[k+1]]
+
+    return store
@@ -0,0 +1,156 @@
+"""
+Opt-in instrumentation of the rsml processing
+
+The main functions of the rsml package (parsing, dumping, metadata and
+measurements) are instrumented by timers and counters. They are recorded only
+within a `recording` context::
+
+    from rsml import instrument
+
+    with instrument.recording() as stats:
+        g = rsml2mtg(filename)
+        RSML_Measurements().add(g)
+
+    print stats.report()
+    stats.timers['parse.xml']       # (total time, number of calls)
+    stats.counters['points']        # number of polyline points parsed
+
+A `callback` can be given to `recording`, which is called with the `Stats`
+at the end of the context. This is convenient to export per-file statistics::
+
+    for filename in files:
+        with instrument.recording(callback=lambda s: export(filename, s.as_dict())):
+            process(filename)
+
+Outside of a recording context, the instrumentation does nothing but check
+that no recording is active.
+
+Recorded timers:
+  - 'parse':            total time of `Parser.parse`
+  - 'parse.xml':        reading of the xml tree (not for `StreamParser`)
+  - 'parse.mtg':        construction of the mtg from the xml tree
+  - 'parse.fat_mtg':    final conversion to a `fat_mtg`
+  - 'dump':             total time of `Dumper.dump` and `StreamDumper.dump`
+  - 'metadata':         `metadata.set_metadata`
+  - 'metadata.hash':    hashing of the image file in `set_metadata`
+  - 'measurements':     `RSML_Measurements.add`
+  - 'measurements.root_length', 'measurements.parent_position':
+                        the respective functions of `rsml.measurements`
+
+Recorded counters:
+  - 'elements':         xml elements parsed
+  - 'vertices':         mtg vertices created by parsing
+  - 'points':           polyline points parsed
+  - 'bytes_written':    bytes of rsml files written
+  - 'bytes_hashed':     bytes of image files hashed
+  - 'roots_measured':   root axes measured by `RSML_Measurements.add`
+"""
+from time import time as _time
+
+_active = []   # stack of the active Stats
+
+
+class Stats(object):
+    """ Timers and counters recorded by `recording`
+
+    :Attributes:
+      - `timers`:   dictionary of (name, (total-time, number-of-calls))
+      - `counters`: dictionary of (name, count)
+    """
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+
+    def add_time(self, name, elapsed):
+        total, calls = self.timers.get(name, (0., 0))
+        self.timers[name] = (total+elapsed, calls+1)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        """ return the stats as a flat dictionary
+
+        Timers are given as 'time.<name>' and 'calls.<name>' items, and
+        counters as '<name>' items.
+        """
+        stats = dict(self.counters)
+        for name, (total, calls) in self.timers.iteritems():
+            stats['time.'+name] = total
+            stats['calls.'+name] = calls
+        return stats
+
+    def report(self):
+        """ return a printable report of the stats """
+        lines = ['{:30} {:10.4f}s {:6d} calls'.format(name, total, calls)
+                    for name, (total, calls) in sorted(self.timers.iteritems())]
+        lines.extend('{:30} {:11d}'.format(name, count)
+                    for name, count in sorted(self.counters.iteritems()))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return 'Stats(timers={}, counters={})'.format(self.timers, self.counters)
+
+
+class recording(object):
+    """ Context manager that records instrumentation into a `Stats` object
+
+    If given, `callback(stats)` is called at the end of the context.
+    Recordings can be nested, in which case all active `Stats` are updated.
+    """
+    def __init__(self, callback=None):
+        self.stats = Stats()
+        self.callback = callback
+
+    def __enter__(self):
+        _active.append(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        _active.remove(self.stats)
+        if self.callback is not None:
+            self.callback(self.stats)
+
+
+def enabled():
+    """ True if some recording is active """
+    return bool(_active)
+
+def count(name, n=1):
+    """ add `n` to counter `name` of active recordings """
+    for stats in _active:
+        stats.count(name, n)
+
+
+class timer(object):
+    """ Context manager that adds the time of its content to timer `name` """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _active:
+            self.start = _time()
+        else:
+            self.start = None
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            elapsed = _time() - self.start
+            for stats in _active:
+                stats.add_time(self.name, elapsed)
+
+def timed(name):
+    """ Decorator that records the time of the decorated function in timer `name` """
+    from functools import wraps
+
+    def decorator(function):
+        @wraps(function)
+        def timed_function(*args, **kwds):
+            if not _active:
+                return function(*args, **kwds)
+            with timer(name):
+                return function(*args, **kwds)
+        return timed_function
+    return decorator
@@ -23,20 +23,111 @@ Visualisation:
 
 from ast import literal_eval
 
-import xml.etree.ElementTree as xml
-from xml.dom import minidom
-
 #from openalea.core.graph.property_graph import PropertyGraph
 from openalea.mtg import MTG, fat_mtg
 
 from . import metadata
+from . import instrument
+from .backend import get_backend
+from .geometry import GeometryBuilder, set_columnar_geometry, set_columnar_functions
+
+def decode_points(elts):
+    """ Decode the list of `point` elements `elts` of a polyline
+
+    Both the attribute form, ``<point x="1" y="2"/>``, and the nested form,
+    ``<point><x>1</x><y>2</y></point>``, are decoded in one pass into a 
+    preallocated (n,k) array, which is returned.
+
+    Return None if the points are not all given in the same form, with the
+    same coordinates, or if some coordinate is invalid.
+    """
+    import numpy as np
+    from itertools import imap
+
+    if len(elts)==0:
+        return np.empty((0,0))
+
+    first = elts[0]
+    if first.attrib:
+        # attribute form
+        coords = [c for c in 'xyz' if c in first.attrib]
+        for elt in elts:
+            if elt.tag!='point' or len(elt) or len(elt.attrib)!=len(coords):
+                return None
+        values = (elt.attrib[c] for elt in elts for c in coords)
+    else:
+        # nested form
+        coords = len(first)
+        for elt in elts:
+            if elt.tag!='point' or elt.attrib or len(elt)!=coords:
+                return None
+        values = (c.text for elt in elts for c in elt)
+        coords = range(coords)
+
+    if not coords:
+        return None
+
+    try:
+        points = np.fromiter(imap(float, values), dtype=float,
+                              count=len(elts)*len(coords))
+    except (ValueError, TypeError, KeyError):
+        return None
+
+    return points.reshape(len(elts), len(coords))
+
+
+def decode_samples(elts, domain='polyline'):
+    """ Decode the list of `sample` elements `elts` of a function
+
+    The sample values are given either as text, ``<sample>1.5</sample>``, or
+    by a 'value' attribute, ``<sample value="1.5"/>``. They are decoded in
+    one pass into a float array.
+
+    For functions with 'length' domain, samples also have a 'position'
+    attribute: the (n,2) array of (position, value) is returned. Otherwise,
+    the (n,) array of values is returned, with one value per polyline point.
+    """
+    import numpy as np
+    from itertools import imap
+
+    values = (elt.get('value', elt.text) for elt in elts)
+    values = np.fromiter(imap(float, values), dtype=float, count=len(elts))
+    if domain=='length':
+        position = (elt.get('position') for elt in elts)
+        position = np.fromiter(imap(float, position), dtype=float, count=len(elts))
+        return np.column_stack((position, values))
+    return values
+
 
 class Parser(object):
     """ Read an XML file an convert it into an MTG.
 
+    If `columnar` is True, the polylines are stored in a `GeometryStore` and
+    the 'geometry' property of the returned MTG contains views of it.
+
+    `backend` is the xml library to use. See `rsml.backend`.
     """
+    def __init__(self, columnar=False, backend=None):
+        self.columnar = columnar
+        self.backend = get_backend(backend)
 
+    @instrument.timed('parse')
     def parse(self, filename, debug=False):
+        self.init_parsing(debug)
+
+        with instrument.timer('parse.xml'):
+            root = self.backend.parse(filename)
+        if instrument.enabled():
+            instrument.count('elements', sum(1 for elt in root.iter()))
+
+        # recursive call of the functions to add neww plants/root axis to the MTG
+        with instrument.timer('parse.mtg'):
+            self.dispatch(root)
+
+        return self.end_parsing()
+
+    def init_parsing(self, debug):
+        """ Initialize the parsing of a new document """
         self.debug = debug
         self.trash = []
         self._g = MTG()
@@ -44,12 +135,23 @@ class Parser(object):
         # Current proxy node for managing properties
         self._node = None 
 
-        doc = xml.parse(filename)
-        root = doc.getroot()
-        # recursive call of the functions to add neww plants/root axis to the MTG
-        self.dispatch(root)
+        # storage of columnar geometry
+        self._geometry = GeometryBuilder() if self.columnar else None
+        self._functions = set()   # name of functions with 'polyline' domain
+
+    def end_parsing(self):
+        """ Finalize and return the MTG of the parsed document """
+        with instrument.timer('parse.fat_mtg'):
+            g = fat_mtg(self._g)
 
-        g = fat_mtg(self._g)
+        if instrument.enabled():
+            instrument.count('vertices', len(g))
+            geometry = g.property('geometry').itervalues()
+            instrument.count('points', sum(len(geom) for geom in geometry))
+
+        if self._geometry is not None:
+            store = set_columnar_geometry(g, self._geometry.store())
+            set_columnar_functions(g, self._functions, store)
 
         # Add metadata as property of the graph
         #g.graph_property()
@@ -149,9 +251,7 @@ class Parser(object):
         """ A plant with parameters and a recursive structure.
 
         """
-        g = self._g
-        self.plant_id = g.add_component(g.root, label='Plant')
-        node = self._node = g.node(self.plant_id)
+        node = self.add_plant()
 
         # Manage the topology
         for elt in elts:
@@ -159,10 +259,28 @@ class Parser(object):
                 self._node = node
             self.dispatch(elt)
 
+    def add_plant(self):
+        """ Add a plant to the MTG and set it as the current node """
+        g = self._g
+        self.plant_id = g.add_component(g.root, label='Plant')
+        node = self._node = g.node(self.plant_id)
+        return node
+
     def root(self, elts, **attrib):
         """ A root axis with geometry, functions, properties """
         parent = self._node
+        axis = self.add_root(parent, attrib)
+
+        # parse children element (geometry,properties,...)
+        for elt in elts:
+            if elt.tag == 'root':
+                self._node = axis
+            self.dispatch(elt)
+
+        self._node = parent
 
+    def add_root(self, parent, attrib):
+        """ Add a root axis to `parent` node and set it as the current node """
         if parent.scale() == 1:
             axis = parent.add_component(edge_type='/', **attrib) # 1st  order
         else:
@@ -172,14 +290,7 @@ class Parser(object):
             axis.label = 'root'
 
         self._node = axis
-
-        # parse children element (geometry,properties,...)
-        for elt in elts:
-            if elt.tag == 'root':
-                self._node = axis
-            self.dispatch(elt)
-
-        self._node = parent
+        return axis
 
     def properties(self, elts) :
         """ Update the tooy properties in the MTG """
@@ -191,7 +302,7 @@ class Parser(object):
                 gprop.update(read_xml_tree(a))
                 
             # read property value
-            elif a.attrib.has_key('value'):
+            elif 'value' in a.attrib:
                 proxy_node.__setattr__(a.tag, literal_eval(a.attrib['value']))
             else:
                 proxy_node.__setattr__(a.tag, a.text)
@@ -203,9 +314,18 @@ class Parser(object):
 
     def polyline(self, elts, **properties):
         """ A root axis - geometry - polyline """
-        self._polyline = []  # will store all points in `elts`
-        for elt in elts:
-            self.dispatch(elt)
+        points = decode_points(elts)
+        if points is None:
+            # irregular polyline: parse points one by one
+            self._polyline = []  # will store all points in `elts`
+            for elt in elts:
+                self.dispatch(elt)
+            points = self._polyline
+        elif len(points):
+            self._node.geometry = points if self.columnar else points.tolist()
+
+        if self._geometry is not None:
+            self._geometry.append(self._node._vid, points)
 
     def point(self, elts, **properties):
         poly = self._polyline
@@ -226,31 +346,31 @@ class Parser(object):
             self.dispatch(elt)
 
     def function(self, elts, **properties):
-        """ A root axis with geometry, functions, properties.
+        """ A root axis - function, with one sample per polyline point
+
+        The samples are stored as the `name` property of the root axis (see
+        `decode_samples`): as a list of values, or of (position,value) tuples
+        for 'length' domain, or as an array if the parsing is `columnar`.
         """
         g = self._g
 
         node = self._node
 
         name = properties['name']
-        domain = properties['domain']
-
-        samples = [self.sample(elt, domain=domain) for elt in elts]
+        domain = properties.get('domain', 'polyline')
+
+        samples = decode_samples(elts, domain=domain)
+        if domain=='polyline':
+            self._functions.add(name)
+        if not self.columnar:
+            samples = samples.tolist()
+            if domain=='length':
+                samples = map(tuple, samples)
         node.__setattr__(name,samples)
-        funs = g.graph_properties()['metadata'].setdefault('functions',[])
+        funs = g.graph_properties().setdefault('metadata',{}).setdefault('functions',[])
         if name not in funs:
             funs.append(name)
 
-    def sample(self, elt, domain):
-        p = elt.attrib
-        value = float(p['value'])
-
-        if domain == "length":
-            position= float(p['position'])
-            return (position, value)
-        else:
-            return value
-
     def annotations(self, elts, **properties):
         """ Annotations attached to a part of the MTG.
         """
@@ -278,6 +398,74 @@ class Parser(object):
                 print 'Invalid Annotation format', elt.tag
 
 
+class StreamParser(Parser):
+    """ Read an XML file incrementally and convert it into an MTG.
+
+    Instead of loading the whole xml tree before processing it, the file is
+    read with `iterparse`:
+      - plants and root axes are added to the MTG when their start tag is read
+      - the content elements of the metadata and of the axes (geometry,
+        functions, properties...) are processed when their end tag is read
+      - finished elements are cleared and detached from their xml parent
+
+    The memory used is thus bounded by the deepest open root axis, not by the
+    size of the file.
+    """
+    content_tags = set(['metadata', 'properties', 'geometry', 'functions',
+                        'annotations'])
+
+    @instrument.timed('parse')
+    def parse(self, filename, debug=False):
+        self.init_parsing(debug)
+
+        nodes = []         # stack of the open plant & root proxy nodes
+        elts  = []         # stack of the open xml elements
+        content = None     # element processed on its end tag (if any)
+        parsed = 0         # number of xml elements
+
+        for event, elt in self.backend.iterparse(filename, events=('start','end')):
+            if event=='start':
+                elts.append(elt)
+                if content is not None:
+                    continue
+
+                tag = elt.tag
+                if tag in self.content_tags:
+                    content = elt
+                elif tag=='plant':
+                    nodes.append(self.add_plant())
+                elif tag=='root':
+                    if nodes:
+                        nodes.append(self.add_root(nodes[-1], dict(elt.attrib)))
+                    else:
+                        # not in a plant: skip it, as `Parser` does
+                        content = elt
+                continue
+
+            # end event
+            parsed += 1
+            elts.pop()
+            if content is not None:
+                if elt is not content:
+                    continue
+                content = None
+                if elt.tag in self.content_tags:
+                    self.dispatch(elt)
+            elif elt.tag in ('plant','root'):
+                nodes.pop()
+                self._node = nodes[-1] if nodes else None
+            else:
+                continue
+
+            # free processed element
+            elt.clear()
+            if elts:
+                elts[-1].remove(elt)
+
+        instrument.count('elements', parsed)
+        return self.end_parsing()
+
+
 class Annotation(object):
     def __init__(self, name):
         self.name = name
@@ -304,24 +492,219 @@ def read_xml_tree(elt):
         return elt.text
             
 
+##########################################################################
+# Lazy access to the plants of a rsml file
+
+import re as _re
+
+_index_pattern = _re.compile(r"""<!--.*?-->|<!\[CDATA\[.*?\]\]>|"""
+                             r"""<(/?)(rsml|metadata|plant|root)(?=[\s/>])"""
+                             r"""((?:"[^"]*"|'[^']*'|[^'">])*)>""", _re.S)
+
+def index_rsml(filename):
+    """ Scan rsml `filename` and return the byte offsets of its main elements
+    
+    The file content is not parsed. It is only scanned for the tags of the 
+    `rsml`, `metadata`, `plant` and `root` elements.
+    
+    :Outputs:
+      A dictionary with items:
+        - 'header':   end offset of the `rsml` start tag (everything before
+                      it is the xml declaration and the `rsml` start tag)
+        - 'metadata': (start,end) offsets of the `metadata` element, or None
+        - 'plants':   list of (start,end) offsets of all `plant` elements,
+                      and of `root` elements which are direct child of scene
+        - 'is_plant': list of booleans which are False for such `root`
+    """
+    import mmap
+    
+    index = dict(header=None, metadata=None, plants=[], is_plant=[])
+    
+    with open(filename, 'rb') as f:
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start  = None   # start of the current top-level element
+            depth  = 0      # depth of plant/root elements
+            
+            for match in _index_pattern.finditer(content):
+                closing, tag, attrib = match.groups()
+                if tag is None:          # comment or cdata
+                    continue
+                
+                empty = attrib.endswith('/')
+                
+                if tag=='rsml':
+                    if not closing and index['header'] is None:
+                        index['header'] = match.end()
+                        
+                elif tag=='metadata':
+                    if depth: continue
+                    if closing:
+                        index['metadata'] = (start, match.end())
+                    elif empty:
+                        index['metadata'] = (match.start(), match.end())
+                    else:
+                        start = match.start()
+                        
+                elif closing:
+                    depth -= 1
+                    if depth==0:
+                        index['plants'].append((start, match.end()))
+                        index['is_plant'].append(tag=='plant')
+                        
+                elif depth==0:
+                    if empty:
+                        index['plants'].append((match.start(), match.end()))
+                        index['is_plant'].append(tag=='plant')
+                    else:
+                        start = match.start()
+                        depth = 1
+                        
+                elif not empty:
+                    depth += 1
+        finally:
+            content.close()
+            
+    if index['header'] is None:
+        raise ValueError('Invalid rsml file: no rsml element in ' + str(filename))
+        
+    return index
+    
+
+class RSMLFile(object):
+    """ Lazy access to the content of a rsml file 
+    
+    At construction, the file is scanned by `index_rsml` to find the offsets
+    of its main elements. Then only the requested parts are read and parsed:
+      - `metadata`:  the rsml metadata dictionary
+      - `plants[i]`: a MTG containing only the ith plant (and the metadata)
+      
+    `root` elements which are direct child of the scene element are considered
+    as plants with a single 1st order root axis.
+    
+    example::
+    
+        f = open_rsml(filename)
+        print f.metadata['resolution'], len(f.plants)
+        g = f.plants[2]
+    """
+    def __init__(self, filename, debug=False, backend=None):
+        self.filename = filename
+        self.debug = debug
+        self.backend = backend
+        self.index = index_rsml(filename)
+        self.plants = _PlantSequence(self)
+        self._metadata = None
+        
+    def read(self, start, end):
+        """ return the content of the file between offsets `start` and `end` """
+        with open(self.filename, 'rb') as f:
+            f.seek(start)
+            return f.read(end-start)
+            
+    def parse(self, content=''):
+        """ parse `content` within the rsml element, after the metadata """
+        from StringIO import StringIO
+        
+        index = self.index
+        doc = [self.read(0, index['header'])]
+        if index['metadata']:
+            doc.append(self.read(*index['metadata']))
+        doc.extend([content, '</rsml>'])
+        
+        parser = Parser(backend=self.backend)
+        return parser.parse(StringIO(''.join(doc)), debug=self.debug)
+        
+    @property
+    def metadata(self):
+        """ the metadata dictionary of the file """
+        if self._metadata is None:
+            g = self.parse()
+            self._metadata = g.graph_properties().get('metadata', {})
+        return self._metadata
+        
+    def plant(self, i):
+        """ parse and return the MTG of the ith plant """
+        start, end = self.index['plants'][i]
+        content = self.read(start, end)
+        if not self.index['is_plant'][i]:
+            content = '<plant>' + content + '</plant>'
+        return self.parse('<scene>' + content + '</scene>')
+        
+class _PlantSequence(object):
+    """ Sequence of plants of a `RSMLFile`, parsed on demand """
+    def __init__(self, rsml_file):
+        self._file = rsml_file
+    def __len__(self):
+        return len(self._file.index['plants'])
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._file.plant(j) for j in xrange(*i.indices(len(self)))]
+        return self._file.plant(i)
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self._file.plant(i)
+        
+        
 ##########################################################################
 # Create an XML file from an MTG
 
 class Dumper(object):
     """ Convert an MTG into RSML format 
 
+    The xml tree is constructed with the xml library `backend` (see
+    `rsml.backend`). `dump` returns it as indented xml text.
     """
     accession = "{http://www.plantontology.org/xml-dtd/po.dtd}accession"
+    indent = '  '
+    
+    def __init__(self, backend=None):
+        self.backend = backend
+        
+    @instrument.timed('dump')
     def dump(self, graph):
+        from StringIO import StringIO
+        
+        self._backend = get_backend(self.backend)
         self._g = graph
         self.mtg()
         
-        xmlstr = xml.tostring(self.xml_root, encoding='UTF-8')
-        prettystr = minidom.parseString(xmlstr)
-        return prettystr.toprettyxml(indent="  ", encoding='UTF-8')
+        output = StringIO()
+        output.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.write_element(self.xml_root, output.write)
+        output = output.getvalue()
+        
+        instrument.count('bytes_written', len(output))
+        return output
 
+    def write_element(self, elt, write, depth=0):
+        """ write xml element `elt` and its children, as indented text
+        
+        The output is the same as minidom `toprettyxml`
+        """
+        tag = elt.tag
+        children = list(elt)
+        write(self.indent*depth + _start_tag(tag, self._backend.attributes(elt)))
+        
+        if not children:
+            if elt.text:
+                write('>'+_escape_xml(elt.text)+'</'+tag+'>\n')
+            else:
+                write('/>\n')
+            return
+        
+        write('>\n')
+        if elt.text:
+            write(self.indent*(depth+1)+_escape_xml(elt.text)+'\n')
+        for child in children:
+            self.write_element(child, write, depth+1)
+        write(self.indent*depth+'</'+tag+'>\n')
+        
+    def Element(self, tag, attrib={}):
+        return self._backend.Element(tag, attrib=attrib)
+        
     def SubElement(self, parent, tag, text='', attrib={}, **kwds):
-        elt = xml.SubElement(parent, tag, attrib, **kwds)
+        elt = self._backend.SubElement(parent, tag, dict(attrib, **kwds))
         elt.text = text
         return elt
         
@@ -333,7 +716,7 @@ class Dumper(object):
           - a subtree for dictionary item
           - an element otherwise with text set to `str(item-value)`
         """
-        elt = xml.SubElement(parent, tag)
+        elt = self.SubElement(parent, tag)
         for name, child in tree.iteritems():
             if isinstance(child,dict):
                 self.SubTree(elt, name, child)
@@ -346,7 +729,7 @@ class Dumper(object):
         # Create a DocType at the begining of the file
         
         # Create the metadata
-        self.xml_root = xml.Element('rsml',
+        self.xml_root = self.Element('rsml',
                         attrib={"xmlns:po":"http://www.plantontology.org/xml-dtd/po.dtd"})
         self.xml_nodes = {}
 
@@ -355,7 +738,7 @@ class Dumper(object):
 
     def metadata(self):
         g = self._g
-        self.xml_meta = xml.SubElement(self.xml_root,'metadata')
+        self.xml_meta = self.SubElement(self.xml_root,'metadata')
 
         gmetadata = metadata.set_metadata(g)
         
@@ -428,11 +811,13 @@ class Dumper(object):
         self.prev_node = g.node(vid)
         props = g[vid]
 
-        self.xml_nodes[vid] = plant = self.SubElement(self.xml_scene, 'plant')        
-
         # Extract SegmentType & LeafType
-        plant.attrib['id'] = str(props.pop('id', vid))
-        plant.attrib['label'] = str(props.pop('label', g.label(vid)))        
+        attrib = {}
+        attrib['id'] = str(props.pop('id', vid))
+        attrib['label'] = str(props.pop('label', g.label(vid)))        
+
+        self.xml_nodes[vid] = plant = self.SubElement(self.xml_scene, 'plant', 
+                                                      attrib=attrib)
         
         for rid in g.component_roots_iter(vid):
             self.root(plant, rid)
@@ -443,19 +828,21 @@ class Dumper(object):
         g = self._g
         vid = mtg_vid
         
-        self.xml_nodes[vid] = axis = self.SubElement(xml_parent, 'root') 
-
         # set xml attributes
         props = g[vid]
-        axis.attrib['id']    = str(props.pop('id', vid))
-        axis.attrib['label'] = str(props.pop('label', g.label(vid)))
+        attrib = {}
+        attrib['id']    = str(props.pop('id', vid))
+        attrib['label'] = str(props.pop('label', g.label(vid)))
         if 'po:accession' in props:
-            axis.attrib['po:accession'] = str(props.pop('po:accession'))
+            attrib['po:accession'] = str(props.pop('po:accession'))
+
+        self.xml_nodes[vid] = axis = self.SubElement(xml_parent, 'root', 
+                                                     attrib=attrib) 
 
         # set xml axis element
         self.properties(vid, axis)
-        ##self.functions(axis,**props)
         self.geometry(axis,**props)
+        self.functions(axis,**props)
         
         # process children root axis
         # --------------------------
@@ -475,6 +862,8 @@ class Dumper(object):
             ta = self.SubElement(axis, 'geometry')
             tb = self.SubElement(ta,   'polyline')
             xyz=['x','y','z']
+            if hasattr(polyline,'tolist'):
+                polyline = polyline.tolist()   # columnar geometry
             for pt in polyline: 
                 pt_elt = self.SubElement(tb, 'point', 
                                          attrib=dict(zip(xyz,map(str,pt))))
@@ -501,58 +890,524 @@ class Dumper(object):
     def functions(self, axis, **props):
         """ Set the root `axis` functions
         
-        `axis` is the xml element id of the root axis
-        `props` ....
+        `axis` is the xml element of the root axis
+        `props` are the axis properties: those listed in the 'functions' item
+        of the mtg metadata are written as functions. Sequences of values
+        are written with 'polyline' domain, and sequences of (position,value)
+        with 'length' domain.
         """
-        # TODO: Hack, hack, hack...
-        g = self._g
-        graph_prop = g.graph_properties()
-        pname = []
-        if 'metadata' in graph_prop:
-            meta = graph_prop['metadata']
-            if 'functions' in meta:
-                pname = meta['functions']
+        gmetadata = self._g.graph_properties().get('metadata', {})
+        names = [name for name in gmetadata.get('functions',[]) if name in props]
         
         functions_elt = None
-        for tag in pname:
-            if tag in props:
-                if functions_elt is None:
-                    functions_elt = self.SubElement(xml_elt, 'functions')
-                function_elt = self.SubElement(functions_elt, 'function')
-                function_elt.attrib['domain'] = 'polyline'
-                function_elt.attrib['name'] = tag
-        
-                for sample in attrib[tag]:
-                    sample_elt = self.SubElement(function_elt, 'sample')
-                    if isinstance(sample, (tuple, list)) and len(sample)  == 2:
-                        sample_elt.attrib['position'] = str(sample[0])
-                        sample_elt.attrib['value'] = str(sample[1])
-                    else:
-                        sample_elt.attrib['value'] = str(sample)
-                        
+        for name in names:
+            samples = props[name]
+            if hasattr(samples,'tolist'):
+                samples = samples.tolist()         # array functions
+            if not isinstance(samples, (list, tuple)):
+                continue
+            length = len(samples)>0 and isinstance(samples[0], (list, tuple))
+            
+            if functions_elt is None:
+                functions_elt = self.SubElement(axis, 'functions')
+            function_elt = self.SubElement(functions_elt, 'function', 
+                    attrib=dict(name=name, domain='length' if length else 'polyline'))
+            
+            if length:
+                for position, value in samples:
+                    self.SubElement(function_elt, 'sample', text=str(value),
+                                    attrib=dict(position=str(position)))
+            else:
+                self.SubElements(function_elt, 'sample', map(str,samples))
                         
+    def SubElements(self, parent, tag, texts):
+        """ append a `tag` element to `parent` for all `texts`, with that text """
+        for text in texts:
+            self.SubElement(parent, tag, text=text)
+
+class StreamDumper(Dumper):
+    """ Write an MTG in RSML format directly into a file
+    
+    Same as `Dumper`, but the xml elements are written as soon as they are 
+    created, instead of being stored in an xml tree. The output is the same
+    as the indented xml returned by `Dumper.dump`, but memory usage does not
+    depend on the size of the MTG.
+    """
+    indent = '  '
+    
+    @instrument.timed('dump')
+    def dump(self, graph, output):
+        """ write `graph` into file object `output` """
+        self._write = output.write
+        self._open  = []        # stack of open elements
+        
+        written = None
+        if instrument.enabled():
+            written = [0]
+            def write(text):
+                written[0] += len(text)
+                output.write(text)
+            self._write = write
+        
+        self._g = graph
+        self._write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.mtg()
+        while self._open:
+            self._end(self._open.pop())
+            
+        if written is not None:
+            instrument.count('bytes_written', written[0])
+    
+    def Element(self, tag, attrib={}):
+        elt = _StreamElement(tag, depth=0)
+        self._start(elt, attrib)
+        self._open.append(elt)
+        return elt
+    
+    def SubElement(self, parent, tag, text='', attrib={}, **kwds):
+        attrib = dict(attrib, **kwds)
+        self._open_content(parent)
+            
+        elt = _StreamElement(tag, depth=parent.depth+1)
+        self._start(elt, attrib)
+        if text:
+            self._write('>'+_escape_xml(text)+'</'+tag+'>\n')
+        else:
+            self._open.append(elt)
+        return elt
+        
+    def SubElements(self, parent, tag, texts):
+        """ write a `tag` element in `parent` for all `texts`, at once """
+        self._open_content(parent)
+        start = self.indent*(parent.depth+1) + '<'+tag+'>'
+        end   = '</'+tag+'>\n'
+        self._write(''.join(start+_escape_xml(text)+end if text else start[:-1]+'/>\n'
+                            for text in texts))
+        
+    def _open_content(self, parent):
+        """ prepare the writing of a child of `parent` """
+        # close elements that cannot have more children
+        if parent not in self._open:
+            raise ValueError('Element {} is already written'.format(parent.tag))
+        while self._open[-1] is not parent:
+            self._end(self._open.pop())
+        if parent.empty:
+            self._write('>\n')
+            parent.empty = False
+        
+    def _start(self, elt, attrib):
+        """ write start tag of `elt`, without closing it """
+        self._write(self.indent*elt.depth + _start_tag(elt.tag, attrib))
+        
+    def _end(self, elt):
+        """ write end tag of `elt` """
+        if elt.empty:
+            self._write('/>\n')
+        else:
+            self._write(self.indent*elt.depth+'</'+elt.tag+'>\n')
+            
+    def metadata(self):
+        g = self._g
+        self.xml_meta = self.SubElement(self.xml_root,'metadata')
+
+        gmetadata = metadata.set_metadata(g)
+        
+        for tag in metadata.flat_metadata:
+            self.SubElement(self.xml_meta, tag=tag, text=str(gmetadata[tag]))
+            
+        self.image(gmetadata)
+        self.property_definitions(gmetadata)
+        
+    def plant(self, vid):
+        Dumper.plant(self, vid)
+        self.xml_nodes.pop(vid)
+        
+    def root(self, xml_parent, mtg_vid):
+        Dumper.root(self, xml_parent, mtg_vid)
+        self.xml_nodes.pop(mtg_vid)
+            
+class _StreamElement(object):
+    """ xml element written by `StreamDumper` """
+    __slots__ = ('tag','depth','empty')
+    def __init__(self, tag, depth):
+        self.tag = tag
+        self.depth = depth
+        self.empty = True
+        
+def _start_tag(tag, attrib):
+    """ return the start tag of element `tag`, without the closing '>' """
+    attrib = ''.join(' '+name+'="'+_escape_attrib(attrib[name])+'"'
+                            for name in sorted(attrib))
+    return '<'+tag+attrib
+        
+def _escape_xml(text):
+    """ escape `text` as minidom does, after xml parsing normalization """
+    if isinstance(text, unicode):
+        text = text.encode('UTF-8')
+    text = text.replace('\r\n','\n').replace('\r','\n')
+    return text.replace("&", "&amp;").replace("<", "&lt;"). \
+                replace("\"", "&quot;").replace(">", "&gt;")
+                
+def _escape_attrib(text):
+    """ escape attribute `text` as minidom does, after xml parsing normalization """
+    return _escape_xml(text.replace('\r',' ').replace('\t',' '))
+        
 
+##########################################################################
+# Binary cache of rsml mtg
+
+# version of the cache format
+cache_version = 2
+
+def mtg2npz(g, filename, source=None):
+    """ Write mtg `g` into a binary cache file `filename`
+    
+    The file is an uncompressed numpy `.npz` archive containing:
+      - 'vertices', 'complexes', 'parents': the mtg topology (see `misc.mtg_topology`)
+      - 'coordinates', 'offsets', 'geometry': the concatenated geometry, as in 
+        `rsml.geometry.GeometryStore`
+      - 'function:<name>', 'function-vertices:<name>': the values of function
+        `name` at all points of the geometry, and the vertices that have them
+        (see `rsml.geometry.set_columnar_functions`)
+      - 'property:<name>', 'property-vertices:<name>': the values and vertices
+        of the numeric properties
+      - 'properties': the other values of the mtg properties, as literal text
+      - 'graph_properties': the mtg graph properties, as literal text
+      - 'header': the cache format version and the `source` rsml file name,
+        size, modification time and metadata file-key, as literal text.
+        
+    The literal texts can be read safely with `ast.literal_eval` (see 
+    `metadata.filter_literal`). Values that are not literal are replaced by
+    None. The file does not contain pickled objects, and is read by `npz2mtg`.
+    """
+    import os
+    import numpy as np
+    from .misc import mtg_topology
+    from .geometry import GeometryStore
+    
+    vertices, complexes, parents = mtg_topology(g)
+    none = lambda ids: [-1 if vid is None else vid for vid in ids]
+    
+    store = GeometryStore.from_mtg(g)
+    gprop = g.graph_properties()
+    gprop = dict((k,v) for k,v in gprop.iteritems() 
+                       if k not in ('geometry-store','topology'))
+    
+    arrays = {}
+    functions = set(gprop.get('metadata',{}).get('functions',[]))
+    properties = {}
+    for name, prop in g.properties().iteritems():
+        if name=='geometry':
+            continue
+        prop = dict(prop)
+        if name in functions:
+            prop = _npz_function(arrays, name, prop, store)
+        properties[name] = _npz_property(arrays, name, prop)
+    
+    header = dict(version=cache_version, source=source,
+                  file_key=gprop.get('metadata',{}).get('file-key'))
+    if source is not None:
+        stat = os.stat(source)
+        header.update(size=stat.st_size, mtime=stat.st_mtime)
+    
+    np.savez(filename, header=_npz_literal(header),
+             vertices=np.array(vertices, dtype=int),
+             complexes=np.array(none(complexes), dtype=int),
+             parents=np.array(none(parents), dtype=int),
+             coordinates=store.coordinates,
+             offsets=store.offsets,
+             geometry=np.array(store.vertices, dtype=int),
+             properties=_npz_literal(properties),
+             graph_properties=_npz_literal(gprop),
+             **arrays)
+
+def npz2mtg(filename, mmap=True):
+    """ Read the mtg stored in binary cache file `filename`
+    
+    If `mmap` is True, the geometry arrays are memory-mapped: they are not 
+    read before being accessed. The 'geometry' property of the returned mtg
+    is columnar (see `rsml.geometry`), as well as its functions.
+    
+    :See also: `mtg2npz`
+    """
+    from .misc import build_mtg
+    from .geometry import GeometryStore
+    
+    arrays = _load_npz(filename, mmap=mmap)
+    
+    header = _npz_eval(arrays['header'])
+    if header['version']!=cache_version:
+        raise IOError('Unsupported rsml cache version: '+str(header['version']))
+    
+    properties = _npz_eval(arrays['properties'])
+    for key in arrays:
+        if key.startswith('property:'):
+            name = key[len('property:'):]
+            values = arrays[key].tolist()
+            vertices = arrays['property-vertices:'+name].tolist()
+            properties.setdefault(name,{}).update(zip(vertices,values))
+    
+    none = lambda ids: [None if vid<0 else vid for vid in ids.tolist()]
+    g = build_mtg(arrays['vertices'].tolist(), none(arrays['complexes']), 
+                  none(arrays['parents']), properties)
+    g.graph_properties().update(_npz_eval(arrays['graph_properties']))
+    
+    store = GeometryStore(arrays['coordinates'], arrays['offsets'], 
+                          arrays['geometry'].tolist())
+    set_columnar_geometry(g, store)
+    
+    # functions: views of their arrays
+    for key in arrays:
+        if key.startswith('function:'):
+            name = key[len('function:'):]
+            array = arrays[key]
+            store.functions[name] = array
+            values = g.properties().setdefault(name,{})
+            offsets = store.offsets
+            for k in store.indices(arrays['function-vertices:'+name].tolist()):
+                values[store.vertices[k]] = array[offsets[k]:offsets[k+1]]
+    
+    return g
+    
+def npz_header(filename):
+    """ return the header dictionary of binary cache file `filename` """
+    import numpy as np
+    with np.load(filename, allow_pickle=False) as arrays:
+        return _npz_eval(arrays['header'])
+    
+def npz_is_valid(filename, source):
+    """ True if cache `filename` exists and was made from rsml file `source` 
+    
+    The cache is valid if the size and modification time of `source` are the
+    same as when the cache was written.
+    """
+    import os
+    if not os.path.exists(filename):
+        return False
+    try:
+        header = npz_header(filename)
+    except Exception:
+        return False
+    stat = os.stat(source)
+    return (header.get('version')==cache_version and
+            header.get('size')==stat.st_size and 
+            header.get('mtime')==stat.st_mtime)
+    
+def _npz_function(arrays, name, values, store):
+    """ add the array of function `name` to `arrays`, return the other values """
+    import numpy as np
+    offsets = store.offsets
+    vertices = []
+    for k,vid in enumerate(store.vertices):
+        value = values.get(vid)
+        if (np.ndim(value)==1 and len(value)==offsets[k+1]-offsets[k] and
+            np.asarray(value).dtype.kind in 'biuf'):
+            vertices.append(vid)
+    if vertices:
+        functions = dict((vid,values.pop(vid)) for vid in vertices)
+        arrays['function:'+name] = store.node_values(functions)
+        arrays['function-vertices:'+name] = np.array(vertices, dtype=int)
+    return values
+    
+def _npz_property(arrays, name, values):
+    """ add the int or float values of property `name` to `arrays`
+    
+    Return the other values.
+    """
+    import numpy as np
+    numbers = dict((vid,v) for vid,v in values.iteritems()
+                   if isinstance(v,(int,long,float,np.integer,np.floating)) 
+                   and not isinstance(v,(bool,np.bool_)))
+    if not numbers:
+        return values
+    integer = all(isinstance(v,(int,long,np.integer)) for v in numbers.itervalues())
+    if not integer and not all(isinstance(v,(float,np.floating)) for v in numbers.itervalues()):
+        return values         # mixed int and float: kept as literals
+    arrays['property:'+name] = np.array(numbers.values(), dtype=int if integer else float)
+    arrays['property-vertices:'+name] = np.array(numbers.keys(), dtype=int)
+    return dict((vid,v) for vid,v in values.iteritems() if vid not in numbers)
+    
+def _npz_literal(obj):
+    """ return `obj` as a numpy string of its literal representation
+    
+    Datetimes and non-finite floats, which are not literal, are replaced by
+    tagged dictionaries that are converted back by `_npz_eval`.
+    """
+    import numpy as np
+    from datetime import datetime
+    
+    def literal(obj):
+        if isinstance(obj, datetime):
+            return {'__datetime__':obj.isoformat()}
+        elif isinstance(obj, (float,np.floating)):
+            return float(obj) if np.isfinite(obj) else {'__float__':repr(float(obj))}
+        elif isinstance(obj, np.generic):
+            return literal(obj.item())
+        elif isinstance(obj, np.ndarray):
+            return literal(obj.tolist())
+        elif isinstance(obj, tuple):
+            return tuple(map(literal, obj))
+        elif isinstance(obj, list):
+            return map(literal, obj)
+        elif hasattr(obj,'iteritems'):
+            return dict((literal(k),literal(v)) for k,v in obj.iteritems())
+        return metadata.filter_literal(obj)
+        
+    return np.array(repr(literal(obj)))
+    
+def _npz_eval(array):
+    """ return the object stored by `_npz_literal` in numpy string `array` """
+    def value(obj):
+        if isinstance(obj, dict):
+            if obj.keys()==['__datetime__']:
+                return _iso2datetime(obj['__datetime__'])
+            if obj.keys()==['__float__']:
+                return float(obj['__float__'])
+            return dict((value(k),value(v)) for k,v in obj.iteritems())
+        elif isinstance(obj, tuple):
+            return tuple(map(value, obj))
+        elif isinstance(obj, list):
+            return map(value, obj)
+        return obj
+        
+    if array.dtype.kind!='S':
+        raise IOError('Invalid rsml cache content')
+    return value(literal_eval(str(array[()])))
+    
+def _iso2datetime(text):
+    """ convert the isoformat `text` of a datetime back to datetime """
+    from datetime import datetime as dt
+    time_format = '%Y-%m-%dT%H:%M:%S.%f' if '.' in text else '%Y-%m-%dT%H:%M:%S'
+    return dt.strptime(text, time_format)
+    
+def _load_npz(filename, mmap=True):
+    """ return the dictionary of the arrays stored in npz `filename`
+    
+    If `mmap` is True, the arrays stored uncompressed are memory-mapped. 
+    Arrays of python objects, which would need unpickling, are not loaded:
+    an IOError is raised.
+    """
+    import struct
+    import zipfile
+    import numpy as np
+    from numpy.lib import format
+    
+    if not mmap:
+        try:
+            with np.load(filename, allow_pickle=False) as arrays:
+                return dict((name,arrays[name]) for name in arrays.files)
+        except ValueError as error:
+            raise IOError(str(error))
+    
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename,'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-4]     # remove '.npy'
+            if info.compress_type!=zipfile.ZIP_STORED:
+                try:
+                    arrays[name] = np.load(archive.open(info), allow_pickle=False)
+                except ValueError as error:
+                    raise IOError(str(error))
+                continue
+                
+            # skip the zip local file header
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset+30+name_length+extra_length)
+            
+            # read npy header
+            version = format.read_magic(f)
+            if version==(1,0):
+                shape, fortran, dtype = format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = format.read_array_header_2_0(f)
+            
+            if dtype.hasobject:
+                raise IOError('Object arrays are not allowed in rsml cache: '+name)
+            elif np.prod(shape)==0 or dtype.kind=='S':
+                f.seek(info.header_offset+30+name_length+extra_length)
+                arrays[name] = format.read_array(f, allow_pickle=False)
+            else:
+                arrays[name] = np.memmap(filename, dtype=dtype, mode='r', 
+                                         shape=shape, offset=f.tell(),
+                                         order='F' if fortran else 'C')
+    return arrays
+    
+    
 ##########################################################################
 # Wrapper functions for OpenAlea usage.
 
-def rsml2mtg(rsml_graph, debug=False):
+def rsml2mtg(rsml_graph, debug=False, stream=False, columnar=False, backend=None):
     """
     Convert a rsml string, or file, to a MTG.
+
+    If `stream` is True, the file is read incrementally using `StreamParser`,
+    which keeps memory usage low for big files.
+
+    If `columnar` is True, the geometry of all root axes is stored in one
+    array. See `rsml.geometry`.
+
+    `backend` is the name of the xml library to use. See `rsml.backend`.
     """
-    parser = Parser()
+    parser = StreamParser if stream else Parser
+    parser = parser(columnar=columnar, backend=backend)
     return parser.parse(rsml_graph, debug=debug)
     
 
-def mtg2rsml(g, rsml_file):
+def cached_rsml2mtg(rsml_file, cache_file=None, mmap=True, **kwds):
+    """
+    Convert rsml file `rsml_file` to a MTG, using a binary cache file
+    
+    If `cache_file` is a valid cache of `rsml_file` (see `npz_is_valid`), the
+    mtg is loaded from it (see `npz2mtg`). Otherwise, the rsml file is parsed
+    by `rsml2mtg` - with optional `kwds` arguments - and the cache is written.
+    
+    By default, `cache_file` is `rsml_file` with an additional '.npz' extension
+    """
+    if cache_file is None:
+        cache_file = rsml_file + '.npz'
+        
+    if npz_is_valid(cache_file, rsml_file):
+        return npz2mtg(cache_file, mmap=mmap)
+        
+    g = rsml2mtg(rsml_file, **kwds)
+    mtg2npz(g, cache_file, source=rsml_file)
+    return g
+    
+
+def mtg2rsml(g, rsml_file, stream=True, backend=None):
     """
     Write **continuous** mtg `g` in `rsml_file`
     
+    If `stream` is True, the file is written progressively by `StreamDumper`.
+    Otherwise, the xml content is first constructed in memory by `Dumper`,
+    using the xml library `backend` (see `rsml.backend`). 
+    All give the same file.
+    
+    The metadata of `g` are completed by `rsml.metadata.set_metadata`.
+    In particular, the sha256 hash of its image file is computed if missing,
+    and stored in the persistent hash cache if the RSML_HASH_CACHE 
+    environment variable is set (see `rsml.metadata.file_sha256`).
+    
     :See also: `Dumper`, `rsml.continuous`
     """
-    dump = Dumper()
-    s = dump.dump(g)
     if isinstance(rsml_file,basestring):
         with open(rsml_file, 'w') as f:
-            f.write(s)
+            return mtg2rsml(g, f, stream=stream, backend=backend)
+            
+    if stream:
+        StreamDumper().dump(g, rsml_file)
     else:
+        dump = Dumper(backend=backend)
+        s = dump.dump(g)
         rsml_file.write(s)
+        
+
+def open_rsml(filename, debug=False, backend=None):
+    """
+    Open rsml `filename` for lazy access to its metadata and plants
+    
+    :See also: `RSMLFile`
+    """
+    return RSMLFile(filename, debug=debug, backend=backend)
@@ -6,7 +6,7 @@ import numpy as _np
 
 from rsml.misc import plant_vertices
 
-def match_plants(t1,t2, max_distance=None):
+def match_plants(t1,t2, max_distance=None, method='greedy', cache1=None, cache2=None):
     """
     Find a 1-to-1 matching between plants in `t1` & `t2` 
     
@@ -18,28 +18,15 @@ def match_plants(t1,t2, max_distance=None):
      - the set of unmatch t1 plant id
      - the set of unmatch t2 plant id
     
-    The matching is done usinf `one_to_one_match`
+    The matching is done usinf `one_to_one_match` with given `method`
+    
+    `cache1` and `cache2` are optional `MatchingCache` of `t1` and `t2`
     """
-    from operator import div
+    if cache1 is None: cache1 = MatchingCache(t1)
+    if cache2 is None: cache2 = MatchingCache(t2)
     
-    # compute seed position of plants in t
-    # ------------------------------------
-    def seeds_position(t):
-        """ return dict of (plant-id, (x, y)) """
-        plants = plant_vertices(t)
-        
-        seed_pos = {}
-        geometry = t.property('geometry')
-        for plant in plants:
-            axes = t.component_roots(plant)
-            apos = zip(*[geometry[axe][0] for axe in axes])
-            spos = map(div, map(sum,apos), map(len,apos))
-            seed_pos[plant] = spos
-        
-        return seed_pos
-        
-    seed1 = seeds_position(t1)
-    seed2 = seeds_position(t2)
+    seed1 = cache1.seeds()
+    seed2 = cache2.seeds()
     
     # make distance matrix
     # --------------------
@@ -51,7 +38,7 @@ def match_plants(t1,t2, max_distance=None):
     
     D = ((X1-X2)**2).sum(axis=-1)**.5         # (n1,n2)
 
-    matched,u1,u2 = one_to_one_match(D,max_distance=max_distance)
+    matched,u1,u2 = one_to_one_match(D,max_distance=max_distance, method=method)
     
     # convert array id to plant id
     matched = set((I1[p1],I2[p2],d) for p1,p2,d in matched)
@@ -60,17 +47,19 @@ def match_plants(t1,t2, max_distance=None):
     
     return matched, unmatched1, unmatched2
         
-def match_roots(t1,t2, plant_match, max_distance=None):
+def match_roots(t1,t2, plant_match, max_distance=None, method='greedy',
+                cache1=None, cache2=None):
     """ Iteratively match root axes following the trees topology
     
     This function iteratively match root axes from 1st to last (topological) 
     order. The matching is selected using `one_to_one_match` using hausdorff
-    distance.
+    distance, with given `method`.
     
     :Inputs:
       t1: 1st rsml-mtg
       t2: 2nd rsml-mtg
       plant_match: match between plants in `t1` and `t2`
+      cache1, cache2: optional `MatchingCache` of `t1` and `t2`
     
     :Outputs:
       - the set of root matches as (t1_root_id, t2_root_id, hausdorff-distance)
@@ -80,6 +69,9 @@ def match_roots(t1,t2, plant_match, max_distance=None):
     Note:
       Children of unmatched elements are not listed in unmatched sets
     """
+    if cache1 is None: cache1 = MatchingCache(t1)
+    if cache2 is None: cache2 = MatchingCache(t2)
+    
     match = set()
     queue = set()
     unmatched1 = set()
@@ -87,8 +79,9 @@ def match_roots(t1,t2, plant_match, max_distance=None):
     
     def find_match(axes1, axes2):
         if len(axes1) and len(axes2):
-            m,u1,u2 = _match_root_axes(t1=t1,axes1=axes1,t2=t2,axes2=axes2,
-                                       max_distance=max_distance)
+            m,u1,u2 = _match_root_axes(cache1=cache1,axes1=axes1,
+                                       cache2=cache2,axes2=axes2,
+                                       max_distance=max_distance, method=method)
         else:
             m = []
             u1 = axes1
@@ -112,34 +105,36 @@ def match_roots(t1,t2, plant_match, max_distance=None):
         
     return match, unmatched1, unmatched2
 
-def _match_root_axes(t1, axes1, t2, axes2, max_distance=None):
-    """ return "best" match between axes in `axes1` and in `axes2` """
+def _match_root_axes(cache1, axes1, cache2, axes2, max_distance=None, method='greedy'):
+    """ return "best" match between axes in `axes1` and in `axes2` 
+    
+    If `max_distance` is given, the hausdorff distance is computed only for
+    the pairs of axes which bounding boxes are close enough for the distance
+    to be less than `max_distance` (see `hausdorff_lower_bound`), and the 
+    matching is done on this candidate list by `sparse_one_to_one_match`.
+    """
     from rsml.misc import hausdorff_distance
     
     # construct distance matrix
-    geom1 = t1.property('geometry')
-    geom2 = t2.property('geometry')
-    
-    D = _np.zeros((len(axes1),len(axes2)))
+    poly1 = cache1.polylines(axes1)
+    poly2 = cache2.polylines(axes2)
     
-    axe2_poly = {}
-    
-    for i,axe1 in enumerate(axes1):
-        p1 = _np.array(geom1[axe1])
+    if max_distance is None:
+        D = _np.zeros((len(axes1),len(axes2)))
+        for i,j in _np.ndindex(D.shape):
+            D[i,j] = hausdorff_distance(poly1[i].T,poly2[j].T)
+        m, u1, u2 = one_to_one_match(D, method=method)
         
-        for j,axe2 in enumerate(axes2):
-            if axe2 in axe2_poly:
-                p2 = axe2_poly[axe2]
-            else:
-                p2 = _np.array(geom2[axe2])
-                axe2_poly[axe2] = p2
-            
-            D[i,j] = hausdorff_distance(p1.T,p2.T)
-
+    else:
+        # prune pairs that cannot be matched
+        bound = hausdorff_lower_bound(cache1.boxes(axes1), cache2.boxes(axes2))
+        I,J = (bound<=max_distance).nonzero()
+        D = [hausdorff_distance(poly1[i].T,poly2[j].T, max_distance=max_distance)
+                for i,j in zip(I,J)]
+        m, u1, u2 = sparse_one_to_one_match(I, J, D, shape=bound.shape,
+                                    max_distance=max_distance, method=method)
 
     # compute and return matching
-    m, u1, u2 = one_to_one_match(D, max_distance=max_distance)
-    
     matches = set((axes1[i],axes2[j],d) for i,j,d in m)
     unmatched1 = set(axes1[i] for i in u1)
     unmatched2 = set(axes2[j] for j in u2)
@@ -147,14 +142,104 @@ def _match_root_axes(t1, axes1, t2, axes2, max_distance=None):
     return matches, unmatched1, unmatched2
     
 
-def one_to_one_match(distance, max_distance=None):
-    """ select minimal 1-to-1 matching in `distance` matrix, iteratively
+class MatchingCache(object):
+    """ Geometric data of a rsml mtg, computed once and reused for matching
+    
+    It provides, computed on demand, the root axes polylines as arrays, their 
+    bounding boxes and the plants seed position. A `MatchingCache` can be 
+    given to `match_plants` and `match_roots` to avoid recomputing those data 
+    when the same mtg is matched several times, such as in `rsml.tracking`.
+    """
+    def __init__(self, g):
+        self.g = g
+        self._geometry = g.property('geometry')
+        self._polylines = {}
+        self._boxes = {}
+        self._seeds = None
+        
+    def polylines(self, axes):
+        """ return the list of the polylines of `axes`, as (n,k) arrays """
+        polylines = self._polylines
+        geometry = self._geometry
+        for axe in axes:
+            if axe not in polylines:
+                polylines[axe] = _np.asarray(geometry[axe], dtype=float)
+        return [polylines[axe] for axe in axes]
+        
+    def boxes(self, axes):
+        """ return the (n,2,k) array of the bounding boxes of `axes` """
+        boxes = self._boxes
+        missing = [axe for axe in axes if axe not in boxes]
+        if missing:
+            boxes.update(zip(missing, bounding_boxes(self.polylines(missing))))
+        return _np.array([boxes[axe] for axe in axes]).reshape(len(axes),2,-1)
+        
+    def seeds(self):
+        """ return dict of (plant-id, seed position) """
+        from operator import div
+        
+        if self._seeds is None:
+            t = self.g
+            plants = plant_vertices(t)
+            
+            seed_pos = {}
+            geometry = self._geometry
+            for plant in plants:
+                axes = t.component_roots(plant)
+                apos = zip(*[geometry[axe][0] for axe in axes])
+                spos = map(div, map(sum,apos), map(len,apos))
+                seed_pos[plant] = spos
+                
+            self._seeds = seed_pos
+        
+        return self._seeds
+        
+
+def bounding_boxes(polylines):
+    """ return the bounding boxes of `polylines` as a (n,2,k) array 
+    
+    `polylines` is a list of n polylines, each being a (m,k) array for the m
+    points of the polyline in k-dimension. The returned array contains the min
+    then the max coordinates of each polyline.
+    """
+    boxes = [(p.min(axis=0),p.max(axis=0)) for p in polylines]
+    return _np.array(boxes, dtype=float).reshape(len(polylines),2,-1)
+    
+def hausdorff_lower_bound(boxes1, boxes2):
+    """ return a lower bound of the hausdorff distance between polylines
+    
+    :Inputs:
+      `boxes1`, `boxes2`:
+        the (n1,2,k) and (n2,2,k) arrays of the polylines bounding boxes, 
+        as returned by `bounding_boxes`
+    
+    :Output:
+      A (n1,n2) array of lower bounds of the hausdorff distance between all 
+      pairs of polylines.
+      
+    The lower bound is the maximum of the coordinates difference of the min,
+    and of the max, of the bounding boxes. For example, if the point of 
+    polyline 1 with minimal x is at a distance dx of the minimal x of polyline 
+    2, then it is at least at dx of all points of polyline 2.
+    """
+    diff = _np.abs(boxes1[:,None,:,:]-boxes2[None,:,:,:])  # (n1,n2,2,k)
+    return diff.reshape(diff.shape[:2]+(-1,)).max(axis=-1)
+
+def one_to_one_match(distance, max_distance=None, method='greedy'):
+    """ select minimal 1-to-1 matching in `distance` matrix
+    
+    With `method`='greedy', iteratively select the match `(i,j)` with minimum
+    value in `distance` but only if both `i` and `j` were not matched at a 
+    previous step.
     
-    Iteratively select the match `(i,j)` with minimum value in `distance` but
-    only if both `i` and `j` were not matched at a previous step.
+    With `method`='optimal', select the matching that minimizes the sum of the
+    distances of matched pairs (i.e. the linear assignment problem). It uses
+    `scipy.optimize.linear_sum_assignment` if available, and a numpy 
+    implementation of the hungarian algorithm otherwise.
     
     If `max_distance` is not None, don't match pairs with a distance value
-    higher than given `max_distance`
+    higher than given `max_distance`. With the 'optimal' method, the number of
+    matches is then maximized first, then their distances sum is minimized.
     
     Return:
       - the set match {(i0,j0,d0),(i1,j1,d1),...}
@@ -168,6 +253,11 @@ def one_to_one_match(distance, max_distance=None):
       m,i,j = direct_match(d)
       print '\n'.join(str(ij)+' matched with d='+str(di) for ij,di in zip(m,d[zip(*m)]))
     """
+    if method=='optimal':
+        return _optimal_match(distance, max_distance=max_distance)
+    elif method!='greedy':
+        raise ValueError('Unknown matching method: ' + str(method))
+        
     distance = _np.asarray(distance)
     ni,nj = distance.shape
     distance = distance.ravel()
@@ -178,6 +268,52 @@ def one_to_one_match(distance, max_distance=None):
     
     if max_distance is None: max_distance=d[-1]
     
+    return _greedy_match(ij, d, ni, nj, max_distance)
+    
+def sparse_one_to_one_match(I, J, distance, shape, max_distance=None, method='greedy'):
+    """ select minimal 1-to-1 matching in a sparse list of candidate pairs
+    
+    Same as `one_to_one_match`, but the distance is given only for the pairs
+    `(I[k],J[k])`, with value `distance[k]`. Other pairs cannot be matched.
+    `shape` is the shape `(ni,nj)` of the full distance matrix.
+    """
+    ni,nj = shape
+    I = _np.asarray(I, dtype=int)
+    J = _np.asarray(J, dtype=int)
+    distance = _np.asarray(distance, dtype=float)
+    
+    if max_distance is not None:
+        valid = distance<=max_distance
+        I, J, distance = I[valid], J[valid], distance[valid]
+    
+    if len(distance)==0:
+        return set(), set(range(ni)), set(range(nj))
+        
+    if method=='optimal':
+        # optimal matching on the sub-matrix of candidate rows and columns
+        rows, I = _np.unique(I, return_inverse=True)
+        cols, J = _np.unique(J, return_inverse=True)
+        D = _np.empty((len(rows),len(cols)))
+        D.fill(_np.inf)
+        D[I,J] = distance
+        m,u1,u2 = _optimal_match(D, max_distance=distance.max())
+        
+        match = set((int(rows[i]),int(cols[j]),d) for i,j,d in m)
+        matched_i = set(i for i,j,d in match)
+        matched_j = set(j for i,j,d in match)
+        return match, set(range(ni))-matched_i, set(range(nj))-matched_j
+        
+    elif method!='greedy':
+        raise ValueError('Unknown matching method: ' + str(method))
+        
+    order = distance.argsort(kind='mergesort')
+    ij = zip(I[order].tolist(), J[order].tolist())
+    d  = distance[order].tolist()
+    
+    return _greedy_match(ij, d, ni, nj, d[-1])
+    
+def _greedy_match(ij, d, ni, nj, max_distance):
+    """ greedy matching of sorted pairs `ij` with distance `d` """
     match = set()
     mi = set()
     mj = set()
@@ -192,3 +328,94 @@ def one_to_one_match(distance, max_distance=None):
     unmatched_j = mj.symmetric_difference(range(nj))
     
     return match, unmatched_i, unmatched_j
+    
+def _optimal_match(distance, max_distance=None):
+    """ minimal cost matching, see `one_to_one_match` """
+    distance = _np.asarray(distance, dtype=float)
+    ni,nj = distance.shape
+    
+    # replace forbidden pairs by a cost higher than any sum of valid ones
+    if max_distance is None:
+        valid = _np.isfinite(distance)
+    else:
+        valid = distance<=max_distance
+    cost = distance.copy()
+    if not valid.all():
+        high = _np.abs(distance[valid]).sum()*2 + 1 if valid.any() else 1
+        cost[~valid] = high
+    
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        linear_sum_assignment = _linear_sum_assignment
+    rows, cols = linear_sum_assignment(cost)
+        
+    match = set((i,j,distance[i,j].item()) for i,j in zip(rows.tolist(),cols.tolist())
+                                          if valid[i,j])
+    unmatched_i = set(range(ni)) - set(i for i,j,d in match)
+    unmatched_j = set(range(nj)) - set(j for i,j,d in match)
+    
+    return match, unmatched_i, unmatched_j
+    
+def _linear_sum_assignment(cost):
+    """ Solve the linear assignment problem on (finite) `cost` matrix
+    
+    Numpy implementation of the hungarian algorithm, with shortest augmenting
+    path (in O(n^2 m)). Return the arrays of the row and column indices of the
+    selected pairs, as `scipy.optimize.linear_sum_assignment`.
+    """
+    cost = _np.asarray(cost, dtype=float)
+    transposed = cost.shape[0]>cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n,m = cost.shape
+    
+    # potentials of rows (u) and columns (v), with a dummy column 0 
+    u = _np.zeros(n+1)
+    v = _np.zeros(m+1)
+    row = _np.zeros(m+1, dtype=int)   # row (1-based) assigned to column j
+    way = _np.zeros(m+1, dtype=int)   # previous column in augmenting path
+    
+    for i in xrange(1,n+1):
+        row[0] = i
+        j0 = 0
+        minv = _np.empty(m+1)
+        minv.fill(_np.inf)
+        used = _np.zeros(m+1, dtype=bool)
+        
+        # find augmenting path from row i to a free column
+        while True:
+            used[j0] = True
+            i0 = row[j0]
+            free = ~used
+            free[0] = False
+            
+            reduced = cost[i0-1] - u[i0] - v[1:]
+            update = free[1:] & (reduced<minv[1:])
+            minv[1:][update] = reduced[update]
+            way[1:][update] = j0
+            
+            j1 = _np.where(free, minv, _np.inf).argmin()
+            delta = minv[j1]
+            
+            u[row[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            
+            j0 = j1
+            if row[j0]==0:
+                break
+                
+        # augment assignment along the path
+        while j0:
+            j1 = way[j0]
+            row[j0] = row[j1]
+            j0 = j1
+            
+    cols = _np.flatnonzero(row[1:])
+    rows = row[1:][cols]-1
+    
+    if transposed:
+        rows, cols = cols, rows
+    order = rows.argsort()
+    return rows[order], cols[order]
@@ -3,33 +3,60 @@ Module that provide measuring tools on continuous RSML-type MTG
 """
 from openalea.mtg import MTG 
 
+from . import instrument
 from .misc import root_vertices
 from .misc import root_tree
 from .misc import root_order
+from .topology import get_topology
 
 def _segment_length(geometry):
     """ return an array of the segment length along the root `geometry` """
     import numpy as np
-    pos = np.array(geometry)
+    pos = np.asarray(geometry, dtype=float)
     vec = np.diff(pos,axis=0)**2
     return (vec.sum(axis=1)**.5)
 
 
-def root_length(g, roots=None):
-    """ return a dictionary of (root, root-length) """
-    geometry = g.property('geometry')
+def root_length(g, roots=None, store=None):
+    """ return a dictionary of (root, root-length) 
+    
+    `store` is passed to `batch_root_length`
+    """
     length = g.properties().get('length',{}).copy()
         
     if roots is None: roots=root_vertices(g)
-    for root in roots:
-        if root not in length:
-            geom = geometry.get(root)
-            if geom is None: length[root] = 0
-            else:            length[root] = _segment_length(geom).sum()
+    missing = [root for root in roots if root not in length]
+    length.update(zip(missing, batch_root_length(g, roots=missing, store=store)))
             
     return length
 
-def parent_position(g, distance2tip=False, roots=None):
+@instrument.timed('measurements.root_length')
+def batch_root_length(g, roots=None, store=None):
+    """ return the array of the length of `roots` computed from their geometry
+    
+    The length of all roots are computed at once from the concatenation of 
+    their polylines (see `rsml.geometry.GeometryStore`).
+    
+    `roots` is the list of root axes to compute the length of. By default, it
+    is `root_tree(g)`. Roots without geometry have length 0.
+    
+    `store` is an optional `GeometryStore` of the geometry of `g`, to share
+    between calls. By default, it is `GeometryStore.from_mtg(g)`.
+    """
+    import numpy as np
+    from .geometry import GeometryStore
+    
+    if roots is None: roots = root_tree(g)
+    if len(roots)==0:
+        return np.zeros(0)
+    
+    if store is None: store = GeometryStore.from_mtg(g)
+    index  = store.indices(roots)
+    length = np.append(store.lengths(), 0)   # index -1 => length 0
+    
+    return length[index]
+
+def parent_position(g, distance2tip=False, roots=None, store=None):
     """ (Try to) compute the parent postion of root sub-axes 
     
     The parent position is computed as follow:
@@ -42,45 +69,140 @@ def parent_position(g, distance2tip=False, roots=None):
     
     if `distance2tip`==True, the return calues are the distance from the branching position to the
     tip of the parent axes. 
+    
+    `store` is passed to `batch_parent_position`
     """
     parent_pos0 = g.properties().get('parent-position', {})
     parent_node = g.properties().get('parent-node', {})
         
-    # root arclength computed for parent of subaxes with parent_node prop
-    cumlen = {}
-    geometry = g.properties().get('geometry')
-    
-    def cumlength(root):
-        if root not in cumlen:
-            cumlen[root] = _segment_length(geometry[root]).cumsum()
-        return cumlen[root]
-        
-    def get_branching_distance(root):
-        if root not in parent_node:
-            return None
-            
-        pnode = parent_node[root]
-        if pnode==0:
-            return 0
-            
-        parent = g.parent(root)
-        clen = cumlength(parent)
-        if distance2tip:
-            return clen[-1] - clen[pnode-1]
-        else:
-            return clen[pnode-1]
-    
     # parse all root axes
     parent_pos = {}
     if roots is None: roots = root_vertices(g)
+    
+    # compute branching distance of subaxes with parent_node prop
+    missing = [root for root in roots 
+                    if root not in parent_pos0 and root in parent_node]
+    branching = batch_parent_position(g, distance2tip=distance2tip, roots=missing,
+                                      store=store)
+    branching = dict(zip(missing, branching))
+    
     for root in roots:
         if root in parent_pos0:
             parent_pos[root] = parent_pos0[root]
         else:
-            parent_pos[root] = get_branching_distance(root)
+            parent_pos[root] = branching.get(root)
     
     return parent_pos
     
+@instrument.timed('measurements.parent_position')
+def batch_parent_position(g, distance2tip=False, roots=None, store=None):
+    """ return the array of the branching position of `roots` on their parent
+    
+    The position is computed from the 'parent-node' property of the roots
+    and the geometry of their parent: the cumulative arclength of all 
+    polylines is computed at once (see `rsml.geometry.GeometryStore`).
+    
+    `roots` is the list of root axes to process. By default, it is 
+    `root_tree(g)`. The value of roots without 'parent-node' is `nan`. An
+    IndexError is raised if a 'parent-node' is not a node of the parent axe.
+    
+    if `distance2tip`==True, the returned values are the distance from the 
+    branching position to the tip of the parent axes. 
+    
+    `store` is an optional `GeometryStore` of the geometry of `g`, to share
+    between calls. By default, it is `GeometryStore.from_mtg(g)`.
+    """
+    import numpy as np
+    from .geometry import GeometryStore
+    
+    if roots is None: roots = root_tree(g)
+    
+    parent_node = g.properties().get('parent-node', {})
+    position = np.empty(len(roots))
+    position.fill(np.nan)
+    
+    branched = [i for i,root in enumerate(roots) if root in parent_node]
+    if len(branched)==0:
+        return position
+    
+    parents = get_topology(g).parent_dict()
+    if store is None: store = GeometryStore.from_mtg(g)
+    parent = store.indices([parents[roots[i]] for i in branched])
+    pnode  = np.array([parent_node[roots[i]] for i in branched], dtype=int)
+    if (parent<0).any():
+        raise KeyError('parent axe without geometry')
+    invalid = (pnode<0) | (pnode>=store.sizes()[parent])
+    if invalid.any():
+        root = roots[branched[invalid.argmax()]]
+        raise IndexError('parent-node {} of root {} is out of its parent polyline'
+                         .format(parent_node[root], root))
+    
+    arclength = store.arclength()
+    branching = arclength[store.offsets[parent]+pnode]
+    if distance2tip:
+        branching = store.lengths()[parent] - branching
+    branching[pnode==0] = 0
+    
+    position[branched] = branching
+    return position
+    
+def batch_root_volume(g, roots=None, diameter='diameter', store=None):
+    """ return the array of the volume of `roots` computed from their diameter
+    
+    The volume of each segment of the root polylines is computed as a 
+    truncated cone, from the `diameter` function at its nodes. The volume of
+    all segments are computed at once (see `rsml.geometry.GeometryStore`).
+    
+    `roots` is the list of root axes to process. By default, it is 
+    `root_tree(g)`. Roots without geometry have volume 0, and roots without
+    `diameter` have volume `nan`.
+    
+    `store` is an optional `GeometryStore` of the geometry of `g`, to share
+    between calls. By default, it is `GeometryStore.from_mtg(g)`.
+    """
+    import numpy as np
+    def volume(length, r1, r2):
+        return np.pi*length*(r1**2 + r1*r2 + r2**2)/3.
+    return _batch_segment_sum(g, roots, diameter, volume, store)
+    
+def batch_root_surface(g, roots=None, diameter='diameter', store=None):
+    """ return the array of the lateral surface of `roots` 
+    
+    The surface of each segment of the root polylines is computed as the 
+    lateral surface of a truncated cone, from the `diameter` function at its
+    nodes. See `batch_root_volume`.
+    """
+    import numpy as np
+    def surface(length, r1, r2):
+        return np.pi*(r1+r2)*(length**2 + (r1-r2)**2)**.5
+    return _batch_segment_sum(g, roots, diameter, surface, store)
+    
+def _batch_segment_sum(g, roots, diameter, segment_value, store=None):
+    """ return the sum over `roots` of `segment_value(length, radius1, radius2)` """
+    import numpy as np
+    from .geometry import GeometryStore
+    
+    if roots is None: roots = root_tree(g)
+    if len(roots)==0:
+        return np.zeros(0)
+    
+    if store is None: store = GeometryStore.from_mtg(g)
+    radius = store.node_values(g.properties().get(diameter,{}))/2.
+    length = store.segment_lengths()
+    
+    values = np.zeros(len(length))
+    if len(values)>1:
+        values[1:] = segment_value(length[1:], radius[:-1], radius[1:])
+        starts = store.offsets[:-1]
+        values[starts[starts<len(values)]] = 0
+        
+    sums = np.zeros(len(store)+1)         # index -1 => 0
+    filled = np.append(store.sizes()>0, False)
+    if filled.any():
+        sums[filled] = np.add.reduceat(values, store.offsets[:-1][filled[:-1]])
+        
+    return sums[store.indices(roots)]
+    
 class RSML_Measurements(list):
     """
     Class to store a list of root measurements
@@ -94,19 +216,22 @@ class RSML_Measurements(list):
         """ Contrust a RSML_Measurement """
         pass
     
+    @instrument.timed('measurements')
     def add(self, g, name=None):
         """ Add measurements of roots in `g` """ 
         from . import properties as prop
+        from .geometry import GeometryStore
         
-        parpos = parent_position(g)
+        store  = GeometryStore.from_mtg(g)    # shared by all measurements
+        parpos = parent_position(g, store=store)
         tree   = root_tree(g, suborder=parpos)
         order  = root_order(g, tree=tree)
-        length = root_length(g)
+        length = root_length(g, store=store)
         
         ids    = prop.set_ids(g)
         acc    = prop.set_accession(g, root_order=order)
-        parent = [(root,g.parent(root)) for root in tree]
-        parent = dict((r, None if p is None else ids[p]) for r,p in parent)
+        parent = get_topology(g).parent_dict()
+        parent = dict((r, None if p is None else ids[p]) for r,p in parent.iteritems())
     
         table = [None]*len(tree)
         for i,root in enumerate(tree):
@@ -115,40 +240,85 @@ class RSML_Measurements(list):
                             length=length[root], name=name)
                 
         self.extend(table)
+        instrument.count('roots_measured', len(table))
             
         return self
     
+    csv_keys = ['name','id','order','accession','parent','parent_position','length']
+    
     def export_csv(self, filename, sep='\t'):
         """ export file `filename` with csv format 
         
         Use `sep` as csv file separator
         """
-        keys = ['name','id','order','accession','parent','parent_position','length']
-        default = ' '*len(keys)
-        
-        # convert table entries to a list of string, then table rows to string
-        csv = [map(str,map(row.get,keys,default)) for row in self]
-        csv = [sep.join(row)+'\n' for row in csv]
-        
         # export to given filename
         with open(filename,'w') as f:
-            f.write(sep.join(keys)+'\n')
-            f.writelines(csv)
+            f.write(self.csv_header(sep))
+            f.writelines(self.csv_lines(sep))
+            
+    @classmethod
+    def csv_header(cls, sep='\t'):
+        """ return the header line of exported csv file """
+        return sep.join(cls.csv_keys)+'\n'
+        
+    def csv_lines(self, sep='\t'):
+        """ return the list of csv lines of all stored measurements 
+        
+        Values are written as by `rsml.table.write_table`: missing values, 
+        None or nan, are written as 'NA'.
+        """
+        from .table import _text_column
+        
+        # convert table columns to lists of string, then table rows to string
+        csv = zip(*map(_text_column, self.columns().values()))
+        return [sep.join(row)+'\n' for row in csv]
             
     def import_csv(self, filename, sep='\t'):
-        from csv import reader
-        from ast import literal_eval
-        
-        def try_eval(s):
-            try:
-                return literal_eval(s)
-            except:
-                return s
-                
-        with open(filename) as f:
-            content = reader(f,delimiter=sep)
-            keys = content.next()
-            for row in content:
-                self.append(dict(zip(keys,map(try_eval,row))))
-                
+        """ import measurements from csv file `filename` (see `import_table`) """
+        return self.import_table(filename, format='csv', sep=sep)
+        
+    def columns(self, keys=None):
+        """ return the stored measurements as a column-oriented table
+        
+        Return an ordered dictionary of (key, numpy array) for all `keys`. By
+        default, `keys` is `csv_keys`. See `rsml.table`.
+        """
+        from collections import OrderedDict
+        from .table import as_column
+        
+        if keys is None: keys = self.csv_keys
+        return OrderedDict((key, as_column([row.get(key) for row in self])) 
+                           for key in keys)
         
+    def export(self, filename, columns=None, format=None, sep='\t'):
+        """ export the `columns` of measurements in file `filename`
+        
+        The file format is selected from the `filename` extension: csv, 
+        gzip csv, npz, parquet or feather. See `rsml.table.write_table`.
+        """
+        from .table import write_table
+        write_table(self.columns(columns), filename, format=format, sep=sep)
+        
+    def import_table(self, filename, columns=None, format=None, sep='\t'):
+        """ append the measurements stored in file `filename`
+        
+        The file is read by `rsml.table.read_table`: numbers are converted 
+        to int or float per column, and missing values to None.
+        """
+        import numpy as np
+        from itertools import izip
+        from .table import read_table
+        
+        table = read_table(filename, columns=columns, format=format, sep=sep)
+        values = []
+        for column in table.itervalues():
+            missing = np.isnan(column) if column.dtype.kind=='f' else None
+            if missing is not None and missing.any():
+                column = column.astype(object)
+                column[missing] = None
+            values.append(column.tolist())
+        
+        keys = table.keys()
+        self.extend(dict(izip(keys,row)) for row in izip(*values))
+        return self
+
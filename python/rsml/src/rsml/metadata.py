@@ -25,8 +25,11 @@ Optional metadata:
 function also fill missing items, folowing the specified behavior describe in
 the function documentation.
 """
+import os
 import xml.etree.ElementTree as xml
 
+from . import instrument
+
 
 # ordered list of metadata attribute name
 flat_metadata = ['version','unit','resolution','software','user',
@@ -46,6 +49,7 @@ default = {'version':1.0,
 #           'last-modified':'',
 
 
+@instrument.timed('metadata')
 def set_metadata(g):
     """ Set the rsml 'metadata' element from the graph-properties of mtg `g` 
     
@@ -61,6 +65,7 @@ def set_metadata(g):
       - if 'image.captured' is missing, try to set it to the file 
         'image.name' creation time, if the file exists.
       - if 'image.sha256' is missing, try to set it to file 'image.name' hash
+        (see `file_sha256`)
       
     This function update given mtg `g` in-place and returns its updated 
     'metadata' graph properties.
@@ -79,11 +84,8 @@ def set_metadata(g):
         
         if not image.has_key('sha256'):                                  
             try:
-                import hashlib
-                with open(image['name']) as f:
-                    sha256 = hashlib.sha256(f.read())
-                    image['sha256'] = sha256.hexdigest()
-            except IOError: # no such file
+                image['sha256'] = file_sha256(image['name'])
+            except (IOError, OSError): # no such file
                 pass
         
         if not image.has_key('captured'):
@@ -107,6 +109,92 @@ def set_metadata(g):
     return metadata
     
 
+# directory of the persistent cache of `file_sha256`, None if disabled. 
+# It is disabled by default, and enabled by the RSML_HASH_CACHE environment
+# variable, e.g. RSML_HASH_CACHE=~/.cache/rsml/sha256 (empty to disable).
+hash_cache_dir = os.path.expanduser(os.environ.get('RSML_HASH_CACHE','')) or None
+
+_hash_memo = {}    # in-process cache of `file_sha256`
+
+def file_sha256(filename, cache=True, chunk_size=2**20):
+    """ return the hexadecimal sha256 hash of file `filename`
+    
+    The file is read by chunks of `chunk_size` bytes. 
+    
+    If `cache` is True, the hash is stored in memory with the file path, 
+    size and modification time as key. Then, the hash of unchanged files are 
+    retrieved without reading them. If `hash_cache_dir` is set (see the 
+    RSML_HASH_CACHE environment variable), the hash is also stored in this 
+    directory, to be reused by later processes. It contains one file per 
+    key, written atomically, so that it can be shared by several processes.
+    """
+    import hashlib
+    
+    stat = os.stat(filename)
+    key  = '{}:{}:{!r}'.format(os.path.realpath(filename), stat.st_size, 
+                                                           stat.st_mtime)
+    cache_file = None
+    if cache:
+        sha256 = _hash_memo.get(key)
+        if sha256 is not None:
+            return sha256
+            
+        if hash_cache_dir is not None:
+            cache_file = os.path.join(hash_cache_dir, 
+                                      hashlib.sha1(key).hexdigest())
+            try:
+                with open(cache_file) as f:
+                    sha256 = f.read().strip()
+                if len(sha256)==64:
+                    _hash_memo[key] = sha256
+                    return sha256
+            except IOError:   # not cached
+                pass
+    
+    # compute hash
+    with open(filename, 'rb') as f, instrument.timer('metadata.hash'):
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            sha256.update(chunk)
+        sha256 = sha256.hexdigest()
+    instrument.count('bytes_hashed', stat.st_size)
+    
+    if cache:
+        _hash_memo[key] = sha256
+        if cache_file is not None:
+            _write_atomic(cache_file, sha256)
+        
+    return sha256
+    
+def _write_atomic(filename, content):
+    """ write `content` in `filename` through a renamed temporary file 
+    
+    Errors are ignored: the file is written only if possible.
+    """
+    import tempfile
+    
+    directory = os.path.dirname(filename)
+    try:
+        os.makedirs(directory)
+    except OSError:   # exists, or cannot be created
+        pass
+        
+    try:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    except OSError:
+        return
+        
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.rename(tmp, filename)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    
+
 def add_property_definition(g, label, type, unit=None, default=None):
     """ add a rsml property definition to mtg `g` 
     
@@ -15,23 +15,12 @@ def root_tree(g, suborder=None):
     
     If suborder is given, it should be a dictionary of (root-id,value) which is
     used to sort sibling root w.r.t. their respective value.
+    
+    The tree structure is taken from the topology cache of `g` (see
+    `rsml.topology.get_topology`)
     """
-    if suborder is None:
-        sort = lambda x:x[::-1]
-    else:
-        sort = lambda x: sorted(x, key=suborder.get)[::-1]
-
-    # init with axes with no parent
-    axes = sort([a for a in root_vertices(g) if g.parent(a) is None])
-    
-    # parse root axes in depth-first-order
-    tree = []
-    while len(axes):
-        axe = axes.pop()
-        tree.append(axe)
-        axes.extend(sort(g.children(axe)))
-        
-    return tree
+    from .topology import get_topology
+    return get_topology(g).tree(suborder=suborder)
     
 def root_order(g, tree=None):
     """ return a dictionary of the (numeric) axe order
@@ -42,23 +31,26 @@ def root_order(g, tree=None):
       
     tree is the optional list of root id in `g`. If not given, it is computed
     """
-    # init order dict
-    if 'order' in g.property_names():
-        order = g.property('order').copy()
-    else:
-        order = {}
-        
+    from .topology import get_topology
+    topology = get_topology(g)
+    
+    # no order property: use topological order
+    if 'order' not in g.property_names() or len(g.property('order'))==0:
+        return topology.order_dict()
+    
+    order = g.property('order').copy()
     if tree is None:
-        tree = root_tree(g)
+        tree = topology.vertices
         
     # parse all axes s.t. parent are processed before children
+    parents = topology.parent_dict()
     for root in tree:
-        parent = g.parent(root)
+        parent = parents[root]
         order.setdefault(root, 1 if parent is None else order[parent]+1)
         
     return order
         
-def hausdorff_distance(polyline1,polyline2):
+def hausdorff_distance(polyline1,polyline2, max_distance=None, memory=2**25):
     """
     Compute the hausdorff distance from `polyline1` to `polyline2`
     
@@ -67,6 +59,13 @@ def hausdorff_distance(polyline1,polyline2):
          a (k,n1) array for the n1 points of the 1st polyline in k-dimension
       `polyline2`:
          a (k,n2) array for the n2 points of the 2nd polyline in k-dimension
+      `max_distance`:
+         optional threshold: the computation stops as soon as the distance is
+         known to be more than `max_distance`. The returned value is then 
+         higher than `max_distance`, but not necessarily the hausdorff distance
+      `memory`:
+         approximate maximum size, in bytes, of the temporary arrays. Points 
+         are processed by blocks such that this size is not exceeded.
        
     :Output:
        The hausdorff distance:
@@ -81,7 +80,7 @@ def hausdorff_distance(polyline1,polyline2):
     
     norm = lambda x: (x**2).sum(axis=0)**.5
     
-    def max_min_dist(points, polyline):
+    def max_min_dist(points, polyline, dmax):
         v1    = polyline[:,:-1]           # 1st segment vertex, shape (k,n2-1)
         v2    = polyline[:, 1:]           # 2nd segment vertex, shape (k,n2-1)
         sdir  = v2-v1                     # direction vector of segment
@@ -89,17 +88,124 @@ def hausdorff_distance(polyline1,polyline2):
         lsl   = _np.maximum(lsl,2**-5)    
         sdir /= lsl                       # make sdir unit vectors
         
-        # distance from v1 to the projection of points on segments
-        #    disallow projection out of segment: values are in [0,lsl]
-        on_edge = ((points[:,:,None]-v1[:,None,:])*sdir[:,None,:]).sum(axis=0) # (n1,n2-1)
-        on_edge = _np.minimum(_np.maximum(on_edge,0),lsl[None,:])
-        
-        # points projection on sdir
-        nproj = v1[:,None,:] + on_edge[None,:,:]*sdir[:,None,:]   # (k,n1,n2-1)
+        # number of points processed at once: about 4 (k,block,n2-1) arrays
+        k, n = points.shape
+        block = max(1, memory//(32*k*max(v1.shape[1],1)))
         
-        # distance from points to "points projection on sdir"
-        return norm(nproj - points[:,:,None]).min(axis=1).max()
-
-    return max(max_min_dist(p1,p2), max_min_dist(p2,p1))
+        for start in xrange(0,n,block):
+            pts = points[:,start:start+block]
+            
+            # distance from v1 to the projection of points on segments
+            #    disallow projection out of segment: values are in [0,lsl]
+            on_edge = ((pts[:,:,None]-v1[:,None,:])*sdir[:,None,:]).sum(axis=0) # (n1,n2-1)
+            on_edge = _np.minimum(_np.maximum(on_edge,0),lsl[None,:])
+            
+            # points projection on sdir
+            nproj = v1[:,None,:] + on_edge[None,:,:]*sdir[:,None,:]   # (k,n1,n2-1)
+            
+            # distance from points to "points projection on sdir"
+            dmax = max(dmax, norm(nproj - pts[:,:,None]).min(axis=1).max())
+            if max_distance is not None and dmax>max_distance:
+                break
+                
+        return dmax
 
+    dmax = max_min_dist(p1,p2,-_np.inf)
+    if max_distance is not None and dmax>max_distance:
+        return dmax
+    return max_min_dist(p2,p1,dmax)
 
+def mtg_topology(g, max_scale=None):
+    """ return the topology of mtg `g` as lists of vertices, complexes and parents
+    
+    The root vertex of `g` is not included. The vertices are sorted by scale
+    and in topological order (parents first) at each scale, such that the 
+    mtg can be reconstructed by `build_mtg`. Vertices without parent have
+    parent None.
+    
+    If `max_scale` is given, only the vertices up to this scale are included.
+    """
+    if max_scale is None:
+        max_scale = g.max_scale()
+        
+    vertices = []
+    for scale in xrange(1,max_scale+1):
+        axes = [v for v in g.vertices(scale=scale) if g.parent(v) is None][::-1]
+        while len(axes):
+            vid = axes.pop()
+            vertices.append(vid)
+            axes.extend(g.children(vid)[::-1])
+            
+    complexes = map(g.complex, vertices)
+    parents   = map(g.parent,  vertices)
+    return vertices, complexes, parents
+    
+def build_mtg(vertices, complexes, parents, properties={}):
+    """ construct a mtg from its topology and properties
+    
+    :Inputs:
+      - `vertices`, `complexes`, `parents`:
+           lists as returned by `mtg_topology`
+      - `properties`:
+           dictionary of (property-name, dict of (vertex-id, value))
+           
+    The mtg vertices have the given vertex ids. Vertices can have a parent 
+    with a different complex, such as the 1st segment of branches. The 
+    topology is filled in one pass (see `add_vertices`).
+    """
+    from openalea.mtg import MTG, fat_mtg
+    
+    g = MTG()
+    add_vertices(g, vertices, complexes, parents)
+            
+    g_prop = g.properties()
+    for name, values in properties.iteritems():
+        g_prop.setdefault(name,{}).update(values)
+        
+    return fat_mtg(g)
+    
+def add_vertices(g, vertices, complexes, parents):
+    """ add `vertices` to mtg `g`, with given `complexes` and `parents`
+    
+    The lists are as returned by `mtg_topology`: complexes and parents are 
+    either in `g` or in `vertices` before the vertex they are the complex or
+    the parent of. 
+    
+    The topology tables of `g` (scale, complex, components, parent and 
+    children of all vertices) are filled directly, in one pass, instead of 
+    adding vertices one by one with `add_component` and `add_child`. Vertex
+    properties, such as 'edge_type', are not set.
+    """
+    scale      = g._scale
+    complex_   = g._complex
+    components = g._components
+    parent_    = g._parent
+    children   = g._children
+    
+    for vid, complex, parent in zip(vertices, complexes, parents):
+        scale[vid] = scale[complex]+1
+        complex_[vid] = complex
+        components.setdefault(complex,[]).append(vid)
+        parent_[vid] = parent
+        if parent is not None:
+            children.setdefault(parent,[]).append(vid)
+            
+    if len(vertices):
+        g._id = max(g._id, max(vertices))
+    
+def remove_scale(g, scale):
+    """ remove all the vertices of mtg `g` at `scale`, and their properties
+    
+    `scale` should be the maximum scale of `g`. As `add_vertices`, the 
+    topology tables of `g` are updated directly, in one pass.
+    """
+    removed = [vid for vid in g.vertices(scale=scale)]
+    for vid in removed:
+        g._components.pop(g._complex.pop(vid,None), None)
+        g._scale.pop(vid)
+        g._parent.pop(vid,None)
+        g._children.pop(vid,None)
+        
+    for prop in g.properties().itervalues():
+        for vid in removed:
+            prop.pop(vid,None)
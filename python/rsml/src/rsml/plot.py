@@ -8,9 +8,44 @@ Visualisation:
 """
 
 
-def plot3d(g, color=None, img_dir='.'):
+def plot3d(g, color=None, img_dir='.', tolerance=None, sides=4, display=True):
+    """ Display the root axes of `g` in the PlantGL viewer, and return the scene
+
+    See `scene3d` for the optional parameters. If `display` is False, the 
+    scene is only returned.
+    """
+    import openalea.plantgl.all as pgl
+
+    scene = scene3d(g, color=color, tolerance=tolerance, sides=sides)
+    if display:
+        pgl.Viewer.display(scene)
+    return scene
+
+
+def scene3d(g, color=None, diameter='diameter', tolerance=None, sides=4):
+    """ Construct the PlantGL scene of the root axes of `g`
+
+    Each root axe is an extrusion of a cross section along its polyline. The
+    polylines and diameters of all axes are processed at once, and PlantGL 
+    objects are created from slices of these arrays. The cross section is 
+    shared by all axes, and the material by all axes of the same color.
+
+    :Optional Parameters:
+        - color: the color of the axes, either a color (for all axes) or a 
+          function that returns the color of a root axe. By default, the 
+          color depends on the axe order.
+        - diameter: the name of the function of the axes diameter, either 
+          one value per polyline point or one per axe. Axes without diameter
+          have diameter 1.
+        - tolerance: if given, polylines are decimated such that there is at
+          most one point per cell of a grid of `tolerance` size (in the units 
+          of the geometry). See `simplify_to_grid`.
+        - sides: the number of sides of the cross section of the axes
+    """
+    import numpy as np
     import openalea.plantgl.all as pgl
     from copy import copy
+    from .geometry import GeometryStore
 
     default_color = (177, 123, 6)
     colors = {}
@@ -31,39 +66,59 @@ def plot3d(g, color=None, img_dir='.'):
         _color = copy(color)
         color = lambda x: _color
 
-    section = pgl.Polyline2D([(0.5, 0), (0, 0.5), (-0.5, 0), (0, -0.5), (0.5, 0)])
-    geoms = g.property('geometry')
-    diams = g.property('diameter')
-
-    def sweep(vid):
-        _color = pgl.Material(color(vid))
-        if diams and (vid in diams):
-            diameters = diams[vid]
-            if isinstance(diameters, (list, tuple)):
-                _geom = pgl.Extrusion(
-                    pgl.Polyline(map(pgl.Vector3, geoms[vid])), 
-                    section, 
-                    pgl.Point2Array(zip(diams[vid], diams[vid]))
-                )
-            else:
-                _geom = pgl.Extrusion(
-                    pgl.Polyline(map(pgl.Vector3, geoms[vid])), 
-                    section,
-                    pgl.Point2Array([(diameters, diameters) for i in range(len(geoms))])
-                )
+    materials = {}
+    def material(vid):
+        c = color(vid)
+        key = repr(c)
+        if key not in materials:
+            materials[key] = pgl.Material(c)
+        return materials[key]
+
+    # geometry and diameters of all axes
+    store = GeometryStore.from_mtg(g)
+    coordinates, offsets = store.coordinates, store.offsets
+    if coordinates.shape[1]<3:
+        padding = np.zeros((len(coordinates), 3-coordinates.shape[1]))
+        coordinates = np.hstack((coordinates, padding))
+    diameters = store.node_values(g.properties().get(diameter, {}))
 
+    if tolerance:
+        keep = _grid_mask(coordinates, offsets, tolerance)
+        coordinates, diameters = coordinates[keep], diameters[keep]
+        offsets = np.concatenate(([0],keep.cumsum()))[offsets]
+
+    angles = np.linspace(0, 2*np.pi, sides+1)
+    section = np.column_stack((np.cos(angles), np.sin(angles)))/2.
+    section[-1] = section[0]
+    section = pgl.Polyline2D(_pgl_array(pgl.Point2Array, section.round(15)))
+
+    shapes = []
+    for k, vid in enumerate(store.vertices):
+        start, end = offsets[k], offsets[k+1]
+        if end-start<2:
+            continue
+        axis = pgl.Polyline(_pgl_array(pgl.Point3Array, coordinates[start:end]))
+        diam = diameters[start:end]
+        if np.isnan(diam).any():
+            geometry = pgl.Extrusion(axis, section)
         else:
-            _geom = pgl.Extrusion(
-                pgl.Polyline(map(pgl.Vector3, geoms[vid])), 
-                section)
+            scale = _pgl_array(pgl.Point2Array, np.column_stack((diam,diam)))
+            geometry = pgl.Extrusion(axis, section, scale)
+        shapes.append(pgl.Shape(geometry, material(vid)))
 
-        return pgl.Shape(_geom, _color)
-    scene = pgl.Scene([sweep(i) for i in geoms])
-    pgl.Viewer.display(scene)
-    return scene
+    return pgl.Scene(shapes)
 
+def _pgl_array(array_type, points):
+    """ create the PlantGL `array_type` of the (n,k) array `points` """
+    import numpy as np
+    points = np.ascontiguousarray(points, dtype=float)
+    try:
+        return array_type(points)       # PlantGL with numpy support
+    except TypeError:
+        return array_type(map(tuple, points.tolist()))
 
-def plot2d(g, img_file=None, axis=None, root_id=None, color=None, order=None, clear=True, **args):
+
+def plot2d(g, img_file=None, axis=None, root_id=None, color=None, order=None, clear=True, fast=False, **args):
     """ Plot MTG with grains on the initial image.
 
     :Parameters:
@@ -78,11 +133,17 @@ def plot2d(g, img_file=None, axis=None, root_id=None, color=None, order=None, cl
         - order : draw only vertices of order 'order'
         - color: function or dict to define the color of each vertex. 
           Format is matplotlib colors (e.g. 'b', 'g', 'y', 'r')
+        - fast: if True, draw all root axes at once, with a reduced image 
+          (see `plot2d_fast`, which also takes the `tolerance` and `dpi` 
+          optional parameters)
     """  
     import numpy as np  
-    from collections import Iterable
     from matplotlib import pyplot as plt
 
+    if fast:
+        return plot2d_fast(g, img_file=img_file, axis=axis, root_id=root_id, 
+                           color=color, order=order, **args)
+
     if img_file is not None:
         if isinstance(img_file, basestring):
             image = plt.imread(img_file)
@@ -98,18 +159,9 @@ def plot2d(g, img_file=None, axis=None, root_id=None, color=None, order=None, cl
     ##{0:'r', 1:'g', 2:'b', 3:'y', 4:'c', 5: 'm', 6:'y', 7:'k'}
     colors = 'rgbycmyk'
 
-    root_scale = g.max_scale()
     polylines = g.property('geometry')
 
-    if root_id is None:
-        vertices = polylines.keys()
-    elif isinstance(root_id, Iterable):
-        vertices = [v for r in root_id
-                    for vr in g.component_roots_at_scale(r, scale=root_scale) 
-                    for v in g.Descendants(vr)]
-    else:
-        vid = g.component_roots_at_scale(root_id, scale=root_scale)
-        vertices = g.Descendants(vid)
+    vertices = _plot_vertices(g, root_id)
 
     check_order = order is not None
 
@@ -124,7 +176,7 @@ def plot2d(g, img_file=None, axis=None, root_id=None, color=None, order=None, cl
             continue         
 
         _color = color(v) if color else colors[_order % len(colors)]  # .get(_order,'r')
-        poly = np.array(polylines[v])          
+        poly = np.asarray(polylines[v])          
         plot_fct(poly[:, 0], poly[:, 1], color=_color, marker='.')
 
     if img_file is None:
@@ -136,19 +188,211 @@ def plot2d(g, img_file=None, axis=None, root_id=None, color=None, order=None, cl
         ax.axis('equal')
 
 
+def _plot_vertices(g, root_id=None):
+    """ return the list of vertices to plot, selected by `root_id` (see `plot2d`) """
+    from collections import Iterable
+
+    root_scale = g.max_scale()
+    if root_id is None:
+        vertices = g.property('geometry').keys()
+    elif isinstance(root_id, Iterable):
+        vertices = [v for r in root_id
+                    for vr in g.component_roots_at_scale(r, scale=root_scale) 
+                    for v in g.Descendants(vr)]
+    else:
+        vid = g.component_roots_at_scale(root_id, scale=root_scale)
+        vertices = g.Descendants(vid)
+    return vertices
+
+
+def plot2d_fast(g, img_file=None, axis=None, root_id=None, color=None, order=None,
+                tolerance=None, dpi=None, linewidth=1., **args):
+    """ Plot the root axes of `g` as one matplotlib `LineCollection`
+    
+    Fast alternative to `plot2d`, suitable for big mtg and images: 
+      - all polylines are drawn by one matplotlib artist
+      - the background image is reduced to the resolution of the plot
+      - polylines can be simplified to the resolution of the plot
+      
+    :Parameters:
+        - g, img_file, axis, root_id, color, order: see `plot2d`
+        
+    :Optional Parameters:
+        - tolerance: if given, the polylines are simplified such that the 
+          drawn lines are at most `tolerance` pixels away from the original
+          ones (see `simplify_to_grid`)
+        - dpi: the resolution of the output, to which the image is reduced.
+          By default, it is the resolution of the figure. 
+        - linewidth: the width of the lines
+        - other arguments are passed to the `LineCollection`
+          
+    Return the created `LineCollection`
+    """
+    import numpy as np
+    from matplotlib.collections import LineCollection
+    from .geometry import GeometryStore
+    from .topology import get_topology
+    
+    if axis:
+        ax = axis
+    else:
+        from matplotlib import pyplot as plt
+        ax = plt.gca()
+    
+    # size of the axis, in pixels of the output
+    bbox = ax.get_window_extent()
+    scale = 1. if dpi is None else float(dpi)/ax.figure.dpi
+    pixels = (max(bbox.height*scale,1), max(bbox.width*scale,1))
+    
+    if img_file is not None:
+        image, shape = read_image(img_file, shape=pixels)
+        ax.imshow(image, extent=(-.5, shape[1]-.5, shape[0]-.5, -.5))
+        ax.autoscale(enable=False)
+    
+    # select vertices and their colors
+    colors = 'rgbycmyk'
+    topology = get_topology(g)
+    orders = topology.order_dict()
+    vertices = [v for v in _plot_vertices(g, root_id) 
+                   if order is None or orders.get(v,g.order(v)+1)-1==order]
+    if color is None:
+        colors = [colors[(orders.get(v,g.order(v)+1)-1) % len(colors)] for v in vertices]
+    elif callable(color):
+        colors = map(color, vertices)
+    else:
+        colors = [color[v] for v in vertices]
+        
+    store = GeometryStore.from_mtg(g, vertices=vertices)
+    coordinates, offsets = store.coordinates[:,:2], store.offsets
+    
+    if img_file is None and len(coordinates):
+        xmin, ymin = coordinates.min(axis=0)
+        xmax, ymax = coordinates.max(axis=0)
+    else:
+        xmin, xmax = sorted(ax.get_xlim())
+        ymin, ymax = sorted(ax.get_ylim())
+        
+    if tolerance and len(coordinates):
+        # size of output pixels, in data unit (axis have equal aspect)
+        #   cells diagonal, i.e. the simplification error, is `tolerance`
+        pixel_size = max((xmax-xmin)/pixels[1], (ymax-ymin)/pixels[0])
+        coordinates, offsets = simplify_to_grid(coordinates, offsets, 
+                                                tolerance*pixel_size/2**.5)
+        
+    segments = np.split(coordinates, offsets[1:-1]) if len(vertices) else []
+    lines = LineCollection(segments, colors=colors, 
+                           linewidths=linewidth, **args)
+    ax.add_collection(lines)
+    
+    if img_file is None:
+        if len(coordinates):
+            ax.set_xlim(xmin, xmax)
+            ax.set_ylim(ymax, ymin)
+        ax.set_aspect('equal', 'datalim')
+        
+    return lines
+
+def simplify_to_grid(coordinates, offsets, size):
+    """ simplify polylines by removing points in the same cell of a grid 
+    
+    The coordinates are snapped to a grid with cells of `size`, and the
+    consecutive points of polylines that fall in the same cell are removed. 
+    The first and last points of all polylines are kept. The simplified 
+    polylines are at most at the cells diagonal, i.e. `sqrt(k)*size` for 
+    points in k dimensions, from the original ones.
+    
+    :Inputs:
+      - `coordinates`: the (N,k) array of the points of all polylines
+      - `offsets`: the (n+1,) array of the start of all polylines, as in 
+        `rsml.geometry.GeometryStore`
+      - `size`: the size of the grid cells
+      
+    Return the simplified coordinates and offsets
+    """
+    import numpy as np
+    
+    if size<=0 or len(coordinates)==0:
+        return coordinates, offsets
+        
+    keep = _grid_mask(coordinates, offsets, size)
+    kept = np.concatenate(([0],keep.cumsum()))
+    return coordinates[keep], kept[offsets]
+
+def _grid_mask(coordinates, offsets, size):
+    """ return the boolean array of the points kept by `simplify_to_grid` """
+    import numpy as np
+    
+    cells = np.floor(coordinates/size)
+    keep = np.ones(len(coordinates), dtype=bool)
+    keep[1:] = (cells[1:]!=cells[:-1]).any(axis=1)
+    
+    starts, ends = offsets[:-1], offsets[1:]-1
+    filled = ends>=starts
+    keep[starts[filled]] = True
+    keep[ends[filled]] = True
+    return keep
+
+def read_image(filename, shape=None):
+    """ read image `filename`, reduced to about `shape` if given 
+    
+    If `shape` (height, width) is given, the image is reduced by an integer
+    factor to be (a bit) bigger than `shape` (see `reduce_image`). When 
+    possible, jpeg images are decoded directly at a reduced scale.
+    
+    `filename` can also be an image array, which is then only reduced.
+    
+    Return the image array and the (height,width) of the original image.
+    """
+    import numpy as np
+    
+    if not isinstance(filename, basestring):
+        image = np.asarray(filename)
+        return reduce_image(image, shape), image.shape[:2]
+        
+    try:
+        from PIL import Image
+    except ImportError:
+        from matplotlib import pyplot as plt
+        image = plt.imread(filename)
+        return reduce_image(image, shape), image.shape[:2]
+        
+    image = Image.open(filename)
+    width, height = image.size
+    if shape is not None:
+        image.draft(image.mode, (int(shape[1]), int(shape[0])))
+    if image.mode not in ('L', 'LA', 'RGB', 'RGBA', 'I', 'I;16', 'F'):
+        image = image.convert('RGBA')   # e.g. palette images
+    image = np.asarray(image)
+    return reduce_image(image, shape), (height, width)
+    
+def reduce_image(image, shape=None):
+    """ reduce `image` by averaging blocks of pixels 
+    
+    The reduction factor is the biggest integer such that the returned image
+    is bigger than `shape` (height, width) on at least one axis. If `shape`
+    is None, `image` is returned.
+    """
+    if shape is None:
+        return image
+        
+    height, width = image.shape[:2]
+    factor = int(max(height/float(shape[0]), width/float(shape[1])))
+    if factor<=1:
+        return image
+        
+    h, w = height//factor, width//factor
+    blocks = image[:h*factor,:w*factor].reshape((h,factor,w,factor)+image.shape[2:])
+    reduced = blocks.mean(axis=(1,3))
+    if image.dtype.kind in 'iub':
+        reduced = reduced.round()
+    return reduced.astype(image.dtype)
+    
+
 def multiple_plot(files, image=True):
-    from openalea.core.path import path
     from matplotlib import pyplot as plt
+    from .report import find_image
     import rsml
 
-    def get_file(f):    
-        exts = ['.png', '.jpg', '.tif']
-        fn = f.splitext()[0]
-        for ext in exts:
-            _f = path(fn + ext)
-            if _f.exists():
-                return _f 
-
     n = len(files)
     f, axes = plt.subplots(1, n, sharex=True, sharey=True)
     f.set_size_inches(7 * n, 5)
@@ -156,7 +400,7 @@ def multiple_plot(files, image=True):
         fn = files[i]
         g = rsml.rsml2mtg(fn)
         if image:
-            plot2d(g, img_file=get_file(fn), axis=axes[i], ms=1)
+            plot2d(g, img_file=find_image(fn), axis=axes[i], ms=1)
         else:
             plot2d(g, axis=axes[i], ms=1)
     if not image:
@@ -0,0 +1,231 @@
+"""
+Quality control report of a batch of rsml files
+
+Render a thumbnail of all rsml files of a directory, drawn over their image
+if found, using several processes. The thumbnails are written as png files
+in an output directory, with an html index that displays them all::
+
+    from rsml.report import report_directory
+    failures = report_directory('experiment/', 'qc/', processes=4)
+
+The same can be done from the command line::
+
+    rsml-report experiment/ -o qc/ -j 4
+
+The image of a rsml file is the file with the same name and an image
+extension (see `find_image`). The thumbnail of `experiment/a/b.rsml` is
+`qc/a/b.png`. Thumbnails that are more recent than their rsml file and image
+are not rendered again, unless `force` is True. The rendering does not need
+a display (it uses the matplotlib 'Agg' canvas).
+"""
+import os
+import sys
+
+image_extensions = ['.png', '.jpg', '.tif']
+
+
+def find_image(filename, extensions=None):
+    """ return the image of rsml file `filename`, or None if there is none
+
+    It is the first existing file with the same name as `filename`, with one
+    of the `extensions` (by default, `image_extensions`).
+    """
+    if extensions is None: extensions = image_extensions
+    base = os.path.splitext(filename)[0]
+    for ext in extensions:
+        if os.path.exists(base+ext):
+            return base+ext
+
+def is_up_to_date(output, sources):
+    """ True if file `output` exists and is more recent than all `sources` """
+    if not os.path.exists(output):
+        return False
+    mtime = os.path.getmtime(output)
+    return all(os.path.getmtime(source)<=mtime for source in sources
+                                               if source is not None)
+
+def render_file(filename, output, image=True, title=None, size=(6,5), dpi=80,
+                tolerance=1):
+    """ render the thumbnail of rsml file `filename` into png file `output`
+
+    :Inputs:
+      - `image`:
+           if True, the root axes are drawn over the image of `filename`, if
+           found (see `find_image`). It can also be the image filename.
+      - `title`:
+           the title of the thumbnail. By default, it is `filename`
+      - `size`, `dpi`:
+           the size of the thumbnail, in inches, and its resolution
+      - `tolerance`:
+           the simplification of the drawn polylines, in pixels (see
+           `rsml.plot.plot2d_fast`)
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from .io import rsml2mtg
+    from .plot import plot2d_fast
+
+    if image is True:
+        image = find_image(filename)
+    elif image is False:
+        image = None
+
+    g = rsml2mtg(filename)
+
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axis = figure.add_subplot(1, 1, 1)
+    plot2d_fast(g, img_file=image, axis=axis, tolerance=tolerance)
+    axis.set_title(filename if title is None else title, fontsize='small')
+
+    directory = os.path.dirname(output)
+    if directory and not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:   # created by another process
+            pass
+    figure.savefig(output, dpi=dpi)
+
+def _render_task(task):
+    """ process `task` = (filename, output, name, options). Return error or None """
+    import traceback
+    filename, output, name, options = task
+    try:
+        render_file(filename, output, title=name, **options)
+    except Exception:
+        return traceback.format_exc()
+
+def render_files(files, output_dir, processes=None, names=None, force=False,
+                 **options):
+    """ Render the thumbnails of all rsml `files` into directory `output_dir`
+
+    :Inputs:
+      - `files`:
+           the list of rsml files to process
+      - `output_dir`:
+           the directory to write the thumbnails and the html index into
+      - `processes`:
+           the number of processes to use. If None, use the number of cpu.
+           If 1, files are processed sequentially by the current process.
+      - `names`:
+           optional list of the names of the files, relative to `output_dir`
+           (without extension). By default, the file names without directory
+      - `force`:
+           if False, thumbnails that are up to date are not rendered again
+      - `options`:
+           optional arguments of `render_file`
+
+    :Outputs:
+      The list of (filename, error-message) of all files that failed.
+    """
+    from itertools import imap
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if names is None:
+        names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    outputs = [os.path.join(output_dir, name+'.png') for name in names]
+
+    image = options.get('image', True)
+    tasks = []
+    for filename, output, name in zip(files, outputs, names):
+        sources = [filename, find_image(filename) if image is True else None]
+        if force or not is_up_to_date(output, sources):
+            tasks.append((filename, output, name, options))
+
+    pool = None
+    if processes!=1 and len(tasks)>1:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        errors = pool.imap(_render_task, tasks)
+    else:
+        errors = imap(_render_task, tasks)
+
+    failures = []
+    try:
+        for task, error in zip(tasks, errors):
+            if error is not None:
+                failures.append((task[0], error))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    write_index(os.path.join(output_dir, 'index.html'), outputs, names,
+                failures=failures)
+    return failures
+
+def write_index(filename, thumbnails, names, failures=()):
+    """ write the html page `filename` that displays all `thumbnails`
+
+    `names` are the captions of the thumbnails, and `failures` the list of
+    (filename, error-message) of the files that could not be rendered.
+    Missing thumbnails are not displayed.
+    """
+    from cgi import escape
+    from urllib import pathname2url
+
+    directory = os.path.dirname(filename)
+    lines = ['<!DOCTYPE html>',
+             '<html><head><meta charset="utf-8"><title>rsml report</title>',
+             '<style>figure {display:inline-block; margin:4px} '
+             'img {width:320px} pre {color:#a00}</style>',
+             '</head><body>']
+    for thumbnail, name in zip(thumbnails, names):
+        if not os.path.exists(thumbnail):
+            continue
+        url = escape(pathname2url(os.path.relpath(thumbnail, directory)), True)
+        lines.append('<figure><a href="{0}"><img src="{0}"></a>'
+                     '<figcaption>{1}</figcaption></figure>'.format(url, escape(name)))
+    if failures:
+        lines.append('<h2>Failures</h2>')
+        for failed, error in failures:
+            lines.append('<h3>{}</h3><pre>{}</pre>'.format(escape(failed), escape(error)))
+    lines.append('</body></html>')
+
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines)+'\n')
+
+def report_directory(directory, output_dir, processes=None, force=False, **options):
+    """ Render the thumbnails of all rsml files in `directory` into `output_dir`
+
+    See `render_files`
+    """
+    from .batch import find_rsml_files
+
+    files = find_rsml_files(directory)
+    names = [os.path.splitext(os.path.relpath(f, directory))[0] for f in files]
+    return render_files(files, output_dir, processes=processes, names=names,
+                        force=force, **options)
+
+
+def main(argv=None):
+    """ Entry point of the `rsml-report` command """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='rsml-report',
+                description='Render the thumbnails of all rsml files in a '
+                            'directory, with an html index')
+    parser.add_argument('directory', help='directory containing rsml files')
+    parser.add_argument('-o', '--output', default='rsml-report',
+                        help='output directory (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of processes (default: number of cpu)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='render all files, even if up to date')
+    parser.add_argument('--no-image', dest='image', action='store_false',
+                        help='do not draw the images of the rsml files')
+    parser.add_argument('--dpi', type=int, default=80,
+                        help='resolution of the thumbnails (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    failures = report_directory(args.directory, args.output, processes=args.jobs,
+                                force=args.force, image=args.image, dpi=args.dpi)
+    for filename, error in failures:
+        sys.stderr.write('Failed to process {}:\n{}\n'.format(filename, error))
+
+    return 1 if failures else 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Segment scale view of continuous mtg
+
+A `SegmentView` gives access to the segments of a continuous rsml mtg as
+numpy arrays, without constructing the discrete mtg (see `rsml.continuous`).
+Each point of the polylines of the 'geometry' property is a node, and each
+node which has a parent node defines the segment (parent-node, node)::
+
+    from rsml.segments import SegmentView
+
+    view = SegmentView(g)
+    view.axis                       # the axe vertex id of all nodes
+    view.parent                     # the index of the parent of all nodes
+    view.lengths()                  # the length of all segments
+    view.insertion_angles()         # insertion angle of all axes
+
+The nodes are stored in the order of the `GeometryStore` of `g`: all arrays
+have one value per point of all polylines, and the nodes of axe `k` of the
+store are in range `offsets[k]:offsets[k+1]`.
+
+The parent of the 1st node of an axe with a 'parent-node' property is the
+respective node of its parent axe. The first node of other axes has no
+parent, which is indicated by -1.
+"""
+import numpy as _np
+
+
+class SegmentView(object):
+    """ The nodes and segments of the root axes of a continuous mtg
+
+    :Attributes:
+      - `store`:       the `GeometryStore` of the mtg
+      - `coordinates`: the (N,k) array of the coordinates of all nodes
+      - `axis`:        the (N,) array of the mtg vertex of the axe of all nodes
+      - `node`:        the (N,) array of the index of the nodes in their axe
+      - `parent`:      the (N,) array of the index of the parent of all nodes,
+                       or -1 for nodes without parent
+    """
+    def __init__(self, g, store=None):
+        from .geometry import GeometryStore
+        from .topology import get_topology
+
+        if store is None:
+            store = GeometryStore.from_mtg(g)
+        self.g = g
+        self.store = store
+        self.coordinates = store.coordinates
+
+        sizes   = store.sizes()
+        starts  = store.offsets[:-1]
+        number  = store.offsets[-1]
+        vertices = _np.array(store.vertices, dtype=int)
+
+        self.axis = _np.repeat(vertices, sizes)
+        self.node = _np.arange(number) - _np.repeat(starts, sizes)
+
+        parent = _np.arange(number) - 1
+        filled = sizes>0
+        parent[starts[filled]] = -1
+
+        # connect the first node of branches to their parent axe
+        parent_node = g.properties().get('parent-node', {})
+        branches = [(k,vid) for k,vid in enumerate(store.vertices)
+                                if filled[k] and vid in parent_node]
+        if branches:
+            axes  = _np.array([k for k,vid in branches], dtype=int)
+            parents = get_topology(g).parent_dict()
+            paxes = store.indices([parents.get(vid) for k,vid in branches])
+            pnode = _np.array([parent_node[vid] for k,vid in branches], dtype=int)
+
+            valid = (paxes>=0) & (pnode>=0) & (pnode<_np.append(sizes,0)[paxes])
+            parent[starts[axes[valid]]] = starts[paxes[valid]] + pnode[valid]
+
+        self.parent = parent
+
+    def __len__(self):
+        """ the number of nodes """
+        return len(self.parent)
+
+    def has_parent(self):
+        """ the boolean array of the nodes that have a parent """
+        return self.parent>=0
+
+    def branching(self):
+        """ the boolean array of the first nodes of branches """
+        parent = self.parent
+        return (parent>=0) & (self.node==0)
+
+    def children_number(self):
+        """ return the array of the number of children of all nodes """
+        parent = self.parent
+        return _np.bincount(parent[parent>=0], minlength=len(parent))
+
+    def vectors(self):
+        """ return the (N,k) array of the vectors of all segments
+
+        The vectors of nodes without parent are 0.
+        """
+        parent = self.parent
+        vectors = self.coordinates - self.coordinates[parent]
+        vectors[parent<0] = 0
+        return vectors
+
+    def lengths(self):
+        """ return the array of the length of all segments (0 if no parent) """
+        return (self.vectors()**2).sum(axis=1)**.5
+
+    def turning_angles(self):
+        """ return the angle between all segments and their parent segment
+
+        The angles are in radian, in [0,pi]. It is nan for null segments and
+        for nodes whose parent has no parent. 
+        
+        If the parent segment is null, the angle with the grand-parent segment
+        is returned. This is the case of the 2nd node of branches which 1st 
+        node is the same as their parent node: their angle is the insertion
+        angle of the branch (see `insertion_angles`).
+        """
+        vectors = self.vectors()
+        lengths = (vectors**2).sum(axis=1)**.5
+        ref, valid = self._reference_segments(lengths)
+
+        angles = _np.empty(len(ref))
+        angles.fill(_np.nan)
+        v1 = vectors[ref[valid]]
+        v2 = vectors[valid]
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            cos = (v1*v2).sum(axis=1)/(lengths[ref[valid]]*lengths[valid])
+        angles[valid] = _np.arccos(_np.clip(cos,-1,1))
+        return angles
+
+    def _reference_segments(self, lengths):
+        """ return the reference segment of all nodes for `turning_angles`
+        
+        Return the array of the reference node and the boolean array of the 
+        nodes for which it is valid.
+        """
+        parent = self.parent
+        
+        ref = parent.copy()
+        null = (ref>=0) & (lengths[ref]==0)
+        ref[null] = parent[ref[null]]
+        valid = (ref>=0) & (lengths>0)
+        valid[valid] = parent[ref[valid]]>=0
+        
+        return ref, valid
+        
+    def insertion_angles(self):
+        """ return the insertion angle of the axes of the store 
+        
+        It is the turning angle of the first non-null segment of branches, 
+        and nan for axes which are not branches (see `turning_angles`).
+        """
+        store = self.store
+        angles = _np.empty(len(store))
+        angles.fill(_np.nan)
+        
+        first = store.offsets[:-1]
+        branch = _np.flatnonzero((store.sizes()>0) & (first<len(self)))
+        branch = branch[self.parent[first[branch]]>=0]
+        if len(branch):
+            node = first[branch]
+            node = node + (self.lengths()[node]==0)
+            inside = node<store.offsets[branch+1]
+            angles[branch[inside]] = self.turning_angles()[node[inside]]
+        return angles
+        
+    def curvature(self):
+        """ return the discrete curvature at all nodes
+
+        It is the turning angle divided by the mean length of the segment and
+        its reference segment (see `turning_angles`).
+        """
+        lengths = self.lengths()
+        ref, valid = self._reference_segments(lengths)
+        mean_length = _np.empty(len(ref))
+        mean_length.fill(_np.nan)
+        mean_length[valid] = (lengths[valid] + lengths[ref[valid]])/2.
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            return self.turning_angles()/mean_length
+
+    def function(self, name, default=_np.nan):
+        """ return the values of function `name` at all nodes
+
+        Function `name` is a property of the mtg root axes which contains a
+        list of values for each point of their geometry. Nodes of axes which
+        do not have such a property get the `default` value.
+        See `GeometryStore.node_values`
+        """
+        function = self.g.properties().get(name, {})
+        return self.store.node_values(function, default=default)
+
+    def axis_sum(self, values):
+        """ return the sum of node `values` over each axe of the store """
+        store = self.store
+        sums = _np.zeros(len(store))
+        filled = store.sizes()>0
+        if filled.any():
+            sums[filled] = _np.add.reduceat(values, store.offsets[:-1][filled])
+        return sums
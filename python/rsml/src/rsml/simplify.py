@@ -0,0 +1,321 @@
+"""
+Simplification and resampling of the geometry of continuous mtg
+
+The polylines of the root axes can be simplified, i.e. reduced to a subset
+of their points, using the Douglas-Peucker or the Visvalingam algorithm, or
+resampled with segments of regular length. It is typically done before
+saving a mtg with dense geometry::
+
+    from rsml import rsml2mtg, mtg2rsml
+    from rsml.simplify import simplify_mtg
+
+    g = rsml2mtg('dense.rsml')
+    errors = simplify_mtg(g, tolerance=0.5)
+    mtg2rsml(g, 'simplified.rsml')
+
+The mtg is modified **in-place**, consistently:
+  - the nodes of the axes that are the 'parent-node' of branches are always
+    kept, and the 'parent-node' property is updated to their new index
+  - functions with one value per node (i.e. with 'polyline' domain) are
+    reduced to the kept nodes, or interpolated at the resampled nodes.
+    Functions with 'length' domain are left unchanged
+  - if the mtg has a columnar geometry (see `rsml.geometry`), a new store of
+    the modified geometry and functions is set
+
+The returned `errors` is a dictionary of (vertex-id, error) that gives, for
+all modified axes, an upper bound of the hausdorff distance between their
+original and their new polyline (see `rsml.misc.hausdorff_distance`).
+"""
+import heapq as _heapq
+
+import numpy as _np
+
+
+def douglas_peucker(polyline, tolerance, keep=()):
+    """ return the indices of the points of `polyline` kept by Douglas-Peucker
+
+    Points are kept such that all removed points are at most at `tolerance`
+    distance to the simplified polyline. The first and last points, and the
+    points with indices in `keep`, are always kept.
+    """
+    points = _np.asarray(polyline, dtype=float)
+    kept = _anchors(len(points), keep)
+    if len(points)<3:
+        return _np.flatnonzero(kept)
+
+    anchors = _np.flatnonzero(kept)
+    stack = zip(anchors[:-1], anchors[1:])
+    while stack:
+        start, end = stack.pop()
+        if end-start<2:
+            continue
+        distance = _segment_distance(points[start+1:end], points[start], points[end])
+        k = distance.argmax()
+        if distance[k]>tolerance:
+            k += start+1
+            kept[k] = True
+            stack.extend([(start,k),(k,end)])
+
+    return _np.flatnonzero(kept)
+
+def visvalingam(polyline, area, keep=()):
+    """ return the indices of the points of `polyline` kept by Visvalingam
+
+    The point with the smallest effective area, i.e. the area of the triangle
+    it forms with its current neighbours, is iteratively removed while this
+    area is less than `area`. The first and last points, and the points with
+    indices in `keep`, are always kept.
+    """
+    points = _np.asarray(polyline, dtype=float)
+    kept = _anchors(len(points), keep)
+    if len(points)<3:
+        return _np.flatnonzero(kept)
+
+    pts  = points.tolist()
+    prev = range(-1,len(pts)-1)
+    next = range(1,len(pts)+1)
+    version = [0]*len(pts)
+
+    heap = [(_triangle_area(pts[i-1],pts[i],pts[i+1]), i, 0)
+                for i in xrange(1,len(pts)-1) if not kept[i]]
+    _heapq.heapify(heap)
+
+    removed = _np.zeros(len(pts), dtype=bool)
+    while heap and heap[0][0]<area:
+        a, i, v = _heapq.heappop(heap)
+        if v!=version[i]:
+            continue            # outdated area
+        removed[i] = True
+        p, n = prev[i], next[i]
+        next[p], prev[n] = n, p
+
+        # update area of neighbours
+        for j in (p,n):
+            if kept[j]:
+                continue
+            version[j] += 1
+            a = _triangle_area(pts[prev[j]],pts[j],pts[next[j]])
+            _heapq.heappush(heap, (a, j, version[j]))
+
+    return _np.flatnonzero(~removed)
+
+def resample_polyline(polyline, step, keep=()):
+    """ return the arclength of the nodes of the resampling of `polyline`
+
+    The polyline is divided by its points with indices in `keep` and its
+    first and last points. Each part is resampled by segments of equal
+    length, the largest that is at most `step`.
+
+    The returned array gives the position of the new nodes along `polyline`.
+    Their coordinates are given by `interpolate(polyline, positions)`.
+    A ValueError is raised if `step` is not positive.
+    """
+    if not step>0:
+        raise ValueError('Resampling step should be positive: ' + str(step))
+    points = _np.asarray(polyline, dtype=float)
+    if len(points)<2:
+        return _np.zeros(len(points))
+
+    arclength = _arclength(points)
+    anchors = _np.flatnonzero(_anchors(len(points), keep))
+
+    positions = [arclength[:1]]
+    for start, end in zip(anchors[:-1], anchors[1:]):
+        length = arclength[end]-arclength[start]
+        count  = max(int(_np.ceil(length/step)),1)
+        positions.append(_np.linspace(arclength[start],arclength[end],count+1)[1:])
+
+    return _np.concatenate(positions)
+
+def interpolate(polyline, positions, values=None):
+    """ return the points of `polyline` at arclength `positions`
+
+    If `values` is given, it should have one value per point of `polyline`,
+    and the values interpolated at `positions` are returned instead.
+    """
+    points = _np.asarray(polyline, dtype=float)
+    arclength = _arclength(points)
+    if values is not None:
+        return _np.interp(positions, arclength, _np.asarray(values, dtype=float))
+    return _np.column_stack([_np.interp(positions, arclength, points[:,k])
+                             for k in xrange(points.shape[1])])
+
+def simplification_error(polyline, simplified, segments):
+    """ return an upper bound of the hausdorff distance to `simplified`
+
+    `simplified` is a polyline with nodes on `polyline` (such as returned by
+    `douglas_peucker` or `resample_polyline`), and `segments` gives for all
+    points of `polyline` the index of the segment of `simplified` they have
+    been replaced by. The returned value is the largest distance from the
+    points of `polyline` to their segment.
+    """
+    points = _np.asarray(polyline, dtype=float)
+    simplified = _np.asarray(simplified, dtype=float)
+    if len(points)==0 or len(simplified)<2:
+        return 0.
+    segments = _np.clip(segments, 0, len(simplified)-2)
+    distance = _segment_distance(points, simplified[segments], simplified[segments+1])
+    return float(distance.max())
+
+
+def simplify_mtg(g, tolerance, method='douglas-peucker'):
+    """ Simplify the geometry of all root axes of continuous mtg `g`
+
+    :Inputs:
+      - `tolerance`:
+           for the 'douglas-peucker' method, the maximum distance of removed
+           points to the simplified polylines. For the 'visvalingam' method,
+           the minimum area of the triangle formed by the kept points.
+      - `method`:
+           either 'douglas-peucker' or 'visvalingam'
+
+    The mtg is modified in-place (see module documentation).
+
+    :Outputs:
+      A dictionary of the (vertex-id, error bound) of the root axes
+    """
+    methods = {'douglas-peucker':douglas_peucker, 'visvalingam':visvalingam}
+    if method not in methods:
+        raise ValueError('Unknown simplification method: ' + str(method))
+    simplify = methods[method]
+
+    def transform(points, keep):
+        kept = simplify(points, tolerance, keep=keep)
+        nodes = _np.arange(len(points))
+        index = _np.searchsorted(kept, nodes)
+        segments = _np.searchsorted(kept, nodes, side='right')-1
+        return (points[kept], index,
+                lambda values: _np.asarray(values, dtype=float)[kept], segments)
+
+    return _transform_mtg(g, transform)
+
+def resample_mtg(g, step):
+    """ Resample the geometry of all root axes of continuous mtg `g`
+
+    The polylines are resampled by segments of (at most) `step` length,
+    keeping the branching nodes (see `resample_polyline`).
+
+    The mtg is modified in-place (see module documentation).
+
+    :Outputs:
+      A dictionary of the (vertex-id, error bound) of the root axes
+    """
+    if not step>0:
+        raise ValueError('Resampling step should be positive: ' + str(step))
+
+    def transform(points, keep):
+        positions = resample_polyline(points, step, keep=keep)
+        arclength = _arclength(points)
+        index = _np.searchsorted(positions, arclength)
+        segments = _np.searchsorted(positions, arclength, side='right')-1
+        return (interpolate(points, positions), index,
+                lambda values: interpolate(points, positions, values), segments)
+
+    return _transform_mtg(g, transform)
+
+
+def _transform_mtg(g, transform):
+    """ apply `transform` to the geometry, parent-node and functions of `g`
+
+    `transform(points, keep)` should return (new-points, index, convert,
+    segments) where `index` gives, for all `points`, the index of the new
+    point they are replaced by (exact for the nodes in `keep`), `convert`
+    converts function values and `segments` is used to compute the error
+    bound (see `simplification_error`).
+
+    An IndexError is raised, before `g` is modified, if a 'parent-node' is
+    not a node of the parent axe. The topology of `g` is recomputed, such 
+    that it is checked against the current parent axes.
+    """
+    from .geometry import GeometryStore, set_columnar_geometry, set_columnar_functions
+    from .topology import get_topology, invalidate_topology
+
+    geometry    = g.property('geometry')
+    parent_node = g.properties().get('parent-node', {})
+    metadata    = g.graph_properties().get('metadata', {})
+    functions   = [g.property(name) for name in metadata.get('functions',[])
+                                    if name in g.property_names()]
+
+    store = g.graph_properties().get('geometry-store')
+    columnar = store is not None and store.is_geometry_of(g)
+
+    invalidate_topology(g)
+    topology = get_topology(g)
+    for child, pnode in parent_node.iteritems():
+        parent = topology.parent(child) if child in topology else None
+        size = len(geometry.get(parent,[]))
+        if parent is not None and not 0<=pnode<size:
+            raise IndexError('parent-node {} of root {} is out of its parent polyline'
+                             .format(pnode, child))
+
+    errors = {}
+    new_parent_node = {}
+    for vid in geometry.keys():
+        points = _np.asarray(geometry[vid], dtype=float)
+        if points.ndim!=2 or len(points)<2:
+            continue
+
+        branches = [child for child in topology.children(vid) if child in parent_node]
+        keep = sorted(set(parent_node[child] for child in branches))
+        new_points, index, convert, segments = transform(points, keep)
+
+        errors[vid] = simplification_error(points, new_points, segments)
+        for child in branches:
+            new_parent_node[child] = int(index[parent_node[child]])
+
+        for values in functions:
+            value = values.get(vid)
+            if _np.ndim(value)==1 and len(value)==len(points):
+                new_value = convert(value)
+                values[vid] = new_value if isinstance(value,_np.ndarray) else new_value.tolist()
+
+        geometry[vid] = new_points if isinstance(geometry[vid],_np.ndarray) else new_points.tolist()
+
+    parent_node.update(new_parent_node)
+
+    if columnar:
+        store = set_columnar_geometry(g, GeometryStore.from_mtg(g))
+        set_columnar_functions(g, [name for name in metadata.get('functions',[])
+                                        if name in g.property_names()], store)
+
+    return errors
+
+def _anchors(n, keep):
+    """ return the boolean mask of the 1st, last and `keep` nodes of n points
+
+    Raise an IndexError if `keep` contains invalid node indices.
+    """
+    keep = list(keep)
+    invalid = [k for k in keep if not 0<=k<n]
+    if invalid:
+        raise IndexError('Invalid node indices for a polyline of {} points: {}'
+                         .format(n, invalid))
+    kept = _np.zeros(n, dtype=bool)
+    if n:
+        kept[[0,n-1]] = True
+        kept[keep] = True
+    return kept
+
+def _arclength(points):
+    """ return the cumulative arclength at all `points` of a polyline """
+    length = _np.zeros(len(points))
+    if len(points)>1:
+        length[1:] = ((_np.diff(points,axis=0)**2).sum(axis=1)**.5).cumsum()
+    return length
+
+def _segment_distance(points, start, end):
+    """ return the distance from `points` to the segments [`start`,`end`] """
+    direction = end-start
+    length2 = (direction**2).sum(axis=-1)
+    t = ((points-start)*direction).sum(axis=-1)/_np.where(length2>0,length2,1)
+    t = _np.clip(t,0,1)[...,None]
+    return ((points-start-t*direction)**2).sum(axis=-1)**.5
+
+def _triangle_area(a, b, c):
+    """ return the area of the triangle (`a`,`b`,`c`) of points in any dimension """
+    u = [bi-ai for ai,bi in zip(a,b)]
+    v = [ci-ai for ai,ci in zip(a,c)]
+    uu = sum(x*x for x in u)
+    vv = sum(x*x for x in v)
+    uv = sum(x*y for x,y in zip(u,v))
+    return .5*max(uu*vv-uv*uv,0)**.5
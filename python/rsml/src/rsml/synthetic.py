@@ -0,0 +1,127 @@
+"""
+Generation of random rsml mtg
+
+`synthetic_mtg` generates continuous mtg of random root systems with chosen
+size. It is meant for tests and benchmarks::
+
+    from rsml.synthetic import synthetic_mtg, synthetic_rsml
+
+    g = synthetic_mtg(plants=5, depth=3, roots=[1,10,5], points=200, seed=0)
+    synthetic_rsml('big.rsml', plants=50, depth=2, roots=[1,40])
+
+Root axes are random walks with steps of `step` length. Primary axes start
+at the plants seeds, aligned along the x-axis, and grow toward the positive
+y. Lateral axes start at a random node of their parent axe (which is their
+'parent-node' property) and grow sideways.
+"""
+import numpy as _np
+
+
+def synthetic_mtg(plants=1, depth=2, roots=(1,10), points=100, step=1.,
+                  spacing=None, seed=None):
+    """ Generate a random continuous rsml mtg
+
+    :Inputs:
+      - `plants`:
+           the number of plants
+      - `depth`:
+           the maximum root order
+      - `roots`:
+           the number of axes per parent, for each order: `roots[0]` is the
+           number of primary axes per plant, `roots[1]` the number of 2nd
+           order axes per primary axe, etc. If an int, it is used for all
+           orders.
+      - `points`:
+           the number of points of the axes polyline, as an int or a list of
+           int for each order
+      - `step`:
+           the distance between consecutive points
+      - `spacing`:
+           the distance between plants seeds. By default, it is the length of
+           the primary axes
+      - `seed`:
+           optional seed of the random generator
+
+    :Outputs:
+      A continuous mtg, with 'geometry' and 'parent-node' properties and with
+      default metadata.
+    """
+    from .misc import build_mtg
+    from .metadata import add_property_definition
+
+    per_order = lambda value: [value]*depth if isinstance(value,int) else list(value)
+    roots  = per_order(roots)
+    points = per_order(points)
+    if len(roots)<depth or len(points)<depth:
+        raise ValueError('roots and points should be given for all orders')
+    if spacing is None:
+        spacing = points[0]*step
+
+    random = _np.random.RandomState(seed)
+
+    vertices, complexes, parents = [], [], []
+    label, edge_type, geometry, parent_node = {}, {}, {}, {}
+    new_id = iter(xrange(1, 2**31)).next
+
+    def add_axes(plant, parent, order):
+        if order>depth:
+            return
+        for i in xrange(roots[order-1]):
+            axe = new_id()
+            vertices.append(axe)
+            complexes.append(plant)
+            parents.append(parent)
+            label[axe] = 'root'
+
+            if parent is None:
+                edge_type[axe] = '/'
+                start = _np.array([plant_x, 0.])
+                angle = _np.pi/2
+            else:
+                edge_type[axe] = '+'
+                parent_geom = geometry[parent]
+                # the first node of laterals is (also) on their parent axe
+                node = random.randint(1, len(parent_geom)) if len(parent_geom)>1 else 0
+                parent_node[axe] = node
+                start = parent_geom[node]
+                angle = _np.pi/2 + random.choice([-1,1])*random.uniform(.3,1.4)
+
+            walk = random_walk(start, angle, points[order-1], step, random)
+            geometry[axe] = walk.round(2)  # rsml files have finite precision
+            add_axes(plant, axe, order+1)
+
+    for p in xrange(plants):
+        plant = new_id()
+        vertices.append(plant)
+        complexes.append(0)
+        parents.append(None)
+        label[plant] = 'Plant'
+        plant_x = p*spacing
+        add_axes(plant, None, 1)
+
+    geometry = dict((axe,geom.tolist()) for axe,geom in geometry.iteritems())
+    g = build_mtg(vertices, complexes, parents,
+                  properties={'label':label, 'edge_type':edge_type,
+                              'geometry':geometry, 'parent-node':parent_node})
+    add_property_definition(g, label='parent-node', type=int)
+
+    return g
+
+def random_walk(start, angle, size, step=1., random=_np.random):
+    """ return a (`size`,2) array of a random walk starting at `start`
+
+    The walk starts in direction `angle` (in radian), which slowly changes.
+    """
+    angles = angle + (random.normal(0, .1, size-1)).cumsum()
+    steps = step*_np.vstack((_np.cos(angles), _np.sin(angles))).T
+    walk = _np.empty((size,2))
+    walk[0] = start
+    walk[1:] = start + steps.cumsum(axis=0)
+    return walk
+
+def synthetic_rsml(filename, **kwds):
+    """ write a random rsml file, generated by `synthetic_mtg(**kwds)` """
+    from .io import mtg2rsml
+    g = synthetic_mtg(**kwds)
+    mtg2rsml(g, filename)
+    return g
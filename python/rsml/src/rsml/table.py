@@ -0,0 +1,381 @@
+"""
+Export and import of column-oriented tables
+
+A table is a dictionary of (column-name, array) which all have the same
+length. `write_table` and `read_table` save and load tables in one of the
+following formats, selected by the file extension:
+
+  - '.csv', '.tsv', '.txt':  text file, with separator `sep`
+  - '.csv.gz', '.tsv.gz':    gzip compressed text file
+  - '.npz':                  numpy compressed archive
+  - '.parquet', '.feather':  apache formats, which require `pyarrow`
+
+Text files are compatible with R `read.table(filename, header=TRUE, sep=sep)`:
+missing values (None or nan) are written as 'NA'.
+
+Example::
+
+    from rsml.table import write_table, read_table, node_table
+    from rsml.measurements import RSML_Measurements
+
+    table = RSML_Measurements().add(g).columns()
+    write_table(table, 'roots.csv.gz', columns=['id','order','length'])
+
+    nodes = node_table(g, functions=['diameter'])
+    write_table(nodes, 'nodes.parquet')
+
+    table = read_table('roots.csv.gz')      # columns as numpy arrays
+
+Numeric columns are stored as numpy float or int arrays, where missing values
+are nan. Int columns with missing values, and other columns, are object arrays
+with None for missing values.
+"""
+import re as _re
+import numpy as _np
+
+na_values = set(['NA', 'None', '', 'nan', 'NaN'])
+
+
+def as_column(values):
+    """ convert the sequence `values` into a numpy array column
+
+    If all values (except None) are numbers, return an int or float array.
+    In the later case, None are converted to nan. Otherwise, including for
+    int values with None, return an object array.
+    """
+    if isinstance(values, _np.ndarray) and values.dtype.kind in 'biuf':
+        return values
+    values = list(values)
+    numbers = (int, long, float, _np.integer, _np.floating)
+    if all(isinstance(v, numbers) for v in values if v is not None):
+        if any(isinstance(v, (float,_np.floating)) for v in values):
+            return _np.array([_np.nan if v is None else v for v in values], dtype=float)
+        if None not in values:
+            return _np.array(values, dtype=int)
+    column = _np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+def table_format(filename, format=None):
+    """ return the format of `filename`: 'csv', 'csv.gz', 'npz', 'parquet' or 'feather' """
+    if format is not None:
+        return format
+    name = filename.lower()
+    compressed = name.endswith('.gz')
+    if compressed:
+        name = name[:-3]
+    for ext, fmt in [('.npz','npz'), ('.parquet','parquet'), ('.feather','feather')]:
+        if name.endswith(ext) and not compressed:
+            return fmt
+    return 'csv.gz' if compressed else 'csv'
+
+def _select(table, columns):
+    """ return the list of (name, column) of `table` for `columns` """
+    if columns is None:
+        columns = table.keys()
+    missing = [name for name in columns if name not in table]
+    if missing:
+        raise KeyError('Unknown columns: ' + ', '.join(missing))
+    return [(name, as_column(table[name])) for name in columns]
+
+def write_table(table, filename, columns=None, format=None, sep='\t',
+                chunk_size=65536):
+    """ write `table` in file `filename`
+
+    :Inputs:
+      - `table`:
+           a dictionary of (column-name, array-like)
+      - `filename`:
+           the file to write into
+      - `columns`:
+           the list of columns to write, in order. By default, write all
+           table columns, in the order of `table.keys()`
+      - `format`:
+           the file format. By default, it is selected from the file extension
+           (see `rsml.table`)
+      - `sep`:
+           the separator for text files
+      - `chunk_size`:
+           the number of rows converted and written at once
+    """
+    format = table_format(filename, format)
+    columns = _select(table, columns)
+
+    if format in ('csv', 'csv.gz'):
+        _write_csv(columns, filename, sep, chunk_size, compressed=format=='csv.gz')
+    elif format=='npz':
+        _write_npz(columns, filename)
+    elif format in ('parquet', 'feather'):
+        _write_arrow(columns, filename, format, chunk_size)
+    else:
+        raise ValueError('Unknown table format: ' + str(format))
+
+def read_table(filename, columns=None, format=None, sep='\t'):
+    """ read the table stored in `filename` by `write_table`
+
+    Return an ordered dictionary of (column-name, numpy array). If `columns`
+    is given, only those columns are returned.
+    """
+    from collections import OrderedDict
+
+    format = table_format(filename, format)
+    if format in ('csv', 'csv.gz'):
+        table = _read_csv(filename, sep, compressed=format=='csv.gz')
+    elif format=='npz':
+        table = _read_npz(filename)
+    elif format in ('parquet', 'feather'):
+        table = _read_arrow(filename, format, columns)
+    else:
+        raise ValueError('Unknown table format: ' + str(format))
+
+    if columns is not None:
+        table = OrderedDict(_select(table, columns))
+    return table
+
+
+# text files
+# ----------
+def _open(filename, mode, compressed):
+    if compressed:
+        import gzip
+        return gzip.open(filename, mode, compresslevel=6)
+    return open(filename, mode)
+
+def _text_column(column):
+    """ convert `column` to a list of strings """
+    if column.dtype.kind=='f':
+        text = map(repr, column.tolist())
+        for i in _np.flatnonzero(_np.isnan(column)):
+            text[i] = 'NA'
+        return text
+    elif column.dtype.kind=='O':
+        return ['NA' if v is None else str(v) for v in column]
+    else:
+        return map(str, column.tolist())
+
+def _write_csv(columns, filename, sep, chunk_size, compressed=False):
+    import csv
+    from cStringIO import StringIO
+    from itertools import izip
+
+    names = [name for name, column in columns]
+    size = len(columns[0][1]) if columns else 0
+    with _open(filename, 'wb', compressed) as f:
+        # each chunk is formatted in memory, then written at once
+        buffer = StringIO()
+        writer = csv.writer(buffer, delimiter=sep, lineterminator='\n')
+        writer.writerow(names)
+        for start in xrange(0, size, chunk_size):
+            chunk = [_text_column(column[start:start+chunk_size])
+                        for name, column in columns]
+            writer.writerows(izip(*chunk))
+            f.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+        f.write(buffer.getvalue())
+
+# space separated int tokens, such as '-1 2 30'
+_int_text = _re.compile(r'-?[0-9]+( -?[0-9]+)*\Z')
+
+def parse_column(values):
+    """ convert the list of strings `values` into a numpy array column
+
+    Return an int array if possible, then a float array (with nan for missing
+    values), otherwise an object array of the strings (with None for missing
+    values). Int values with missing values are returned as an object array
+    of int and None.
+    """
+    values = list(values)
+    missing = [i for i,v in enumerate(values) if v in na_values]
+
+    # select the column type from its first value
+    numeric = True
+    first = next((v for v in values if v not in na_values), None)
+    if first is not None:
+        try:
+            float(first)
+        except ValueError:
+            numeric = False
+
+    if numeric:
+        present = [v for v in values if v not in na_values] if missing else values
+        text = ' '.join(present)
+        if _int_text.match(text):
+            column = _np.fromstring(text, dtype=int, sep=' ')
+            if len(column)==len(present):   # no value with spaces
+                if not missing:
+                    return column
+                return _int_column(column, missing, len(values))
+
+    if numeric:
+        numbers = list(values)
+        for i in missing:
+            numbers[i] = 'nan'
+        try:
+            return _np.array(numbers, dtype=float)
+        except ValueError:
+            pass
+
+    for i in missing:
+        values[i] = None
+    column = _np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+def _int_column(numbers, missing, size):
+    """ return the object column of int `numbers`, with None at `missing` """
+    values = [None]*size
+    present = _np.ones(size, dtype=bool)
+    present[missing] = False
+    for i, number in zip(_np.flatnonzero(present), numbers.tolist()):
+        values[i] = number
+    column = _np.empty(size, dtype=object)
+    column[:] = values
+    return column
+
+def _is_int_column(column):
+    """ True if object `column` only contains int and None """
+    return all(isinstance(v, (int, long, _np.integer)) and not isinstance(v, bool)
+                for v in column if v is not None)
+
+def _read_csv(filename, sep, compressed=False):
+    import csv
+    from cStringIO import StringIO
+    from collections import OrderedDict
+
+    with _open(filename, 'rb', compressed) as f:
+        reader = csv.reader(StringIO(f.read()), delimiter=sep)
+    names = reader.next()
+    rows = list(reader)
+
+    columns = zip(*rows) if rows else [()]*len(names)
+    return OrderedDict((name, parse_column(column))
+                       for name, column in zip(names, columns))
+
+
+# numpy files
+# -----------
+def _write_npz(columns, filename):
+    arrays = {}
+    for name, column in columns:
+        if column.dtype.kind=='O':
+            # stored as int or strings, with a mask of missing values
+            arrays['missing:'+name] = _np.array([v is None for v in column], dtype=bool)
+            if _is_int_column(column):
+                column = _np.array([0 if v is None else v for v in column], dtype=int)
+            else:
+                column = _np.array(['' if v is None else str(v) for v in column])
+        arrays['column:'+name] = column
+    arrays['columns'] = _np.array([name for name, column in columns])
+    _np.savez_compressed(filename, **arrays)
+
+def _read_npz(filename):
+    from collections import OrderedDict
+
+    table = OrderedDict()
+    with _np.load(filename) as arrays:
+        for name in arrays['columns'].tolist():
+            column = arrays['column:'+name]
+            if 'missing:'+name in arrays.files:
+                values = column.tolist()
+                for i in _np.flatnonzero(arrays['missing:'+name]):
+                    values[i] = None
+                column = _np.empty(len(values), dtype=object)
+                column[:] = values
+            table[name] = column
+    return table
+
+
+# apache arrow files
+# ------------------
+def _import_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required to read and write parquet '
+                          'and feather files')
+
+def _arrow_table(columns, start=0, end=None):
+    pa = _import_pyarrow()
+    arrays = []
+    for name, column in columns:
+        column = column[start:end]
+        if column.dtype.kind=='O' and _is_int_column(column):
+            arrays.append(pa.array(column.tolist(), type=pa.int64()))
+        elif column.dtype.kind=='O':
+            arrays.append(pa.array([None if v is None else str(v) for v in column],
+                                   type=pa.string()))
+        else:
+            arrays.append(pa.array(column, from_pandas=True))  # nan => null
+    return pa.Table.from_arrays(arrays, names=[name for name, column in columns])
+
+def _write_arrow(columns, filename, format, chunk_size):
+    pa = _import_pyarrow()
+    if format=='feather':
+        from pyarrow import feather
+        feather.write_feather(_arrow_table(columns), filename)
+        return
+
+    import pyarrow.parquet as pq
+    size = len(columns[0][1]) if columns else 0
+    writer = None
+    try:
+        for start in xrange(0, max(size,1), chunk_size):
+            chunk = _arrow_table(columns, start, start+chunk_size)
+            if writer is None:
+                writer = pq.ParquetWriter(filename, chunk.schema)
+            writer.write_table(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _read_arrow(filename, format, columns=None):
+    from collections import OrderedDict
+    pa = _import_pyarrow()
+    if format=='feather':
+        from pyarrow import feather
+        table = feather.read_table(filename, columns=columns)
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(filename, columns=columns)
+
+    result = OrderedDict()
+    for name in table.column_names:
+        if table.column(name).null_count and pa.types.is_integer(table.column(name).type):
+            result[name] = as_column(table.column(name).to_pylist())  # int & None
+            continue
+        chunks = [chunk.to_numpy(zero_copy_only=False)
+                    for chunk in table.column(name).chunks]
+        column = _np.concatenate(chunks) if chunks else _np.empty(0)
+        if column.dtype.kind not in 'biuf':
+            column = as_column(column.tolist())
+        result[name] = column
+    return result
+
+
+# node table
+# ----------
+def node_table(g, functions=(), store=None):
+    """ return the table of all polyline nodes of continuous mtg `g`
+
+    The table has one row per point of the root axes geometry, and columns:
+      - 'root':    the mtg vertex id of the root axe
+      - 'node':    the index of the node in its root axe
+      - 'parent':  the row index of the parent node, or -1
+      - 'x', 'y' (and 'z'): the node coordinates
+      - the values of the given `functions` at the nodes
+
+    See `rsml.segments.SegmentView`
+    """
+    from collections import OrderedDict
+    from .segments import SegmentView
+
+    view = SegmentView(g, store=store)
+    table = OrderedDict([('root',view.axis), ('node',view.node),
+                         ('parent',view.parent)])
+    for k, axis in enumerate('xyz'[:view.coordinates.shape[1]]):
+        table[axis] = view.coordinates[:,k]
+    for name in functions:
+        table[name] = view.function(name)
+    return table
@@ -0,0 +1,150 @@
+"""
+Cached topology of the root axes of rsml mtg
+
+Many functions of the rsml package need the tree structure of the root axes:
+their depth-first order, parent, children, order and plant. A `Topology`
+stores them, so that the mtg is traversed only once::
+
+    from rsml.topology import get_topology
+
+    topology = get_topology(g)
+    topology.vertices               # the root axes in depth-first order
+    topology.parents                # the index of their parent axe (or -1)
+    topology.orders                 # their (topological) order: 1, 2, ...
+    topology.parent(vid)            # the parent axe of `vid`, or None
+
+`get_topology` keeps the topology in the 'topology' graph property of `g`,
+and reuses it as long as its `signature` matches `g`: the number of
+vertices of `g` and the last vertex id it attributed. It is checked in
+constant time, and detects the vertices added with new ids and the removed
+vertices. It does not detect other modifications of the mtg topology, such
+as changing the parent of a vertex, or removing a vertex and adding one
+with the same id. Any such modification done outside of the rsml package
+**must** be followed by a call to `invalidate_topology`. The functions of
+the rsml package that modify the mtg topology (such as the conversions of
+`rsml.continuous`) invalidate it.
+"""
+import numpy as _np
+
+
+class Topology(object):
+    """ The tree structure of the root axes of a mtg
+
+    :Attributes:
+      - `vertices`: the list of the n root axes, in depth-first order
+      - `parents`:  (n,) array of the index of the parent axe of all axes,
+                    or -1 for axes without parent
+      - `orders`:   (n,) array of the order of all axes: 1 for axes without
+                    parent, the order of their parent +1 otherwise
+      - `plants`:   the list of the plant (complex) vertex of all axes
+      - `signature`: the signature of the mtg it is the topology of
+    """
+    def __init__(self, vertices, parents, plants, children, signature=None):
+        self.vertices = list(vertices)
+        self.parents = _np.asarray(parents, dtype=int)
+        self.plants = list(plants)
+        self.signature = signature
+        self._children = children
+        self._index = dict((vid,i) for i,vid in enumerate(self.vertices))
+
+        orders = _np.ones(len(self.vertices), dtype=int)
+        for i,p in enumerate(self.parents.tolist()):
+            if p>=0:
+                orders[i] = orders[p]+1   # parents come first
+        self.orders = orders
+
+    @staticmethod
+    def from_mtg(g):
+        """ Compute the `Topology` of the root axes of mtg `g` """
+        axes  = g.vertices(scale=g.max_scale())
+        roots = set(axes)
+
+        # parse root axes in depth-first-order
+        vertices = []
+        parents  = []
+        children = {}
+        index    = {}
+        axes = [(a,-1) for a in axes if g.parent(a) is None][::-1]
+        while len(axes):
+            axe, parent = axes.pop()
+            index[axe] = len(vertices)
+            vertices.append(axe)
+            parents.append(parent)
+            children[axe] = [c for c in g.children(axe) if c in roots]
+            axes.extend((c,index[axe]) for c in children[axe][::-1])
+
+        plants = map(g.complex, vertices)
+        return Topology(vertices, parents, plants, children, signature(g))
+
+    def is_topology_of(self, g):
+        """ True if this topology is (still) valid for mtg `g` """
+        return self.signature==signature(g)
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __contains__(self, vid):
+        return vid in self._index
+
+    def indices(self, vertices):
+        """ return the array of the index of `vertices` (-1 if none) """
+        index = self._index
+        return _np.array([index.get(vid,-1) for vid in vertices], dtype=int)
+
+    def parent(self, vid):
+        """ return the parent axe of root axe `vid`, or None """
+        p = self.parents[self._index[vid]]
+        return None if p<0 else self.vertices[p]
+
+    def children(self, vid):
+        """ return the list of children axes of root axe `vid` """
+        return list(self._children[vid])
+
+    def parent_dict(self):
+        """ return the dictionary of (root axe, parent axe or None) """
+        vertices = self.vertices + [None]     # index -1 => None
+        return dict(zip(self.vertices, [vertices[p] for p in self.parents.tolist()]))
+
+    def order_dict(self):
+        """ return the dictionary of (root axe, order) """
+        return dict(zip(self.vertices, self.orders.tolist()))
+
+    def tree(self, suborder=None):
+        """ return the list of root axes in depth-first order
+
+        If `suborder` is given, it should be a dictionary of (root-id,value)
+        which is used to sort sibling axes w.r.t. their respective value.
+        """
+        if suborder is None:
+            return list(self.vertices)
+
+        sort = lambda x: sorted(x, key=suborder.get)[::-1]
+        axes = sort([vid for vid,p in zip(self.vertices, self.parents) if p<0])
+        tree = []
+        while len(axes):
+            axe = axes.pop()
+            tree.append(axe)
+            axes.extend(sort(self._children[axe]))
+        return tree
+
+
+def signature(g):
+    """ return a value that changes when vertices are added or removed in `g`
+
+    It is the number of vertices of `g` and the last vertex id it attributed,
+    which is never decreased. See the module documentation for its limits.
+    """
+    return len(g), g._id
+
+def get_topology(g):
+    """ return the `Topology` of mtg `g`, from the cache of `g` if valid """
+    gprop = g.graph_properties()
+    topology = gprop.get('topology')
+    if topology is None or not topology.is_topology_of(g):
+        topology = Topology.from_mtg(g)
+        gprop['topology'] = topology
+    return topology
+
+def invalidate_topology(g):
+    """ remove the cached topology of mtg `g` (see `get_topology`) """
+    g.graph_properties().pop('topology', None)
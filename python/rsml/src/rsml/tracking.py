@@ -0,0 +1,155 @@
+"""
+Tracking of plants and root axes along time-series of rsml mtg
+
+`track` matches the plants and root axes of each consecutive pair of mtg of
+a time-series (see `rsml.matching`) and assigns persistent identifiers, the
+"tracks", to the plants and root axes::
+
+    from rsml.tracking import track
+    tracking = track(sorted(glob('rhizotron_01/*.rsml')), max_distance=50)
+
+    tracking.annotate()             # set 'track' property of all mtg
+    table = tracking.table()        # one row per (time-step, root axe)
+    tracking.export_csv('tracks.csv')
+
+The geometric data used for matching (polylines arrays, bounding boxes and
+seed positions) are computed once per mtg and reused for both pairs each mtg
+is part of.
+"""
+from .matching import MatchingCache, match_plants, match_roots
+from .misc import plant_vertices, root_vertices
+
+
+class Tracking(object):
+    """ Tracks of the plants and root axes of a time-series of mtg
+
+    :Attributes:
+      - `frames`:
+           the list of the mtg of the time-series
+      - `times`:
+           the list of the time of each frame
+      - `plant_tracks`:
+           list, for all frames, of dictionaries (plant-id, plant-track)
+      - `root_tracks`:
+           list, for all frames, of dictionaries (root-id, root-track)
+    """
+    def __init__(self, frames, times):
+        self.frames = frames
+        self.times = times
+        self.plant_tracks = []
+        self.root_tracks = []
+
+    def track_number(self):
+        """ return the number of (plant,root) tracks """
+        count = lambda tracks: len(set(t for frame in tracks for t in frame.itervalues()))
+        return count(self.plant_tracks), count(self.root_tracks)
+
+    def annotate(self, name='track'):
+        """ set the track of plants and root axes as property `name` of frames """
+        for g, plants, roots in zip(self.frames, self.plant_tracks, self.root_tracks):
+            prop = g.properties().setdefault(name, {})
+            prop.update(plants)
+            prop.update(roots)
+
+    def table(self):
+        """ return the list of (dict) rows of all root axes of all frames
+
+        Each row contains: 'time', 'frame', 'id' (mtg vertex), 'track',
+        'plant_track', 'parent_track', 'order' and 'length'
+        """
+        from .misc import root_tree, root_order
+        from .measurements import root_length
+        from .topology import get_topology
+
+        table = []
+        for frame,(g,time) in enumerate(zip(self.frames,self.times)):
+            plant_track = self.plant_tracks[frame]
+            root_track  = self.root_tracks[frame]
+
+            tree   = root_tree(g)
+            order  = root_order(g, tree=tree)
+            length = root_length(g, roots=tree)
+            parents = get_topology(g).parent_dict()
+            for root in tree:
+                parent = parents[root]
+                table.append(dict(time=time, frame=frame, id=root,
+                                  track=root_track[root],
+                                  plant_track=plant_track.get(g.complex(root)),
+                                  parent_track=root_track.get(parent),
+                                  order=order[root], length=length[root]))
+        return table
+
+    csv_keys = ['time','frame','id','track','plant_track','parent_track',
+                'order','length']
+
+    def export_csv(self, filename, sep='\t'):
+        """ export the tracking `table` into csv file `filename` """
+        keys = self.csv_keys
+        with open(filename,'w') as f:
+            f.write(sep.join(keys)+'\n')
+            for row in self.table():
+                f.write(sep.join(str(row[key]) for key in keys)+'\n')
+
+
+def track(sequence, times=None, max_distance=None, plant_distance=None,
+          method='greedy'):
+    """ Track plants and root axes along the time-series `sequence`
+
+    :Inputs:
+      - `sequence`:
+           the time-ordered list of rsml mtg, or rsml file names
+      - `times`:
+           optional list of the time of each item of `sequence`.
+           By default, it is the item index.
+      - `max_distance`:
+           the maximum hausdorff distance for root axes to be matched
+      - `plant_distance`:
+           the maximum seed distance for plants to be matched
+      - `method`:
+           the matching method, see `rsml.matching.one_to_one_match`
+
+    :Outputs:
+      A `Tracking` object. Plants and root axes which are not matched with
+      one of the previous frame start a new track.
+    """
+    from itertools import count
+    from .io import rsml2mtg
+
+    frames = [rsml2mtg(g) if isinstance(g,basestring) else g for g in sequence]
+    if times is None:
+        times = range(len(frames))
+    tracking = Tracking(frames, times)
+
+    new_plant = count().next
+    new_root  = count().next
+
+    previous = None
+    for g in frames:
+        cache = MatchingCache(g)
+        plant_track = {}
+        root_track  = {}
+
+        if previous is not None:
+            g0, cache0, plant_track0, root_track0 = previous
+            plants, u1, u2 = match_plants(g0, g, max_distance=plant_distance,
+                                          method=method, cache1=cache0, cache2=cache)
+            roots, u1, u2 = match_roots(g0, g, plants, max_distance=max_distance,
+                                        method=method, cache1=cache0, cache2=cache)
+            for p0,p,d in plants:
+                plant_track[p] = plant_track0[p0]
+            for r0,r,d in roots:
+                root_track[r] = root_track0[r0]
+
+        # new tracks for unmatched plants & roots
+        for plant in plant_vertices(g):
+            if plant not in plant_track:
+                plant_track[plant] = new_plant()
+        for root in root_vertices(g):
+            if root not in root_track:
+                root_track[root] = new_root()
+
+        tracking.plant_tracks.append(plant_track)
+        tracking.root_tracks.append(root_track)
+        previous = (g, cache, plant_track, root_track)
+
+    return tracking
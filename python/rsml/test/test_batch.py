@@ -0,0 +1,22 @@
+"""
+Tests for the batch module
+"""
+
+def test_measure_files():
+    from StringIO import StringIO
+    from openalea.deploy.shared_data import shared_data
+    import rsml
+    from rsml.batch import measure_files
+    
+    files = sorted((shared_data(rsml)/'AR570').glob('*.rsml'))
+    files.append('missing_file.rsml')
+    
+    output = StringIO()
+    failures = measure_files(files, output, processes=2)
+    
+    assert len(failures)==1, 'incorrect number of failures'
+    assert failures[0][0]=='missing_file.rsml', 'incorrect failure'
+    
+    rows = output.getvalue().splitlines()
+    names = [row.split('\t')[0] for row in rows[1:]]
+    assert names==sorted(names), 'incorrect rows order'
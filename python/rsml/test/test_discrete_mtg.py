@@ -51,6 +51,47 @@ def test_discrete_to_continuous():
     test_tree(test_load_discrete())    # test complex tree
     
     
+def test_conversion_copy():
+    from rsml.continuous import discrete_to_continuous
+    from rsml.continuous import continuous_to_discrete
+    
+    g0 = simple_tree()
+    gc = discrete_to_continuous(g0, copy=True)
+    assert len(g0.vertices(scale=3))==7, 'discrete mtg has been modified'
+    assert gc.max_scale()==2, 'segments have not been removed'
+    assert gc.property('parent-node')=={7:1, 10:2}, 'incorrect parent-node'
+    
+    gd = continuous_to_discrete(gc, copy=True)
+    assert len(gc.property('geometry'))==3, 'continuous mtg has been modified'
+    assert len(gd.vertices(scale=3))==7, 'not the same number of segment'
+    
+    # in-place conversion
+    gc2 = discrete_to_continuous(g0)
+    assert gc2 is g0 and g0.max_scale()==2, 'not converted in-place'
+    
+def test_branch_on_lateral():
+    """ axes branched on lateral axes are attached to the right segment """
+    from openalea.mtg import MTG
+    from rsml.continuous import continuous_to_discrete
+    
+    g = MTG()
+    p  = g.add_component(g.root, edge_type='/') # plant
+    a1 = g.add_component(p, edge_type='/', geometry=[(0,0,0),(0,1,0),(0,2,0)])
+    a2 = g.add_child(a1, edge_type='+', geometry=[(0,1,0),(1,1,0),(2,1,0),(3,1,0)])
+    a3 = g.add_child(a2, edge_type='+', geometry=[(1,1,0),(1,2,0)])
+    a4 = g.add_child(a2, edge_type='+', geometry=[(3,1,0),(3,2,0)])
+    g.properties()['parent-node'] = {a2:1, a3:1, a4:3}
+    geometry = dict(g.property('geometry'))
+    
+    gd = continuous_to_discrete(g, copy=True)
+    position = gd.property('position')
+    for axe, pnode in g.property('parent-node').iteritems():
+        seg = gd.component_roots(axe)[0]
+        assert position[gd.parent(seg)]==geometry[g.parent(axe)][pnode], \
+                'branch of axe {} attached to the wrong segment'.format(axe)
+    assert len(gd.vertices(scale=3))==8, 'not the same number of segment'
+    
+    
 ##def test_discrete_to_rsml():
 ##    needs a tmp file    
 
@@ -0,0 +1,38 @@
+"""
+Tests for the instrument module
+"""
+from test_io import data_files
+
+def test_recording():
+    from StringIO import StringIO
+    from rsml import instrument
+    from rsml.io import rsml2mtg, mtg2rsml
+    from rsml.measurements import RSML_Measurements
+    
+    filename = data_files()[0]
+    
+    recorded = []
+    with instrument.recording(callback=recorded.append) as stats:
+        g = rsml2mtg(filename)
+        RSML_Measurements().add(g)
+        output = StringIO()
+        mtg2rsml(g, output)
+        
+    assert recorded==[stats], 'callback not called'
+    for timer in ['parse', 'parse.xml', 'dump', 'metadata', 'measurements']:
+        assert stats.timers[timer][1]==1, 'timer {} not recorded'.format(timer)
+        
+    counters = stats.counters
+    assert counters['vertices']==len(g), 'incorrect vertices count'
+    assert counters['points']==sum(map(len,g.property('geometry').values()))
+    assert counters['bytes_written']==len(output.getvalue())
+    assert counters['roots_measured']==len(g.vertices(scale=2))
+    
+    # stream parser counts the same elements
+    with instrument.recording() as stream_stats:
+        rsml2mtg(filename, stream=True)
+    assert stream_stats.counters['elements']==counters['elements']
+    
+    # nothing is recorded out of recording context
+    rsml2mtg(filename)
+    assert stats.timers['parse'][1]==1, 'recorded out of context'
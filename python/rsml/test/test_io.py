@@ -0,0 +1,256 @@
+"""
+Tests for the io module
+"""
+from contextlib import contextmanager
+
+def data_files():
+    """ return the list of rsml files in shared data """
+    from openalea.deploy.shared_data import shared_data
+    import rsml
+    return sorted((shared_data(rsml)/'AR570').glob('*.rsml'))
+    
+@contextmanager
+def tmp_dir():
+    """ context of a temporary directory, which is removed at exit """
+    import shutil, tempfile
+    tmp = tempfile.mkdtemp()
+    try:
+        yield tmp
+    finally:
+        shutil.rmtree(tmp)
+    
+@contextmanager
+def fixed_metadata():
+    """ context where written rsml have fixed 'last-modified' and 'file-key' """
+    from rsml import metadata
+    
+    set_metadata = metadata.set_metadata
+    def fixed(g):
+        meta = set_metadata(g)
+        meta['last-modified'] = 'today'
+        meta['file-key'] = 'key'
+        return meta
+    
+    metadata.set_metadata = fixed
+    try:
+        yield
+    finally:
+        metadata.set_metadata = set_metadata
+    
+def same_mtg(g1, g2):
+    """ check that `g1` and `g2` have same topology and geometry """
+    v1 = g1.vertices(scale=g1.max_scale())
+    v2 = g2.vertices(scale=g2.max_scale())
+    
+    assert len(v1)==len(v2), 'not the same number of axes'
+    assert map(g1.parent,v1)==map(g2.parent,v2), 'not the same topology'
+    
+    geom1 = g1.property('geometry')
+    geom2 = g2.property('geometry')
+    for v in v1:
+        assert map(list,geom1[v])==map(list,geom2[v]), 'not the same geometry'
+    
+def test_stream_parser():
+    from rsml.io import rsml2mtg
+    
+    for filename in data_files():
+        same_mtg(rsml2mtg(filename), rsml2mtg(filename, stream=True))
+    
+def test_open_rsml():
+    from rsml.io import rsml2mtg, open_rsml
+    
+    for filename in data_files():
+        g = rsml2mtg(filename)
+        f = open_rsml(filename)
+        
+        assert len(f.plants)==len(g.vertices(scale=1)), 'not the same number of plants'
+        assert f.metadata==g.graph_properties()['metadata'], 'not the same metadata'
+        
+        axes = sum(len(p.vertices(scale=2)) for p in f.plants)
+        assert axes==len(g.vertices(scale=2)), 'not the same number of axes'
+    
+def test_index_rsml():
+    import os, tempfile
+    from rsml.io import index_rsml
+    
+    content = ('<?xml version="1.0"?>\n<rsml><metadata><rootnav/></metadata>'
+               '<scene><plant id="1"><plant-data/><root id="2"><rootnav>a</rootnav>'
+               '</root></plant><root id="3"/></scene></rsml>\n')
+    fd, filename = tempfile.mkstemp(suffix='.rsml')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        index = index_rsml(filename)
+    finally:
+        os.remove(filename)
+        
+    plants = [content[start:end] for start,end in index['plants']]
+    assert plants==['<plant id="1"><plant-data/><root id="2"><rootnav>a</rootnav>'
+                    '</root></plant>', '<root id="3"/>'], 'invalid plants offsets'
+    assert index['is_plant']==[True, False], 'invalid plant elements'
+    start, end = index['metadata']
+    assert content[start:end]=='<metadata><rootnav/></metadata>', 'invalid metadata offsets'
+    
+def test_columnar_geometry():
+    from rsml.io import rsml2mtg
+    
+    for filename in data_files():
+        g = rsml2mtg(filename, columnar=True)
+        store = g.graph_properties()['geometry-store']
+        
+        assert store.is_geometry_of(g), 'geometry is not columnar'
+        same_mtg(rsml2mtg(filename), g)
+    
+def test_npz_cache():
+    import os, shutil
+    from rsml.io import rsml2mtg, cached_rsml2mtg, npz_is_valid
+    
+    with tmp_dir() as tmp:
+        filename = os.path.join(tmp,'test.rsml')
+        shutil.copy(data_files()[0], filename)
+        
+        g = cached_rsml2mtg(filename)
+        assert npz_is_valid(filename+'.npz', filename), 'invalid cache'
+        
+        g_cached = cached_rsml2mtg(filename)
+        same_mtg(g, g_cached)
+        assert g_cached.property('label')==g.property('label'), 'incorrect cached labels'
+    
+def test_npz_functions():
+    import os
+    import numpy as np
+    from rsml.io import mtg2npz, npz2mtg
+    from rsml.synthetic import synthetic_mtg
+    
+    g = synthetic_mtg(plants=1, depth=2, roots=[1,2], points=[5,3], seed=0)
+    axes = sorted(g.property('geometry'))
+    g.graph_properties()['metadata']['functions'] = ['diameter','age']
+    g.properties()['diameter'] = {axes[0]:[.5,.4,np.nan,.2,.1], axes[1]:[.3,.2,.1]}
+    g.properties()['age'] = {axes[0]:[(0,1.),(2.5,3.)]}   # length domain
+    
+    with tmp_dir() as tmp:
+        filename = os.path.join(tmp,'test.npz')
+        mtg2npz(g, filename)
+        with np.load(filename, allow_pickle=False) as arrays:
+            assert 'function:diameter' in arrays.files, 'function not stored as array'
+        
+        for mmap in [True, False]:
+            g_cached = npz2mtg(filename, mmap=mmap)
+            diameter = g_cached.property('diameter')
+            assert sorted(diameter)==axes[:2], 'invalid cached function vertices'
+            assert np.allclose(diameter[axes[0]], [.5,.4,np.nan,.2,.1], equal_nan=True), \
+                    'invalid cached function'
+            assert g_cached.property('age')==g.property('age'), 'invalid length function'
+            assert g_cached.property('parent-node')==g.property('parent-node'), \
+                    'invalid cached parent-node'
+        
+        # cache with pickled content are not loaded
+        np.savez(filename, header=np.array([{'version':2}], dtype=object))
+        for mmap in [True, False]:
+            try:
+                npz2mtg(filename, mmap=mmap)
+                assert False, 'pickled cache content should not be loaded'
+            except IOError:
+                pass
+    
+def test_stream_dumper():
+    from StringIO import StringIO
+    from rsml.io import rsml2mtg, mtg2rsml
+    
+    with fixed_metadata():
+        for filename in data_files():
+            g = rsml2mtg(filename)
+            dom, stream = StringIO(), StringIO()
+            mtg2rsml(g, dom, stream=False)
+            mtg2rsml(g, stream, stream=True)
+            assert dom.getvalue()==stream.getvalue(), 'streamed rsml differs'
+    
+def test_functions():
+    import os
+    from StringIO import StringIO
+    from rsml.io import rsml2mtg, mtg2rsml
+    
+    content = """<?xml version="1.0" encoding="UTF-8"?>
+<rsml><metadata><version>1</version></metadata><scene><plant>
+<root id="r1"><geometry><polyline>
+  <point x="0" y="0"/><point x="0" y="1"/><point x="0" y="3"/>
+</polyline></geometry>
+<functions>
+  <function name="diameter" domain="polyline">
+    <sample>2</sample><sample>1.5</sample><sample> 1 </sample>
+  </function>
+  <function name="age" domain="polyline">
+    <sample value="3"/><sample value="2"/><sample value="0"/>
+  </function>
+  <function name="lateral" domain="length">
+    <sample position="0.5" value="1"/><sample position="2" value="0"/>
+  </function>
+</functions>
+</root></plant></scene></rsml>"""
+    
+    with tmp_dir() as tmp:
+        filename = os.path.join(tmp, 'functions.rsml')
+        with open(filename, 'w') as f:
+            f.write(content)
+            
+        for columnar in [False, True]:
+            g = rsml2mtg(filename, columnar=columnar)
+            vid = g.property('diameter').keys()[0]
+            assert list(g.property('diameter')[vid])==[2,1.5,1], 'invalid text samples'
+            assert list(g.property('age')[vid])==[3,2,0], 'invalid value samples'
+            assert map(tuple,g.property('lateral')[vid])==[(.5,1),(2,0)], 'invalid length samples'
+            
+            dom, stream = StringIO(), StringIO()
+            mtg2rsml(g, dom, stream=False)
+            mtg2rsml(g, stream, stream=True)
+            assert dom.getvalue().split('<scene')[1]==stream.getvalue().split('<scene')[1], \
+                    'streamed functions differ'
+            
+            dumped = os.path.join(tmp, 'dumped.rsml')
+            with open(dumped, 'w') as f:
+                f.write(stream.getvalue())
+            g2 = rsml2mtg(dumped)
+            vid2 = g2.property('diameter').keys()[0]
+            for name in ['diameter', 'age', 'lateral']:
+                assert list(g2.property(name)[vid2])==list(map(tuple,g.property(name)[vid]) 
+                                    if name=='lateral' else g.property(name)[vid]), \
+                    'function {} not written'.format(name)
+    
+def test_decode_points():
+    import xml.etree.ElementTree as xml
+    from rsml.io import decode_points
+    
+    def polyline(content):
+        return list(xml.fromstring('<polyline>'+content+'</polyline>'))
+    
+    attrib = polyline('<point x="1" y="2"/><point x="3" y="4.5"/>')
+    nested = polyline('<point><x>1</x><y>2</y></point><point><x>3</x><y> 4.5 </y></point>')
+    for elts in (attrib, nested):
+        assert decode_points(elts).tolist()==[[1,2],[3,4.5]], 'incorrect points'
+    
+    assert decode_points(polyline('')).shape[0]==0, 'incorrect empty polyline'
+    
+    mixed = polyline('<point x="1" y="2"/><point x="3" y="4" z="5"/>')
+    invalid = polyline('<point x="1" y="2"/><point x="3" y="?"/>')
+    assert decode_points(mixed) is None, 'irregular polyline not detected'
+    assert decode_points(invalid) is None, 'invalid polyline not detected'
+    
+def test_backends():
+    import xml.etree.ElementTree as ET
+    from xml.dom import minidom
+    from rsml.io import rsml2mtg, Dumper
+    from rsml.backend import available_backends
+    
+    with fixed_metadata():
+        for filename in data_files():
+            g = rsml2mtg(filename, backend='ElementTree')
+            
+            # reference: xml tree formatted by minidom
+            dumper = Dumper(backend='ElementTree')
+            dumper.dump(g)
+            ref = minidom.parseString(ET.tostring(dumper.xml_root, encoding='UTF-8'))
+            ref = ref.toprettyxml(indent='  ', encoding='UTF-8')
+            
+            for backend in available_backends():
+                same_mtg(g, rsml2mtg(filename, backend=backend))
+                assert Dumper(backend=backend).dump(g)==ref, backend+' dump differs'
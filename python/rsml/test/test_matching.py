@@ -0,0 +1,54 @@
+"""
+Tests for the matching module
+"""
+import numpy as np
+
+def random_polylines(n, seed=0):
+    """ return a list of `n` random 2d polylines """
+    rand = np.random.RandomState(seed)
+    return [rand.rand(rand.randint(2,20),2)*100 for i in range(n)]
+
+def test_hausdorff_lower_bound():
+    from rsml.misc import hausdorff_distance
+    from rsml.matching import bounding_boxes, hausdorff_lower_bound
+    
+    poly1 = random_polylines(10, seed=1)
+    poly2 = random_polylines(12, seed=2)
+    
+    bound = hausdorff_lower_bound(bounding_boxes(poly1), bounding_boxes(poly2))
+    assert bound.shape==(10,12), 'invalid lower bound shape'
+    
+    for i,p1 in enumerate(poly1):
+        for j,p2 in enumerate(poly2):
+            d = hausdorff_distance(p1.T,p2.T)
+            assert bound[i,j]<=d, 'invalid hausdorff lower bound'
+            
+def test_chunked_hausdorff_distance():
+    from rsml.misc import hausdorff_distance
+    
+    poly1 = random_polylines(5, seed=3)
+    poly2 = random_polylines(5, seed=4)
+    
+    for p1,p2 in zip(poly1,poly2):
+        d = hausdorff_distance(p1.T,p2.T)
+        assert d==hausdorff_distance(p1.T,p2.T,memory=1), 'invalid chunked distance'
+        
+        dmax = hausdorff_distance(p1.T,p2.T,max_distance=d/2)
+        assert dmax>d/2, 'invalid early termination'
+        
+def test_optimal_match():
+    from itertools import permutations
+    from rsml.matching import one_to_one_match, _linear_sum_assignment
+    
+    D = np.random.RandomState(5).rand(4,5)
+    best = min(D[range(4),list(p)].sum() for p in permutations(range(5),4))
+    
+    rows, cols = _linear_sum_assignment(D)
+    assert abs(D[rows,cols].sum()-best)<1e-12, 'non optimal assignment'
+    
+    match, u1, u2 = one_to_one_match(D, method='optimal')
+    assert len(match)==4 and len(u1)==0 and len(u2)==1, 'incorrect matching'
+    assert abs(sum(d for i,j,d in match)-best)<1e-12, 'non optimal matching'
+    
+    match, u1, u2 = one_to_one_match(D, max_distance=0.5, method='optimal')
+    assert all(d<=0.5 for i,j,d in match), 'match above max_distance'
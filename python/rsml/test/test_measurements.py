@@ -41,3 +41,61 @@ def test_RSML_Measurement():
     assert m[1].get('length')==1, 'incorrect length of 2nd axis'
 
 
+    
+def test_batch_measurements():
+    from rsml.misc import root_tree
+    from rsml.measurements import batch_root_length, batch_parent_position
+    
+    g = simple_tree()
+    g.properties().setdefault('parent-node', {})[g.children(2)[0]] = 1
+    
+    tree = root_tree(g)
+    assert batch_root_length(g).tolist()==[3,1], 'invalid axe length'
+    
+    pos = batch_parent_position(g, roots=tree)
+    assert pos[1]==1, 'invalid parent position'
+    pos = batch_parent_position(g, roots=tree, distance2tip=True)
+    assert pos[1]==2, 'invalid parent position to tip'
+    
+    g.property('parent-node')[g.children(2)[0]] = 3
+    try:
+        batch_parent_position(g, roots=tree)
+        assert False, 'parent-node out of parent axe should raise IndexError'
+    except IndexError:
+        pass
+
+def test_shared_geometry_store():
+    from rsml.geometry import GeometryStore
+    from rsml.measurements import RSML_Measurements, batch_root_length
+    
+    g = simple_tree()
+    store = GeometryStore.from_mtg(g)
+    assert batch_root_length(g, store=store).tolist()==[3,1], 'invalid axe length'
+    
+    # the store is built once per mtg
+    from_mtg = GeometryStore.from_mtg
+    calls = []
+    def counted_from_mtg(g, vertices=None):
+        calls.append(g)
+        return from_mtg(g, vertices)
+    GeometryStore.from_mtg = staticmethod(counted_from_mtg)
+    try:
+        RSML_Measurements().add(g)
+    finally:
+        GeometryStore.from_mtg = staticmethod(from_mtg)
+    assert len(calls)==1, 'geometry store built several times'
+
+def test_volume_surface():
+    from math import pi
+    from rsml.misc import root_tree
+    from rsml.measurements import batch_root_volume, batch_root_surface
+    
+    g = simple_tree()
+    primary, lateral = root_tree(g)
+    g.properties().setdefault('diameter', {})[primary] = [2,2,2]   # cylinder of radius 1
+    
+    volume  = batch_root_volume(g, roots=[primary, lateral])
+    surface = batch_root_surface(g, roots=[primary, lateral])
+    assert abs(volume[0]-3*pi)<1e-9, 'invalid root volume'
+    assert abs(surface[0]-6*pi)<1e-9, 'invalid root surface'
+    assert volume[1]!=volume[1], 'volume of root without diameter should be nan'
@@ -0,0 +1,52 @@
+"""
+Tests for the metadata module
+"""
+from test_io import tmp_dir
+
+def test_file_sha256():
+    import os, hashlib
+    from rsml import metadata, instrument
+    
+    cache_dir = metadata.hash_cache_dir
+    try:
+        with tmp_dir() as tmp:
+            metadata.hash_cache_dir = os.path.join(tmp,'cache')
+            filename = os.path.join(tmp,'image.png')
+            with open(filename,'wb') as f:
+                f.write('image content'*1000)
+            
+            sha256 = hashlib.sha256('image content'*1000).hexdigest()
+            assert metadata.file_sha256(filename, chunk_size=100)==sha256
+            assert len(os.listdir(metadata.hash_cache_dir))==1, 'hash not cached'
+            
+            # cached hash is used, from memory or from the cache directory
+            for memo in [True, False]:
+                if not memo: metadata._hash_memo.clear()
+                with instrument.recording() as stats:
+                    assert metadata.file_sha256(filename)==sha256
+                assert 'bytes_hashed' not in stats.counters, 'file hashed again'
+            
+            # modified file is hashed again
+            with open(filename,'ab') as f:
+                f.write('more')
+            os.utime(filename, (0,0))
+            sha256 = hashlib.sha256('image content'*1000+'more').hexdigest()
+            assert metadata.file_sha256(filename)==sha256
+    finally:
+        metadata.hash_cache_dir = cache_dir
+
+def test_hash_cache_dir():
+    import os
+    from rsml import metadata
+    
+    env = os.environ.get('RSML_HASH_CACHE')
+    try:
+        for value, cache_dir in [(None,None), ('',None), ('~/sha256',os.path.expanduser('~/sha256'))]:
+            if value is None: os.environ.pop('RSML_HASH_CACHE',None)
+            else:             os.environ['RSML_HASH_CACHE'] = value
+            reload(metadata)
+            assert metadata.hash_cache_dir==cache_dir, 'invalid hash cache directory'
+    finally:
+        if env is None: os.environ.pop('RSML_HASH_CACHE',None)
+        else:           os.environ['RSML_HASH_CACHE'] = env
+        reload(metadata)
@@ -0,0 +1,54 @@
+"""
+Tests for the plot module helpers
+"""
+
+def test_simplify_to_grid():
+    import numpy as np
+    from rsml.plot import simplify_to_grid
+
+    coordinates = np.array([[0,0],[.1,.1],[.2,.3],[1.5,0],[1.6,.1],   # polyline 1
+                            [5,5],[5.1,5.1]], dtype=float)             # polyline 2
+    offsets = np.array([0,5,7,7])                                      # + empty one
+    coords, offsets = simplify_to_grid(coordinates, offsets, 1)
+
+    assert offsets.tolist()==[0,3,5,5], 'invalid simplified offsets'
+    assert coords.tolist()==[[0,0],[1.5,0],[1.6,.1],[5,5],[5.1,5.1]], \
+            'invalid simplified coordinates'
+
+def test_reduce_image():
+    import numpy as np
+    from rsml.plot import reduce_image
+
+    image = np.arange(8*12, dtype=np.uint8).reshape(8,12)
+    reduced = reduce_image(image, shape=(2,3))
+    assert reduced.shape==(2,3), 'invalid reduced image shape'
+    assert reduced.dtype==np.uint8, 'invalid reduced image type'
+    assert reduced[0,0]==image[:4,:4].mean().round(), 'invalid reduced pixel'
+    assert reduce_image(image, shape=(8,8)) is image, 'image should not be reduced'
+
+def test_scene3d():
+    from unittest import SkipTest
+    try:
+        import openalea.plantgl.all as pgl
+    except ImportError:
+        raise SkipTest('PlantGL is not installed')
+    from test_measurements import simple_tree
+    from rsml.misc import root_tree
+    from rsml.plot import scene3d
+
+    g = simple_tree()
+    primary, lateral = root_tree(g)
+    g.properties()['diameter'] = {primary:[2,2,2], lateral:.5}  # one value for lateral
+    scene = scene3d(g, color=(255,0,0), sides=6)
+
+    assert len(scene)==2, 'invalid number of shapes'
+    scales = [map(tuple,shape.geometry.scale) for shape in scene]
+    assert sorted(scales)==[[(.5,.5)]*2, [(2,2)]*3], 'invalid extrusion scale'
+
+    sections = set(shape.geometry.crossSection.getId() for shape in scene)
+    assert len(sections)==1, 'cross section not shared'
+    assert len(scene[0].geometry.crossSection.pointList)==7, 'invalid number of sides'
+    materials = set(shape.appearance.getId() for shape in scene)
+    assert len(materials)==1, 'material not shared'
+
+    assert len(scene3d(g, tolerance=10))==2, 'invalid number of decimated shapes'
@@ -0,0 +1,52 @@
+"""
+Tests for the quality control report
+"""
+import os
+import shutil
+
+from test_io import data_files, tmp_dir
+
+
+def test_render_files():
+    from rsml.report import find_image, render_files
+
+    with tmp_dir() as tmp:
+        source = data_files()[0]
+        filename = os.path.join(tmp, 'plate.rsml')
+        image = os.path.join(tmp, 'plate.jpg')
+        shutil.copy(source, filename)
+        shutil.copy(find_image(source), image)
+        assert find_image(filename)==image, 'image not found'
+
+        output = os.path.join(tmp, 'report')
+        failures = render_files([filename], output, processes=1)
+        thumbnail = os.path.join(output, 'plate.png')
+        assert failures==[], 'rendering failed'
+        assert os.path.exists(thumbnail), 'thumbnail not written'
+        with open(os.path.join(output, 'index.html')) as f:
+            assert '<img src="plate.png">' in f.read(), 'thumbnail not in index'
+
+        # up to date thumbnails are not rendered again
+        os.utime(filename, (0,0))
+        os.utime(image, (0,0))
+        os.utime(thumbnail, (1,1))
+        render_files([filename], output, processes=1)
+        assert os.path.getmtime(thumbnail)==1, 'up to date thumbnail rendered'
+
+        os.utime(image, (2,2))
+        render_files([filename], output, processes=1)
+        assert os.path.getmtime(thumbnail)>2, 'outdated thumbnail not rendered'
+
+def test_render_failures():
+    from rsml.report import report_directory
+
+    with tmp_dir() as tmp:
+        with open(os.path.join(tmp, 'bad.rsml'), 'w') as f:
+            f.write('not a rsml file')
+
+        output = os.path.join(tmp, 'out', 'qc')
+        failures = report_directory(tmp, output, processes=1)
+        assert [f for f,error in failures]==[os.path.join(tmp, 'bad.rsml')], \
+                'failure not reported'
+        with open(os.path.join(output, 'index.html')) as f:
+            assert 'bad.rsml' in f.read(), 'failure not in index'
@@ -0,0 +1,52 @@
+"""
+Tests for the segments module
+"""
+def test_segment_view():
+    import numpy as np
+    from rsml.synthetic import synthetic_mtg
+    from rsml.segments import SegmentView
+    from rsml.measurements import batch_root_length
+    from rsml.continuous import continuous_to_discrete
+    
+    g = synthetic_mtg(plants=2, depth=3, roots=[1,3,2], points=[20,10,5], seed=0)
+    view = SegmentView(g)
+    
+    points = sum(map(len, g.property('geometry').values()))
+    assert len(view)==points, 'incorrect number of nodes'
+    
+    # 1st node of laterals is connected to their parent node
+    parent_node = g.property('parent-node')
+    branching = view.branching()
+    assert branching.sum()==len(parent_node), 'incorrect number of branches'
+    for i in np.flatnonzero(branching):
+        p = view.parent[i]
+        assert view.axis[p]==g.parent(view.axis[i]), 'incorrect parent axe'
+        assert view.node[p]==parent_node[view.axis[i]], 'incorrect parent node'
+    
+    # lateral insertion segments have null length (same 1st point)
+    lengths = view.lengths()
+    assert np.allclose(lengths[branching], 0)
+    assert np.allclose(view.axis_sum(lengths), batch_root_length(g, view.store.vertices))
+    
+    # same number of segments as the discrete mtg
+    nodes = (~branching).sum()
+    assert nodes==len(continuous_to_discrete(g.copy()).vertices(scale=3))
+    
+def test_turning_angles():
+    import numpy as np
+    from rsml.misc import build_mtg
+    from rsml.segments import SegmentView
+    
+    geometry = {2:[[0,0],[1,0],[2,0],[2,1]], 3:[[1,0],[1,1]]}
+    g = build_mtg([1,2,3], [0,1,1], [None,None,2], 
+                  properties={'geometry':geometry, 'parent-node':{3:1}})
+    view = SegmentView(g)
+    
+    assert view.parent.tolist()==[-1,0,1,2,1,4], 'incorrect parent'
+    angles = view.turning_angles()
+    assert np.isnan(angles[[0,1,4]]).all()
+    assert np.allclose(angles[[2,3,5]], [0,np.pi/2,np.pi/2])
+    
+    insertion = view.insertion_angles()
+    assert np.isnan(insertion[0]) and np.allclose(insertion[1], np.pi/2)
+    assert view.children_number().tolist()==[1,2,1,0,1,0]
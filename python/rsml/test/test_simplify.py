@@ -0,0 +1,119 @@
+"""
+Tests for the simplification of the geometry of continuous mtg
+"""
+
+def dense_mtg():
+    """ synthetic mtg with a 'diameter' function """
+    from rsml.synthetic import synthetic_mtg
+
+    g = synthetic_mtg(plants=2, depth=2, roots=[1,4], points=[80,20], seed=0)
+    g.graph_properties()['metadata'].setdefault('functions',[]).append('diameter')
+    g.properties()['diameter'] = dict((vid,range(len(geom)))
+                                      for vid,geom in g.property('geometry').iteritems())
+    return g
+
+def check_mtg(g, original):
+    """ check that `g` geometry and functions are consistent """
+    geometry = g.property('geometry')
+    parent_node = g.property('parent-node')
+    for axe, pnode in parent_node.iteritems():
+        start = geometry[g.parent(axe)][pnode]
+        assert list(geometry[axe][0])==list(start), 'axe not connected to its parent'
+        assert list(start) in map(list,original[g.parent(axe)]), 'branching node moved'
+    for vid, geom in geometry.iteritems():
+        assert len(g.property('diameter')[vid])==len(geom), 'invalid function length'
+
+def test_polyline_simplification():
+    import numpy as np
+    from rsml.misc import hausdorff_distance
+    from rsml.simplify import douglas_peucker, visvalingam, resample_polyline, interpolate
+
+    polyline = np.array([[0,0],[1,.1],[2,-.1],[3,5],[4,6],[5,7.05],[6,8]], dtype=float)
+
+    kept = douglas_peucker(polyline, .2)
+    assert kept.tolist()==[0,2,3,6], 'invalid douglas-peucker simplification'
+    assert douglas_peucker(polyline, .2, keep=[1]).tolist()==[0,1,2,3,6], 'kept node removed'
+
+    kept = visvalingam(polyline, .5)
+    assert kept.tolist()==[0,2,3,6], 'invalid visvalingam simplification'
+
+    positions = resample_polyline(polyline[:3], .5)
+    assert len(positions)==6, 'invalid number of resampled nodes'
+    resampled = interpolate(polyline[:3], positions)
+    assert np.allclose(resampled[[0,-1]], polyline[[0,2]]), 'invalid resampled end points'
+    assert hausdorff_distance(resampled.T, polyline[:3].T)<.2, 'invalid resampled polyline'
+
+def test_simplify_mtg():
+    import numpy as np
+    from copy import deepcopy
+    from rsml.misc import hausdorff_distance
+    from rsml.simplify import simplify_mtg, resample_mtg
+
+    for method, tolerance in [('douglas-peucker',.5),('visvalingam',.5)]:
+        g = dense_mtg()
+        original = deepcopy(g.property('geometry'))
+        errors = simplify_mtg(g, tolerance, method=method)
+        check_mtg(g, original)
+
+        geometry = g.property('geometry')
+        assert sum(map(len,geometry.values()))<sum(map(len,original.values())), \
+            'geometry not simplified'
+        for vid, error in errors.iteritems():
+            distance = hausdorff_distance(np.transpose(original[vid]), np.transpose(geometry[vid]))
+            assert distance<=error+1e-9, 'invalid error bound'
+        if method=='douglas-peucker':
+            assert max(errors.values())<=tolerance, 'error above tolerance'
+
+    g = dense_mtg()
+    original = deepcopy(g.property('geometry'))
+    errors = resample_mtg(g, 3)
+    check_mtg(g, original)
+    for vid, geom in g.property('geometry').iteritems():
+        steps = (np.diff(geom,axis=0)**2).sum(axis=1)**.5
+        assert steps.max()<=3+1e-9, 'invalid resampling step'
+        distance = hausdorff_distance(np.transpose(original[vid]), np.transpose(geom))
+        assert distance<=errors[vid]+1e-9, 'invalid error bound'
+
+def test_simplify_columnar():
+    from rsml.geometry import GeometryStore, set_columnar_geometry, set_columnar_functions
+    from rsml.simplify import simplify_mtg
+
+    g = dense_mtg()
+    store = set_columnar_geometry(g)
+    set_columnar_functions(g, ['diameter'], store)
+    simplify_mtg(g, .5)
+
+    store = g.graph_properties()['geometry-store']
+    assert store.is_geometry_of(g), 'columnar geometry not updated'
+    assert len(store.functions['diameter'])==len(store.coordinates), 'functions not updated'
+    assert GeometryStore.from_mtg(g) is store, 'invalid geometry store'
+
+def test_invalid_arguments():
+    from copy import deepcopy
+    from rsml.simplify import douglas_peucker, resample_polyline, simplify_mtg, resample_mtg
+
+    polyline = [[0,0],[1,0],[2,1]]
+    for keep in [[3],[-1]]:
+        try:
+            douglas_peucker(polyline, 1., keep=keep)
+            assert False, 'invalid node index should raise IndexError'
+        except IndexError:
+            pass
+
+    g = dense_mtg()
+    child = sorted(g.property('parent-node'))[0]
+    g.property('parent-node')[child] = 1000
+    geometry = deepcopy(g.property('geometry'))
+    try:
+        simplify_mtg(g, .5)
+        assert False, 'invalid parent-node should raise IndexError'
+    except IndexError:
+        assert g.property('geometry')==geometry, 'mtg modified before the error'
+
+    for function, args in [(resample_polyline, (polyline, 0)),
+                           (resample_mtg, (dense_mtg(), -1))]:
+        try:
+            function(*args)
+            assert False, 'invalid step should raise ValueError'
+        except ValueError:
+            pass
@@ -0,0 +1,40 @@
+"""
+Tests for the synthetic module
+"""
+from test_io import same_mtg, tmp_dir
+
+def test_synthetic_mtg():
+    from rsml.synthetic import synthetic_mtg
+    
+    g = synthetic_mtg(plants=3, depth=3, roots=[1,4,2], points=[30,10,5], seed=0)
+    
+    assert len(g.vertices(scale=1))==3, 'incorrect number of plants'
+    assert len(g.vertices(scale=2))==3*(1+4+8), 'incorrect number of axes'
+    
+    geometry = g.property('geometry')
+    parent_node = g.property('parent-node')
+    for axe in g.vertices(scale=2):
+        parent = g.parent(axe)
+        if parent is None:
+            assert axe not in parent_node, 'primary axe with parent node'
+        else:
+            start = geometry[parent][parent_node[axe]]
+            assert geometry[axe][0]==start, 'axe not connected to its parent'
+    
+def test_synthetic_rsml():
+    import os
+    from rsml.io import rsml2mtg
+    from rsml.synthetic import synthetic_rsml
+    from rsml.continuous import continuous_to_discrete, discrete_to_continuous
+    
+    with tmp_dir() as tmp:
+        filename = os.path.join(tmp,'synthetic.rsml')
+        g = synthetic_rsml(filename, plants=2, depth=3, roots=[1,3,2], seed=1)
+        
+        g_file = rsml2mtg(filename)
+        same_mtg(g, g_file)
+        
+        # check back and forth conversion of 3rd order axes
+        g_conv = discrete_to_continuous(continuous_to_discrete(rsml2mtg(filename)))
+        same_mtg(g_file, g_conv)
+        assert g_conv.property('parent-node')==g.property('parent-node')
@@ -0,0 +1,89 @@
+"""
+Tests for the table export and import
+"""
+import os
+
+from test_io import tmp_dir
+from test_measurements import simple_tree
+
+
+def test_write_read_table():
+    import numpy as np
+    from rsml.table import write_table, read_table
+
+    table = dict(id=['a','b',None], order=[1,2,2], length=[3.5,np.nan,.1],
+                 parent=[None,1,1])
+    with tmp_dir() as tmp:
+        for ext in ['csv','csv.gz','npz']:
+            filename = os.path.join(tmp, 'table.'+ext)
+            write_table(table, filename, columns=['id','order','length','parent'],
+                        chunk_size=2)
+            t = read_table(filename)
+
+            assert t.keys()==['id','order','length','parent'], 'invalid columns ('+ext+')'
+            assert t['id'].tolist()==['a','b',None], 'invalid string column ('+ext+')'
+            assert t['order'].dtype.kind=='i', 'invalid int column ('+ext+')'
+            assert t['order'].tolist()==[1,2,2], 'invalid int column ('+ext+')'
+            assert t['length'][0]==3.5 and t['length'][2]==.1, 'invalid float column ('+ext+')'
+            assert np.isnan(t['length'][1]), 'invalid missing value ('+ext+')'
+            assert t['parent'].tolist()==[None,1,1], 'invalid missing int ('+ext+')'
+            assert type(t['parent'][1]) is int, 'invalid missing int type ('+ext+')'
+
+        # R compatible missing values
+        with open(os.path.join(tmp,'table.csv')) as f:
+            assert f.read().splitlines()[3]=='NA\t2\t0.1\t1', 'invalid csv row'
+
+def test_parse_column():
+    from rsml.table import parse_column
+
+    assert parse_column(['1','-2','NA']).tolist()==[1,-2,None], 'invalid int column'
+    assert parse_column(['1','2.5']).dtype.kind=='f', 'invalid float column'
+
+    # not int tokens, which numpy would parse partially
+    for values in [['1','2-3'], ['1','3-'], ['1','2-3','4'], ['1','2 3','4']]:
+        column = parse_column(values)
+        assert column.tolist()==values, 'invalid string column: '+str(values)
+
+def test_measurements_export():
+    from rsml.measurements import RSML_Measurements
+    from rsml.table import node_table
+
+    g = simple_tree()
+    m = RSML_Measurements().add(g, name='simple')
+
+    with tmp_dir() as tmp:
+        filename = os.path.join(tmp, 'measurements.csv.gz')
+        m.export(filename, columns=['id','parent','length'])
+        m2 = RSML_Measurements().import_table(filename)
+        assert [r['length'] for r in m2]==[3,1], 'invalid imported length'
+        assert m2[0]['parent'] is None, 'invalid imported missing parent'
+
+        # export => import => export round trip
+        tree = simple_tree()
+        tree.add_child(tree.children(2)[0], edge_type='+', geometry=[[1,1,0],[1,2,0]])
+        m = RSML_Measurements().add(tree, name='simple')
+        filename = os.path.join(tmp, 'measurements.csv')
+        m.export(filename)
+        with open(filename) as f:
+            exported = f.read()
+        rows = [line.split('\t') for line in exported.splitlines()]
+        parent = rows[0].index('parent')
+        assert [r[parent] for r in rows[1:]]==['NA','2','3'], 'invalid exported parent'
+        m2 = RSML_Measurements().import_table(filename)
+        assert [r['parent'] for r in m2]==[None,2,3], 'invalid imported parent'
+        m2.export(filename)
+        with open(filename) as f:
+            assert f.read()==exported, 'export => import => export changed the table'
+
+        filename = os.path.join(tmp, 'measurements.csv')
+        m.export_csv(filename)
+        with open(filename) as f:
+            assert f.read()==exported, 'export_csv and export differ'
+        m2 = RSML_Measurements()
+        m2.import_csv(filename)
+        assert m2[1]['order']==2 and m2[0]['name']=='simple', 'invalid import_csv'
+
+    g.properties().setdefault('diameter', {})[2] = [.3,.2,.1]
+    nodes = node_table(g, functions=['diameter'])
+    assert nodes['x'].tolist()==[0,0,0,0,1], 'invalid node coordinates'
+    assert nodes['diameter'][:3].tolist()==[.3,.2,.1], 'invalid node function'
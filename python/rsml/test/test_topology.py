@@ -0,0 +1,42 @@
+"""
+Tests for the topology cache
+"""
+from test_measurements import simple_tree
+
+
+def test_topology_cache():
+    from rsml.misc import root_tree, root_order
+    from rsml.topology import get_topology, invalidate_topology
+
+    g = simple_tree()
+    topology = get_topology(g)
+    primary, lateral = topology.vertices
+    assert topology.parents.tolist()==[-1,0], 'invalid parents'
+    assert topology.orders.tolist()==[1,2], 'invalid orders'
+    assert topology.parent(lateral)==primary, 'invalid parent axe'
+    assert topology.children(primary)==[lateral], 'invalid children axes'
+    assert get_topology(g) is topology, 'topology is not cached'
+
+    # adding vertices invalidates the cache
+    lateral2 = g.add_child(primary, edge_type='+', geometry=[[0,2,0],[1,2,0]])
+    assert get_topology(g) is not topology, 'topology cache not invalidated'
+    assert root_tree(g)==[primary, lateral, lateral2], 'invalid updated tree'
+    assert root_tree(g, suborder={lateral:1, lateral2:0})==[primary, lateral2, lateral], \
+            'invalid sorted tree'
+    assert root_order(g)[lateral2]==2, 'invalid updated order'
+
+    topology = get_topology(g)
+    invalidate_topology(g)
+    assert get_topology(g) is not topology, 'topology not invalidated'
+
+def test_topology_conversion():
+    from rsml.continuous import continuous_to_discrete, discrete_to_continuous
+    from rsml.topology import get_topology
+
+    g = simple_tree()
+    topology = get_topology(g)
+    continuous_to_discrete(g)
+    assert 'topology' not in g.graph_properties(), 'topology not invalidated by conversion'
+    discrete_to_continuous(g)
+    assert 'topology' not in g.graph_properties(), 'topology not invalidated by conversion'
+    assert get_topology(g).vertices==topology.vertices, 'invalid converted topology'
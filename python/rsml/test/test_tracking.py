@@ -0,0 +1,32 @@
+"""
+Tests for the tracking module
+"""
+
+def simple_tree(shift=0):
+    """ create a simple tree, translated by `shift` along x """
+    from openalea.mtg import MTG
+    g  = MTG()
+    p  = g.add_component(g.root, edge_type='/') # plant
+    
+    geom = [[shift,0,0],[shift,1,0],[shift,3,0]]
+    a1 = g.add_component(p, edge_type='/', geometry=geom) # primary axe
+    
+    geom = [[shift,1,0],[shift+1,1,0]]
+    a2  = g.add_child(a1, edge_type='+', geometry=geom)   # 2ndary axe
+
+    return g
+
+def test_track():
+    from rsml.tracking import track
+    
+    sequence = [simple_tree(shift) for shift in [0,0.1,0.2]]
+    tracking = track(sequence, max_distance=1)
+    
+    assert tracking.track_number()==(1,2), 'incorrect number of tracks'
+    
+    table = tracking.table()
+    assert len(table)==6, 'incorrect number of rows'
+    assert [row['track'] for row in table]==[0,1]*3, 'incorrect tracks'
+    
+    tracking = track(sequence, max_distance=0.05)
+    assert tracking.track_number()==(1,6), 'incorrect number of tracks'